@@ -1,21 +1,253 @@
-from flask import Flask, request, jsonify, make_response
+from flask import Flask, Response, request, jsonify, make_response, g
+from flask.json.provider import DefaultJSONProvider
 import sqlite3
 import json
 import os
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import re
+import signal
 import random
+import atexit
+import codecs
+import csv
+import gzip
+import io
+import math
 import hashlib
+import mmap
+import sys
+import functools
+import heapq
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import time
+import zlib
+from collections import OrderedDict, deque
+import click
 from werkzeug.exceptions import HTTPException
-import os, json, datetime
+from werkzeug.http import http_date, parse_date
+
+try:
+    import orjson  # pip install orjson
+    _ORJSON_AVAILABLE = True
+except Exception:
+    _ORJSON_AVAILABLE = False
+
+try:
+    import brotli  # pip install brotli
+    _BROTLI_AVAILABLE = True
+except Exception:
+    _BROTLI_AVAILABLE = False
+
+from db import PooledConnection, db_pool, get_db_connection, release_request_db, safe_json_loads
+from db import init_app as init_db_pool
+from metrics import request_timer, route_metrics, token_ok as metrics_token_ok
+from metrics import init_app as init_request_metrics
+from peers import (
+    BIG5_PCT_COLUMNS, BIG5_TRAITS, _NUMPY_AVAILABLE, benchmark_peer_index, big5_row_percent,
+    find_peers, load_peer_index, peer_index, peer_matcher, refresh_peer_vectors,
+)
+from profiling import init_app as init_profiling
+from ratelimit import admission, rate_limited, too_many_requests
 
 app = Flask(__name__)
 
+init_request_metrics(app)
+
+# ======================
+# JSON responses
+# ======================
+# app.json encodes with orjson when it is installed (JSON_ENCODER=stdlib
+# forces the stdlib path) and falls back to json for anything orjson
+# rejects. Output keeps Flask's defaults: sorted keys, compact separators,
+# indent in debug. JSONFragment values are already-encoded JSON that is
+# spliced into the output byte-for-byte instead of being encoded again.
+JSON_ENCODER = os.getenv("JSON_ENCODER", "auto").lower()  # auto | stdlib
+
+class JSONFragment:
+    """Pre-encoded JSON value; see FastJSONProvider."""
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = data if isinstance(data, bytes) else data.encode("utf-8")
+
+    @classmethod
+    def encode(cls, obj):
+        return cls(app.json.encode(obj))
+
+    def __repr__(self):
+        return f"JSONFragment({self.data[:40]!r})"
+
+class FastJSONProvider(DefaultJSONProvider):
+    def __init__(self, app):
+        super().__init__(app)
+        self.use_orjson = _ORJSON_AVAILABLE and JSON_ENCODER != "stdlib"
+        # placeholder emitted for fragments; NUL + random tag never occurs in real data
+        self._tag = f"\x00jsonfragment-{os.urandom(6).hex()}:"
+        self._tag_re = re.compile(
+            re.escape(json.dumps(self._tag)[:-1]).encode("ascii") + rb"(\d+)\\u0000\""
+        )
+        if self.use_orjson:
+            self._orjson_options = (
+                orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+                | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+            )
+
+    def encode(self, obj, pretty=False, sort_keys=None):
+        """obj -> UTF-8 JSON bytes, with JSONFragment values spliced in."""
+        sort_keys = self.sort_keys if sort_keys is None else sort_keys
+        fragments = []
+
+        def default(o):
+            if isinstance(o, JSONFragment):
+                fragments.append(o.data)
+                return f"{self._tag}{len(fragments) - 1}\x00"
+            # date, Decimal, UUID, dataclass, __html__ -- same as stdlib path
+            return self.default(o)
+
+        data = None
+        if self.use_orjson:
+            try:
+                data = orjson.dumps(
+                    obj, default=default,
+                    option=(self._orjson_options
+                            | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+                            | (orjson.OPT_INDENT_2 if pretty else 0)),
+                )
+            except TypeError:
+                fragments.clear()  # e.g. ints beyond 64 bits; retry with json
+        if data is None:
+            data = json.dumps(
+                obj, default=default, ensure_ascii=self.ensure_ascii, sort_keys=sort_keys,
+                indent=2 if pretty else None, separators=None if pretty else (",", ":"),
+            ).encode("utf-8")
+        if fragments:
+            data = self._tag_re.sub(lambda m: fragments[int(m.group(1))], data)
+        return data
+
+    def dumps(self, obj, **kwargs):
+        if set(kwargs) - {"indent", "separators"}:
+            return super().dumps(obj, **kwargs)
+        return self.encode(obj, pretty=bool(kwargs.get("indent"))).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        if self.use_orjson and not kwargs:
+            try:
+                return orjson.loads(s)
+            except orjson.JSONDecodeError:
+                pass  # let json raise its usual error (or accept NaN etc.)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = (self.compact is None and self._app.debug) or self.compact is False
+        started = time.perf_counter()
+        body = self.encode(obj, pretty) + b"\n"
+        timer = request_timer()
+        if timer is not None:
+            timer.json_s += time.perf_counter() - started
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+app.json = FastJSONProvider(app)
+
+# --- Response compression ---
+# Bodies of COMPRESS_MIN_SIZE bytes or more are sent gzip- or (with the
+# brotli package) br-encoded when the client accepts it. Streamed exports
+# are compressed chunk by chunk; SSE is never touched.
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+COMPRESSIBLE_MIMETYPES = {"application/json", "application/x-ndjson", "text/csv", "text/plain", "text/html"}
+STREAM_COMPRESSIBLE_MIMETYPES = {"application/x-ndjson", "text/csv"}
+
+def negotiate_encoding(accept_encoding):
+    """Pick br or gzip from an Accept-Encoding header, or None."""
+    offered = {}
+    for part in (accept_encoding or "").lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding:
+            offered[coding] = q
+    wildcard = offered.get("*", 0.0)
+    choices = (["br"] if _BROTLI_AVAILABLE else []) + ["gzip"]
+    best = max(choices, key=lambda c: offered.get(c, wildcard))
+    return best if offered.get(best, wildcard) > 0 else None
+
+def compress_body(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, COMPRESS_LEVEL)
+
+def _compress_stream(body, encoding):
+    if encoding == "br":
+        comp = brotli.Compressor(quality=BROTLI_QUALITY)
+        step, finish = (lambda b: comp.process(b) + comp.flush()), comp.finish
+    else:
+        comp = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 31)  # 31 = gzip container
+        step, finish = (lambda b: comp.compress(b) + comp.flush(zlib.Z_SYNC_FLUSH)), comp.flush
+    try:
+        for chunk in body:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            if chunk:
+                yield step(chunk)
+        yield finish()
+    finally:
+        close = getattr(body, "close", None)
+        if close:
+            close()
+
+@app.after_request
+def compress_response(response):
+    if (response.status_code < 200 or response.status_code in (204, 304)
+            or request.method == "HEAD"
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or "Content-Encoding" in response.headers
+            or response.direct_passthrough):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = negotiate_encoding(request.headers.get("Accept-Encoding"))
+    if not encoding:
+        return response
+
+    if response.is_streamed:
+        if response.mimetype in STREAM_COMPRESSIBLE_MIMETYPES:
+            response.response = _compress_stream(response.response, encoding)
+            response.headers["Content-Encoding"] = encoding
+            response.headers.pop("Content-Length", None)
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    response.set_data(compress_body(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    etag = response.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        # strong validators are per-encoding; conditional_get strips the suffix
+        response.headers["ETag"] = f'{etag[:-1]}-{encoding}"'
+    return response
+
 # ======================
 # CORS (Local Dev)
 # ======================
 LOCALHOST_ORIGIN_RE = re.compile(r"^http://(localhost|127\.0\.0\.1):\d+$")
 
+@app.before_request
+def start_background_services():
+    # Workers started by a WSGI server never run the __main__ block; the
+    # catalog itself is already warm (loaded at import, see catalog_store)
+    if not app.config.get("BACKGROUND_STARTED"):
+        app.config["BACKGROUND_STARTED"] = True
+        catalog_store.start()
+
 @app.before_request
 def handle_preflight():
     # Always return OK for preflight so the browser can continue
@@ -27,9 +259,12 @@ def add_cors_headers(response):
     origin = request.headers.get("Origin", "")
     if origin and LOCALHOST_ORIGIN_RE.match(origin):
         response.headers["Access-Control-Allow-Origin"] = origin
-        response.headers["Vary"] = "Origin"
+        response.vary.add("Origin")
 
-    response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization, X-Admin-Email"
+    response.headers["Access-Control-Allow-Headers"] = (
+        "Content-Type, Authorization, X-Admin-Email, X-Profile, If-None-Match, If-Modified-Since"
+    )
+    response.headers["Access-Control-Expose-Headers"] = "ETag, Last-Modified, Cache-Control, Server-Timing, X-Profile-Id, Retry-After"
     response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, PATCH, DELETE, OPTIONS"
     response.headers["Access-Control-Max-Age"] = "3600"
     return response
@@ -41,24 +276,84 @@ def handle_exception(e):
         return jsonify({"error": e.description}), e.code
     return jsonify({"error": str(e)}), 500
 
+init_db_pool(app)
+
 # ======================
-# Helpers
+# In-process caches
 # ======================
-def get_db_connection():
-    conn = sqlite3.connect("database.db")
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def safe_json_loads(value, default):
-    if value is None or value == "":
-        return default
-    if isinstance(value, (dict, list)):
-        return value
-    try:
-        return json.loads(value)
-    except Exception:
-        return default
+_MISSING = object()
+
+class LRUCache:
+    """Thread-safe LRU map with size + TTL bounds and hit/miss counters."""
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_s": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+# firebase_uid -> users.id never changes once created; the TTL only bounds
+# how long a stale entry could survive a manual DB edit.
+user_id_cache = LRUCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "50000")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "3600")),
+)
 
+# ======================
+# Helpers
+# ======================
 def now_iso():
     return datetime.utcnow().isoformat() + "Z"
 
@@ -72,18 +367,313 @@ def is_admin_request():
     req_email = (request.headers.get("X-Admin-Email") or "").lower().strip()
     return req_email != "" and req_email == admin_email
 
+# Routes that return other users' data (/matching) take the caller's
+# Firebase ID token as `Authorization: Bearer <token>`. Verifying it needs
+# `pip install firebase-admin` and the Firebase project id: FIREBASE_PROJECT_ID,
+# or GOOGLE_APPLICATION_CREDENTIALS pointing at a service-account JSON of
+# that project. Without them a bearer request gets 503 (not a silent 403).
+try:
+    import firebase_admin  # pip install firebase-admin
+    from firebase_admin import auth as firebase_auth
+    _FIREBASE_ADMIN_AVAILABLE = True
+except Exception:
+    _FIREBASE_ADMIN_AVAILABLE = False
+
+FIREBASE_PROJECT_ID = os.getenv("FIREBASE_PROJECT_ID", "")
+FIREBASE_AUTH_CONFIGURED = _FIREBASE_ADMIN_AVAILABLE and bool(
+    FIREBASE_PROJECT_ID or os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+)
+if not FIREBASE_AUTH_CONFIGURED:
+    app.logger.warning(
+        "Firebase ID token verification is not configured (install firebase-admin and set "
+        "FIREBASE_PROJECT_ID or GOOGLE_APPLICATION_CREDENTIALS); /matching answers 503 to bearer requests"
+    )
+
+class TokenVerificationUnavailable(RuntimeError):
+    """A bearer token was sent but this server cannot verify it."""
+
+@app.errorhandler(TokenVerificationUnavailable)
+def handle_token_verification_unavailable(e):
+    return jsonify({"error": str(e)}), 503
+
+_firebase_app_lock = threading.Lock()
+
+def _firebase_app():
+    with _firebase_app_lock:
+        try:
+            return firebase_admin.get_app()
+        except ValueError:
+            options = {"projectId": FIREBASE_PROJECT_ID} if FIREBASE_PROJECT_ID else None
+            return firebase_admin.initialize_app(options=options)
+
+def _verify_id_token(token):
+    """uid of a valid Firebase ID token, None for a bad one; raises when unverifiable."""
+    if not FIREBASE_AUTH_CONFIGURED:
+        raise TokenVerificationUnavailable(
+            "Token verification is not configured on this server "
+            "(firebase-admin + FIREBASE_PROJECT_ID or GOOGLE_APPLICATION_CREDENTIALS)"
+        )
+    try:
+        return firebase_auth.verify_id_token(token, app=_firebase_app()).get("uid")
+    except (firebase_auth.InvalidIdTokenError, firebase_auth.UserDisabledError):
+        return None
+    except Exception as e:
+        app.logger.exception("Firebase ID token verification failed")
+        raise TokenVerificationUnavailable(f"Token verification failed: {e}") from e
+
+def request_firebase_uid():
+    """firebase_uid proven by `Authorization: Bearer <Firebase ID token>`, else None."""
+    header = request.headers.get("Authorization") or ""
+    if not header.startswith("Bearer "):
+        return None
+    token = header[7:].strip()
+    return _verify_id_token(token) if token else None
+
+def is_self_or_admin(firebase_uid):
+    return is_admin_request() or request_firebase_uid() == firebase_uid
+
+_BULK_PARAMS = 500  # bound parameters per IN (...) list
+
+@functools.lru_cache(maxsize=64)
+def _upsert_sql(table, columns, conflict, update, where=None):
+    set_clause = ", ".join(f"{c}=excluded.{c}" for c in update)
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        f"VALUES ({', '.join('?' for _ in columns)}) "
+        f"ON CONFLICT({', '.join(conflict)}) DO UPDATE SET {set_clause}"
+        + (f" WHERE {where}" if where else "")
+    )
+
+def upsert_row(cursor, table, values, conflict=("user_id",), update=None):
+    """
+    Single-statement insert-or-update keyed on a UNIQUE constraint.
+    Only `update` columns (default: every non-key column) are overwritten
+    on conflict, so untouched columns keep their stored value.
+    """
+    columns = tuple(values)
+    conflict = tuple(conflict)
+    update = tuple(c for c in (update or columns) if c not in conflict)
+    cursor.execute(_upsert_sql(table, columns, conflict, update), [values[c] for c in columns])
+
+def lookup_user_id(firebase_uid):
+    """Return users.id for firebase_uid (cache first), or None if unknown."""
+    user_id = user_id_cache.get(firebase_uid)
+    if user_id is not None:
+        return user_id
+
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM users WHERE firebase_uid = ?", (firebase_uid,))
+        user = cursor.fetchone()
+        if not user:
+            return None
+        user_id_cache.set(firebase_uid, user["id"])
+        return user["id"]
+    finally:
+        conn.close()
+
+_BUMP_DATA_VERSION_SQL = """
+    UPDATE users SET data_version = COALESCE(data_version, 0) + 1, data_updated_at = ?
+    WHERE id = ?
+"""
+
+def bump_data_versions(conn, user_ids):
+    """
+    Mark the users' stored data as changed, in the same transaction as the
+    write; memoised versions are dropped only once that transaction commits.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    stamp = now_iso()
+    conn.executemany(_BUMP_DATA_VERSION_SQL, [(stamp, user_id) for user_id in user_ids])
+    conn.on_commit(lambda: invalidate_data_versions(user_ids))
+
+def bump_data_version(conn, user_id):
+    bump_data_versions(conn, [user_id])
+
+def get_data_version(firebase_uid):
+    """Current users.data_version for firebase_uid, or None if unknown."""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT data_version FROM users WHERE firebase_uid = ?", (firebase_uid,))
+        row = cursor.fetchone()
+        return (row["data_version"] or 0) if row else None
+    finally:
+        conn.close()
+
+# ======================
+# HTTP caching
+# ======================
+# Per-user GETs carry a strong ETag built from users.data_version (plus the
+# catalog version or UTC day where the body depends on them) and answer
+# If-None-Match / If-Modified-Since before running their own queries.
+# Versions are memoised for DATA_VERSION_TTL seconds and dropped when a local
+# write commits, so a repeat poll usually never reaches SQLite; with several
+# worker processes another worker's write shows up within that TTL. A read
+# that overlapped such a commit is not memoised, as it may have seen the
+# old version.
+DATA_VERSION_TTL = float(os.getenv("DATA_VERSION_TTL", "2"))
+data_version_cache = LRUCache(maxsize=int(os.getenv("USER_CACHE_SIZE", "50000")), ttl=DATA_VERSION_TTL)
+_data_version_invalidated = LRUCache(maxsize=int(os.getenv("USER_CACHE_SIZE", "50000")), ttl=60)
+_data_version_lock = threading.Lock()
+
+def invalidate_data_versions(user_ids):
+    """Forget memoised versions; call after the write that bumped them committed."""
+    now = time.monotonic()
+    with _data_version_lock:
+        for user_id in user_ids:
+            _data_version_invalidated.set(user_id, now)
+            data_version_cache.pop(user_id)
+
+def user_data_state(user_id):
+    """(data_version, data_updated_at epoch seconds or None) for users.id."""
+    state = data_version_cache.get(user_id) if DATA_VERSION_TTL > 0 else None
+    if state is not None:
+        return state
+    started = time.monotonic()
+    conn = get_db_connection()
+    try:
+        row = conn.execute(
+            "SELECT data_version, data_updated_at FROM users WHERE id = ?", (user_id,)
+        ).fetchone()
+    finally:
+        conn.close()
+    if not row:
+        return None
+    updated = row["data_updated_at"]
+    if updated:
+        updated = datetime.fromisoformat(updated.rstrip("Z")).replace(tzinfo=timezone.utc).timestamp()
+    state = (row["data_version"] or 0, updated)
+    if DATA_VERSION_TTL > 0:
+        with _data_version_lock:
+            invalidated = _data_version_invalidated.get(user_id)
+            if invalidated is None or invalidated < started:
+                data_version_cache.set(user_id, state)
+    return state
+
+def _matching_etag(header, etag):
+    """The If-None-Match entry equal to etag (ignoring W/ and -gzip/-br), or None."""
+    for tag in (header or "").split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return f'"{etag}"'
+        value = tag[2:] if tag.startswith("W/") else tag
+        value = value.strip('"')
+        base, _, suffix = value.rpartition("-")
+        if value == etag or (base == etag and suffix in ("gzip", "br")):
+            return tag
+    return None
+
+def conditional_get(cache_control, depends=None, weak=False):
+    """
+    Route decorator for GET /<route>/<firebase_uid> views.
+    `depends()` -> (token, modified_at epoch or None) for inputs besides
+    the user's own data. Unknown users fall through to the view (404).
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(firebase_uid, *args, **kwargs):
+            user_id = lookup_user_id(firebase_uid) if _valid_firebase_uid(firebase_uid) else None
+            state = user_data_state(user_id) if user_id is not None else None
+            if state is None:
+                return view(firebase_uid, *args, **kwargs)
+
+            version, modified = state
+            token, extra_modified = depends() if depends else ("", None)
+            etag = hashlib.sha1(
+                f"{view.__name__}:{user_id}:{version}:{token}".encode("utf-8")
+            ).hexdigest()[:20]
+            if modified is not None and extra_modified is not None:
+                modified = max(modified, extra_modified)
+
+            if_none_match = request.headers.get("If-None-Match")
+            matched = _matching_etag(if_none_match, etag)
+            not_modified = matched is not None
+            if not if_none_match and modified is not None:
+                since = parse_date(request.headers.get("If-Modified-Since"))
+                not_modified = since is not None and int(modified) <= since.timestamp()
+
+            if not_modified:
+                response = make_response("", 304)
+                response.vary.add("Accept-Encoding")
+                response.headers["ETag"] = matched or (f'W/"{etag}"' if weak else f'"{etag}"')
+            else:
+                response = make_response(view(firebase_uid, *args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                response.headers["ETag"] = f'W/"{etag}"' if weak else f'"{etag}"'
+            response.headers["Cache-Control"] = cache_control
+            if modified is not None:
+                response.headers["Last-Modified"] = http_date(int(modified))
+            return response
+        return wrapper
+    return decorator
+
+def _valid_firebase_uid(firebase_uid):
+    return bool(firebase_uid) and isinstance(firebase_uid, str) and len(firebase_uid) >= 3
+
+def ensure_users(pairs):
+    """
+    Bulk ensure_user: pairs of (firebase_uid, email) -> {firebase_uid: user_id}.
+    Invalid uids are simply absent from the result.
+    """
+    emails = {}
+    for firebase_uid, email in pairs:
+        if _valid_firebase_uid(firebase_uid):
+            emails.setdefault(firebase_uid, email)
+
+    ids = {}
+    for firebase_uid in emails:
+        user_id = user_id_cache.get(firebase_uid)
+        if user_id is not None:
+            ids[firebase_uid] = user_id
+    pending = [u for u in emails if u not in ids]
+    if not pending:
+        return ids
+
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+
+        def resolve(uids):
+            for i in range(0, len(uids), _BULK_PARAMS):
+                chunk = uids[i:i + _BULK_PARAMS]
+                cursor.execute(
+                    f"SELECT id, firebase_uid FROM users WHERE firebase_uid IN ({', '.join('?' for _ in chunk)})",
+                    chunk,
+                )
+                for r in cursor.fetchall():
+                    ids[r["firebase_uid"]] = r["id"]
+                    user_id_cache.set(r["firebase_uid"], r["id"])
+
+        resolve(pending)
+        missing = [u for u in pending if u not in ids]
+        if missing:
+            stamp = now_iso()
+            cursor.executemany(
+                "INSERT INTO users (firebase_uid, email, role, coach_level, created_at) "
+                "VALUES (?, ?, 'user', NULL, ?) ON CONFLICT(firebase_uid) DO NOTHING",
+                [(u, (emails[u] or "").strip(), stamp) for u in missing],
+            )
+            conn.commit()
+            resolve(missing)
+        return ids
+    finally:
+        conn.close()
+
 def ensure_user(firebase_uid, email=None):
     """Create user if not exists, return user_id (schema-compatible)."""
-    if not firebase_uid or not isinstance(firebase_uid, str) or len(firebase_uid) < 3:
+    if not _valid_firebase_uid(firebase_uid):
         raise ValueError("Invalid firebase_uid")
 
+    user_id = lookup_user_id(firebase_uid)
+    if user_id is not None:
+        return user_id
+
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
-        cursor.execute("SELECT id FROM users WHERE firebase_uid = ?", (firebase_uid,))
-        user = cursor.fetchone()
-        if user:
-            return user["id"]
 
         # Insert with new schema if available; fallback for old schema
         try:
@@ -98,6 +688,7 @@ def ensure_user(firebase_uid, email=None):
             )
 
         conn.commit()
+        user_id_cache.set(firebase_uid, cursor.lastrowid)
         return cursor.lastrowid
     finally:
         conn.close()
@@ -118,19 +709,12 @@ def init_db():
                 email TEXT,
                 role TEXT DEFAULT 'user',
                 coach_level TEXT DEFAULT NULL,
-                created_at TEXT
+                created_at TEXT,
+                data_version INTEGER DEFAULT 0,
+                data_updated_at TEXT
             )
         """)
 
-        # Safe migration for older DBs
-        existing_cols = [row["name"] for row in conn.execute("PRAGMA table_info(users)")]
-        if "role" not in existing_cols:
-            cursor.execute("ALTER TABLE users ADD COLUMN role TEXT DEFAULT 'user'")
-        if "coach_level" not in existing_cols:
-            cursor.execute("ALTER TABLE users ADD COLUMN coach_level TEXT DEFAULT NULL")
-        if "created_at" not in existing_cols:
-            cursor.execute("ALTER TABLE users ADD COLUMN created_at TEXT")
-
         # personality
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS personality (
@@ -182,6 +766,7 @@ def init_db():
                 project_id TEXT,
                 progress INTEGER,
                 tasks TEXT,
+                updated_at REAL,
                 FOREIGN KEY(user_id) REFERENCES users(id)
             )
         """)
@@ -195,6 +780,83 @@ def init_db():
                 answers TEXT,
                 result TEXT,
                 created_at TEXT,
+                pct_o INTEGER,
+                pct_c INTEGER,
+                pct_e INTEGER,
+                pct_a INTEGER,
+                pct_n INTEGER,
+                label TEXT,
+                answers_packed BLOB,
+                sum_o INTEGER,
+                sum_c INTEGER,
+                sum_e INTEGER,
+                sum_a INTEGER,
+                sum_n INTEGER,
+                model TEXT,
+                FOREIGN KEY(user_id) REFERENCES users(id)
+            )
+        """)
+
+        # Course catalog (optional external source for COURSE_CATALOG)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS courses (
+                id TEXT PRIMARY KEY,
+                position INTEGER,
+                title TEXT,
+                provider TEXT,
+                level TEXT,
+                duration TEXT,
+                tags TEXT,
+                url TEXT,
+                updated_at TEXT
+            )
+        """)
+
+        # Persisted LLM coach responses (see LLMResponseCache)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL,
+                expires_at REAL,
+                last_hit REAL,
+                hits INTEGER DEFAULT 0
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_hit ON llm_cache(last_hit)")
+
+        # Nightly precomputed rule-based coach output
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS coach_daily (
+                user_id INTEGER NOT NULL,
+                day TEXT NOT NULL,
+                action TEXT NOT NULL,
+                data_version INTEGER NOT NULL,
+                catalog_version TEXT,
+                result TEXT NOT NULL,
+                created_at TEXT,
+                PRIMARY KEY (user_id, day, action),
+                FOREIGN KEY(user_id) REFERENCES users(id)
+            ) WITHOUT ROWID
+        """)
+
+        # Shared token buckets (RATE_LIMIT_BACKEND=sqlite)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS rate_buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+
+        # Denormalized dashboard payload per user (see refresh_user_snapshots)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS user_snapshot (
+                user_id INTEGER PRIMARY KEY,
+                data_version INTEGER,
+                catalog_version TEXT,
+                payload TEXT NOT NULL,
+                updated_at TEXT,
                 FOREIGN KEY(user_id) REFERENCES users(id)
             )
         """)
@@ -221,12 +883,179 @@ def init_db():
         """)
 
         conn.commit()
+        apply_migrations(conn)
     finally:
         conn.close()
 
+# ======================
+# Schema migrations
+# ======================
+# init_db() creates any missing table in its current shape; MIGRATIONS then
+# bring older databases forward. PRAGMA user_version records the last step
+# applied, each step runs once in its own IMMEDIATE transaction (so two
+# workers starting together cannot both apply it), and steps stay safe on
+# a fresh database that already has the change.
+def _add_column(cursor, table, column, ddl):
+    existing_cols = [row["name"] for row in cursor.execute(f"PRAGMA table_info({table})")]
+    if column not in existing_cols:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+def _migrate_user_columns(cursor):
+    _add_column(cursor, "users", "role", "TEXT DEFAULT 'user'")
+    _add_column(cursor, "users", "coach_level", "TEXT DEFAULT NULL")
+    _add_column(cursor, "users", "created_at", "TEXT")
+    _add_column(cursor, "users", "data_version", "INTEGER DEFAULT 0")
+
+def _migrate_project_progress_unique(cursor):
+    # One row per (user, project): fold legacy duplicates into the newest
+    # row before the unique index makes ON CONFLICT upserts possible.
+    cursor.execute("""
+        DELETE FROM project_progress
+        WHERE id NOT IN (
+            SELECT MAX(id) FROM project_progress GROUP BY user_id, project_id
+        )
+    """)
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_project_progress_user_project
+        ON project_progress(user_id, project_id)
+    """)
+
+def _migrate_hot_path_indexes(cursor):
+    # (user_id) keeps rowid order per user, so "latest progress rows" in the
+    # coach bundle needs no sort; the unique index above is (user, project).
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_project_progress_user ON project_progress(user_id)")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_coach_applications_status_created
+        ON coach_applications(status, created_at)
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_coach_applications_user ON coach_applications(user_id)")
+
+def _migrate_big5_typed_columns(cursor):
+    v4_columns = BIG5_PCT_COLUMNS + ("label", "answers", "answers_packed")
+    for column in BIG5_PCT_COLUMNS:
+        _add_column(cursor, "big5", column, "INTEGER")
+    _add_column(cursor, "big5", "label", "TEXT")
+    _add_column(cursor, "big5", "answers_packed", "BLOB")
+
+    # Back-fill in id order; each row's JSON is decoded once, here.
+    last_id = 0
+    while True:
+        rows = cursor.execute(
+            "SELECT id, scores, answers, result FROM big5 WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, _BULK_PARAMS),
+        ).fetchall()
+        if not rows:
+            break
+        updates = []
+        for r in rows:
+            values = big5_columns(
+                safe_json_loads(r["scores"], {}),
+                safe_json_loads(r["answers"], {}),
+                safe_json_loads(r["result"], {}),
+            )
+            # keep the stored answers text when it cannot be packed losslessly
+            if values["answers"] is not None:
+                values["answers"] = r["answers"]
+            updates.append((*(values[c] for c in v4_columns), r["id"]))
+        cursor.executemany(
+            f"UPDATE big5 SET {', '.join(f'{c} = ?' for c in v4_columns)} WHERE id = ?",
+            updates,
+        )
+        last_id = rows[-1]["id"]
+
+def _migrate_user_data_updated_at(cursor):
+    # NULL until the user's next write; such users get no Last-Modified
+    _add_column(cursor, "users", "data_updated_at", "TEXT")
+
+def _migrate_coach_daily_catalog_version(cursor):
+    # Existing rows stay NULL and never match a live catalog; they age out
+    _add_column(cursor, "coach_daily", "catalog_version", "TEXT")
+
+def _migrate_big5_score_columns(cursor):
+    for column in BIG5_SUM_COLUMNS:
+        _add_column(cursor, "big5", column, "INTEGER")
+    _add_column(cursor, "big5", "model", "TEXT")
+
+    # The one place stored scores/result JSON is still decoded: rows in the
+    # frontend's shape move to typed columns and drop their JSON copies.
+    last_id = 0
+    while True:
+        rows = cursor.execute(
+            "SELECT id, scores, result FROM big5 WHERE id > ? AND scores IS NOT NULL ORDER BY id LIMIT ?",
+            (last_id, _BULK_PARAMS),
+        ).fetchall()
+        if not rows:
+            break
+        updates = []
+        for r in rows:
+            typed = typed_big5_scores(safe_json_loads(r["scores"], None), safe_json_loads(r["result"], None))
+            if typed:
+                sums, _, model, _ = typed
+                updates.append((*sums, model, r["id"]))
+        cursor.executemany(
+            f"UPDATE big5 SET {', '.join(f'{c} = ?' for c in BIG5_SUM_COLUMNS)}, model = ?, "
+            "scores = NULL, result = NULL WHERE id = ?",
+            updates,
+        )
+        last_id = rows[-1]["id"]
+
+def _migrate_project_progress_updated_at(cursor):
+    # Existing rows stay NULL; the first guarded upsert overwrites them
+    _add_column(cursor, "project_progress", "updated_at", "REAL")
+
+MIGRATIONS = (
+    (1, "users: role, coach_level, created_at, data_version columns", _migrate_user_columns),
+    (2, "project_progress: dedupe + unique (user_id, project_id)", _migrate_project_progress_unique),
+    (3, "indexes for coach bundle progress and coach application review", _migrate_hot_path_indexes),
+    (4, "big5: typed O/C/E/A/N + label columns, packed answers (back-filled)", _migrate_big5_typed_columns),
+    (5, "users: data_updated_at for Last-Modified", _migrate_user_data_updated_at),
+    (6, "coach_daily: catalog_version the row was ranked against", _migrate_coach_daily_catalog_version),
+    (7, "big5: typed score sums + model; frontend-shaped rows drop scores/result JSON",
+     _migrate_big5_score_columns),
+    (8, "project_progress: updated_at save time (last save wins across workers)",
+     _migrate_project_progress_updated_at),
+)
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def apply_migrations(conn):
+    """Run pending MIGRATIONS; returns the versions applied."""
+    if conn.in_transaction:
+        conn.commit()
+    applied = []
+    for version, description, step in MIGRATIONS:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            cursor = conn.cursor()
+            step(cursor)
+            cursor.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        app.logger.info("Applied schema migration %s: %s", version, description)
+        applied.append(version)
+    if applied:
+        conn.execute("PRAGMA optimize")
+    return applied
+
 # ======================
 # Personality
 # ======================
+PERSONALITY_FIELDS = ("learning_style", "decision_style", "work_preference", "motivation_state", "clarity_level")
+
+def personality_values(data):
+    """Validated personality columns from a request payload (raises ValueError)."""
+    for k in PERSONALITY_FIELDS:
+        if k not in data:
+            raise ValueError(f"Missing {k}")
+    return {k: data[k] for k in PERSONALITY_FIELDS}
+
 @app.route("/personality", methods=["POST"])
 def save_personality():
     data = request.get_json() or {}
@@ -238,51 +1067,31 @@ def save_personality():
 
     user_id = ensure_user(firebase_uid, email)
 
-    required = ["learning_style", "decision_style", "work_preference", "motivation_state", "clarity_level"]
-    for k in required:
-        if k not in data:
-            return jsonify({"error": f"Missing {k}"}), 400
+    try:
+        values = personality_values(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
-        # Upsert personality by user_id UNIQUE
-        cursor.execute("SELECT id FROM personality WHERE user_id = ?", (user_id,))
-        existing = cursor.fetchone()
-        if existing:
-            cursor.execute("""
-                UPDATE personality SET
-                    learning_style=?, decision_style=?, work_preference=?,
-                    motivation_state=?, clarity_level=?
-                WHERE user_id=?
-            """, (
-                data["learning_style"],
-                data["decision_style"],
-                data["work_preference"],
-                data["motivation_state"],
-                data["clarity_level"],
-                user_id
-            ))
-        else:
-            cursor.execute("""
-                INSERT INTO personality (
-                    learning_style, decision_style, work_preference,
-                    motivation_state, clarity_level, user_id
-                ) VALUES (?, ?, ?, ?, ?, ?)
-            """, (
-                data["learning_style"],
-                data["decision_style"],
-                data["work_preference"],
-                data["motivation_state"],
-                data["clarity_level"],
-                user_id
-            ))
+        # Upsert personality by user_id UNIQUE (MBTI columns are left untouched)
+        upsert_row(cursor, "personality", {**values, "user_id": user_id})
+        bump_data_version(conn, user_id)
+        refresh_user_snapshots(cursor, [user_id])
 
         conn.commit()
         return jsonify({"status": "personality_saved"})
     finally:
         conn.close()
 
+def personality_view(row):
+    result = {k: row[k] for k in PERSONALITY_FIELDS + ("mbti_type",)}
+    result["mbti_scores"] = safe_json_loads(row["mbti_scores"], {})
+    result["mbti_answers"] = safe_json_loads(row["mbti_answers"], {})
+    result["mbti_percentages"] = safe_json_loads(row["mbti_percentages"], {})
+    return result
+
 @app.route("/personality/<firebase_uid>", methods=["GET"])
 def get_personality(firebase_uid):
     conn = get_db_connection()
@@ -301,29 +1110,38 @@ def get_personality(firebase_uid):
         if not row:
             return jsonify({"error": "No personality"}), 404
 
-        result = dict(row)
-        result["mbti_scores"] = safe_json_loads(result.get("mbti_scores"), {})
-        result["mbti_answers"] = safe_json_loads(result.get("mbti_answers"), {})
-        result["mbti_percentages"] = safe_json_loads(result.get("mbti_percentages"), {})
-        return jsonify(result)
+        return jsonify(personality_view(row))
     finally:
         conn.close()
 
 # ======================
 # Big Five
 # ======================
-@app.route("/save-big5", methods=["POST"])
-def save_big5():
-    data = request.get_json() or {}
-    firebase_uid = data.get("firebase_uid")
-    email = data.get("email")
-
-    if not firebase_uid:
-        return jsonify({"error": "Missing firebase_uid"}), 400
+def big5_percent(scores, result):
+    """
+    O/C/E/A/N percentages from a big5 row (result.percent, else scores.percent),
+    clamped to 0-100; missing, non-numeric and non-finite values count as 0.
+    """
+    percent = result.get("percent") if isinstance(result, dict) else None
+    if not isinstance(percent, dict):
+        percent = scores.get("percent") if isinstance(scores, dict) else None
+    if not isinstance(percent, dict) or not any(k in percent for k in BIG5_TRAITS):
+        return None
+    values = []
+    for k in BIG5_TRAITS:
+        try:
+            value = float(percent.get(k, 0) or 0)
+        except (TypeError, ValueError, OverflowError):
+            value = 0.0
+        values.append(min(max(value, 0.0), 100.0) if math.isfinite(value) else 0.0)
+    return values
 
-    # Accept both legacy payload and current frontend payload
-    # Legacy: {scores, answers, result}
-    # Current FE: {scores_sum, scores_percent, answers, label, model}
+def big5_payload(data):
+    """
+    Accept both legacy payload and current frontend payload
+    Legacy: {scores, answers, result}
+    Current FE: {scores_sum, scores_percent, answers, label, model}
+    """
     scores = data.get("scores", {}) or {}
     answers = data.get("answers", {}) or {}
     result = data.get("result", {}) or {}
@@ -338,52 +1156,153 @@ def save_big5():
             "label": data.get("label") or "",
             "percent": data.get("scores_percent") or {},
         }
+    return scores, answers, result
+
+# Typed columns hold the whole result: integer O/C/E/A/N percentages and
+# sums, the label and model, and answers packed one byte per question (byte
+# i = answer to question i+1, 0 = unanswered). big5_view rebuilds the API's
+# scores/result from them. `scores`, `result` and `answers` JSON is only
+# written for legacy payload shapes that can't be stored losslessly that way.
+BIG5_SUM_COLUMNS = ("sum_o", "sum_c", "sum_e", "sum_a", "sum_n")
+_BIG5_TYPED_COLUMNS = BIG5_PCT_COLUMNS + BIG5_SUM_COLUMNS + ("label", "model", "answers", "answers_packed")
+# what a read needs to answer with big5_view
+BIG5_VIEW_COLUMNS = ("scores", "result", "answers", "answers_packed", "created_at",
+                     *BIG5_PCT_COLUMNS, *BIG5_SUM_COLUMNS, "label", "model")
+
+def _trait_ints(value):
+    """[O, C, E, A, N] when value is exactly {trait: int} for the five traits, else None."""
+    if not isinstance(value, dict) or set(value) != set(BIG5_TRAITS):
+        return None
+    ints = [value[t] for t in BIG5_TRAITS]
+    return ints if all(type(v) is int and -2 ** 31 < v < 2 ** 31 for v in ints) else None
+
+def typed_big5_scores(scores, result):
+    """
+    (sums, percents, model, label) when scores/result have exactly the shape
+    big5_payload builds from the current frontend payload, else None.
+    """
+    if not isinstance(scores, dict) or not isinstance(result, dict):
+        return None
+    if set(scores) != {"sum", "percent", "model"} or set(result) != {"label", "percent"}:
+        return None
+    sums, percent = _trait_ints(scores["sum"]), _trait_ints(scores["percent"])
+    if sums is None or percent is None or result["percent"] != scores["percent"]:
+        return None
+    if not all(0 <= p <= 100 for p in percent):
+        return None
+    if not isinstance(scores["model"], str) or not isinstance(result["label"], str):
+        return None
+    return sums, percent, scores["model"], result["label"]
+
+def big5_scores_result(row):
+    """(scores, result) for the API: from the typed columns, else the legacy JSON."""
+    if row["scores"] is None and row["sum_o"] is not None:
+        percent = {t: row[c] for t, c in zip(BIG5_TRAITS, BIG5_PCT_COLUMNS)}
+        scores = {
+            "sum": {t: row[c] for t, c in zip(BIG5_TRAITS, BIG5_SUM_COLUMNS)},
+            "percent": percent,
+            "model": row["model"],
+        }
+        return scores, {"label": row["label"], "percent": dict(percent)}
+    return safe_json_loads(row["scores"], {}), safe_json_loads(row["result"], {})
+
+def pack_answers(answers):
+    """bytes for {"1": 3, "2": 5, ...}-style answers, or None if not representable."""
+    if not isinstance(answers, dict):
+        return None
+    packed = {}
+    for key, value in answers.items():
+        k = str(key)
+        if not k.isdigit() or k != str(int(k)) or not 1 <= int(k) <= 255:
+            return None
+        if type(value) is not int or not 1 <= value <= 255:
+            return None
+        packed[int(k)] = value
+    buf = bytearray(max(packed, default=0))
+    for k, value in packed.items():
+        buf[k - 1] = value
+    return bytes(buf)
+
+def unpack_answers(packed):
+    return {str(i + 1): v for i, v in enumerate(packed) if v}
+
+def big5_columns(scores, answers, result):
+    """Column values for a big5 row: typed/packed forms, JSON only where they fall short."""
+    percent = big5_percent(scores, result)
+    label = result.get("label") if isinstance(result, dict) else None
+    if not label and isinstance(scores, dict):
+        label = scores.get("label")
+    typed = typed_big5_scores(scores, result)
+    packed = pack_answers(answers)
+    values = {
+        "scores": None if typed else json.dumps(scores),
+        "answers": None if packed is not None else json.dumps(answers),
+        "result": None if typed else json.dumps(result),
+        "label": label if isinstance(label, str) else "",
+        "model": typed[2] if typed else None,
+        "answers_packed": packed,
+    }
+    for column, value in zip(BIG5_SUM_COLUMNS, typed[0] if typed else [None] * len(BIG5_SUM_COLUMNS)):
+        values[column] = value
+    for column, value in zip(BIG5_PCT_COLUMNS, percent or [None] * len(BIG5_PCT_COLUMNS)):
+        # truncate like _big5_style's int(); the frontend only sends integers
+        values[column] = None if value is None else int(value)
+    return values
+
+def big5_answers(row):
+    if row["answers_packed"] is not None:
+        return unpack_answers(row["answers_packed"])
+    return safe_json_loads(row["answers"], {})
 
+@app.route("/save-big5", methods=["POST"])
+def save_big5():
+    data = request.get_json() or {}
+    firebase_uid = data.get("firebase_uid")
+    email = data.get("email")
+
+    if not firebase_uid:
+        return jsonify({"error": "Missing firebase_uid"}), 400
+
+    scores, answers, result = big5_payload(data)
     user_id = ensure_user(firebase_uid, email)
 
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
-
-        cursor.execute("SELECT id FROM big5 WHERE user_id = ?", (user_id,))
-        existing = cursor.fetchone()
-
-        if existing:
-            cursor.execute("""
-                UPDATE big5
-                SET scores = ?, answers = ?, result = ?, created_at = ?
-                WHERE user_id = ?
-            """, (
-                json.dumps(scores),
-                json.dumps(answers),
-                json.dumps(result),
-                now_iso(),
-                user_id
-            ))
-        else:
-            cursor.execute("""
-                INSERT INTO big5 (user_id, scores, answers, result, created_at)
-                VALUES (?, ?, ?, ?, ?)
-            """, (
-                user_id,
-                json.dumps(scores),
-                json.dumps(answers),
-                json.dumps(result),
-                now_iso()
-            ))
+        values = big5_columns(scores, answers, result)
+        upsert_row(cursor, "big5", {
+            "user_id": user_id,
+            **values,
+            "created_at": now_iso(),
+        })
+        bump_data_version(conn, user_id)
+        refresh_user_snapshots(cursor, [user_id])
 
         conn.commit()
+        direction = analysis_directions([user_id]).get(user_id)
+        peer_matcher.upsert(user_id, big5_row_percent(values), direction)
+        refresh_peer_vectors([user_id])
         return jsonify({"status": "big5_saved"})
     finally:
         conn.close()
 
+def big5_view(row):
+    scores, result = big5_scores_result(row)
+    return {
+        "scores": scores,
+        "answers": big5_answers(row),
+        "result": result,
+        "created_at": row["created_at"]
+    }
+
 @app.route("/big5/<firebase_uid>", methods=["GET"])
+@conditional_get("private, no-cache")
 def get_big5(firebase_uid):
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT b.scores, b.answers, b.result, b.created_at
+        cursor.execute(f"""
+            SELECT {", ".join(f"b.{c}" for c in BIG5_VIEW_COLUMNS)}
             FROM big5 b
             JOIN users u ON b.user_id = u.id
             WHERE u.firebase_uid = ?
@@ -393,12 +1312,7 @@ def get_big5(firebase_uid):
         if not row:
             return jsonify({"error": "No big5"}), 404
 
-        return jsonify({
-            "scores": safe_json_loads(row["scores"], {}),
-            "answers": safe_json_loads(row["answers"], {}),
-            "result": safe_json_loads(row["result"], {}),
-            "created_at": row["created_at"]
-        })
+        return jsonify(big5_view(row))
     finally:
         conn.close()
 
@@ -422,26 +1336,32 @@ def save_profile():
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
-        cursor.execute("SELECT id FROM profile WHERE user_id = ?", (user_id,))
-        existing = cursor.fetchone()
-
-        if existing:
-            cursor.execute("""
-                UPDATE profile SET display_name=?, avatar=?, bio=?, interests=?
-                WHERE user_id=?
-            """, (display_name, avatar, bio, json.dumps(interests), user_id))
-        else:
-            cursor.execute("""
-                INSERT INTO profile (display_name, avatar, bio, interests, user_id)
-                VALUES (?, ?, ?, ?, ?)
-            """, (display_name, avatar, bio, json.dumps(interests), user_id))
+        upsert_row(cursor, "profile", {
+            "display_name": display_name,
+            "avatar": avatar,
+            "bio": bio,
+            "interests": json.dumps(interests),
+            "user_id": user_id,
+        })
+        bump_data_version(conn, user_id)
+        refresh_user_snapshots(cursor, [user_id])
 
         conn.commit()
+        refresh_peer_vectors([user_id])
         return jsonify({"status": "profile_saved"})
     finally:
         conn.close()
 
+def profile_view(row):
+    return {
+        "display_name": row["display_name"],
+        "avatar": row["avatar"],
+        "bio": row["bio"],
+        "interests": safe_json_loads(row["interests"], [])
+    }
+
 @app.route("/profile/<firebase_uid>", methods=["GET"])
+@conditional_get("private, no-cache")
 def get_profile(firebase_uid):
     conn = get_db_connection()
     try:
@@ -457,12 +1377,7 @@ def get_profile(firebase_uid):
         if not row:
             return jsonify({"error": "No profile"}), 404
 
-        return jsonify({
-            "display_name": row["display_name"],
-            "avatar": row["avatar"],
-            "bio": row["bio"],
-            "interests": safe_json_loads(row["interests"], [])
-        })
+        return jsonify(profile_view(row))
     finally:
         conn.close()
 
@@ -491,6 +1406,15 @@ ANALYSIS_MAP = {
     }
 }
 
+def analysis_for(data):
+    field = (data.get("field") or "").lower().strip()
+    level = (data.get("level") or "").lower().strip()
+    return ANALYSIS_MAP.get(field, {}).get(level, {
+        "strengths": ["General programming"],
+        "gaps": ["Core concepts"],
+        "direction": "General Developer"
+    })
+
 @app.route("/analyze", methods=["POST"])
 def analyze():
     data = request.get_json() or {}
@@ -500,51 +1424,38 @@ def analyze():
     if not firebase_uid:
         return jsonify({"error": "Missing firebase_uid"}), 400
 
-    field = (data.get("field") or "").lower().strip()
-    level = (data.get("level") or "").lower().strip()
-
     user_id = ensure_user(firebase_uid, email)
-
-    analysis_result = ANALYSIS_MAP.get(field, {}).get(level, {
-        "strengths": ["General programming"],
-        "gaps": ["Core concepts"],
-        "direction": "General Developer"
-    })
+    analysis_result = analysis_for(data)
 
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
         # Upsert analysis (user_id UNIQUE)
-        cursor.execute("SELECT id FROM analysis WHERE user_id = ?", (user_id,))
-        existing = cursor.fetchone()
-
-        if existing:
-            cursor.execute("""
-                UPDATE analysis SET strengths=?, gaps=?, direction=?
-                WHERE user_id=?
-            """, (
-                json.dumps(analysis_result["strengths"]),
-                json.dumps(analysis_result["gaps"]),
-                analysis_result["direction"],
-                user_id
-            ))
-        else:
-            cursor.execute("""
-                INSERT INTO analysis (strengths, gaps, direction, user_id)
-                VALUES (?, ?, ?, ?)
-            """, (
-                json.dumps(analysis_result["strengths"]),
-                json.dumps(analysis_result["gaps"]),
-                analysis_result["direction"],
-                user_id
-            ))
+        upsert_row(cursor, "analysis", {
+            "strengths": json.dumps(analysis_result["strengths"]),
+            "gaps": json.dumps(analysis_result["gaps"]),
+            "direction": analysis_result["direction"],
+            "user_id": user_id,
+        })
+        bump_data_version(conn, user_id)
+        refresh_user_snapshots(cursor, [user_id])
 
         conn.commit()
+        peer_matcher.set_direction(user_id, analysis_result["direction"])
+        refresh_peer_vectors([user_id])
         return jsonify(analysis_result)
     finally:
         conn.close()
 
+def analysis_view(row):
+    return {
+        "strengths": safe_json_loads(row["strengths"], []),
+        "gaps": safe_json_loads(row["gaps"], []),
+        "direction": row["direction"]
+    }
+
 @app.route("/analysis/<firebase_uid>", methods=["GET"])
+@conditional_get("private, no-cache")
 def get_analysis(firebase_uid):
     conn = get_db_connection()
     try:
@@ -560,17 +1471,27 @@ def get_analysis(firebase_uid):
         if not row:
             return jsonify({"error": "No analysis"}), 404
 
-        return jsonify({
-            "strengths": safe_json_loads(row["strengths"], []),
-            "gaps": safe_json_loads(row["gaps"], []),
-            "direction": row["direction"]
-        })
+        return jsonify(analysis_view(row))
     finally:
         conn.close()
 
 # ======================
 # Projects suggested from analysis
 # ======================
+def project_suggestions(gaps, learning_style, motivation_state):
+    motivation = motivation_state or "medium"
+    learning_style = learning_style or "guided"
+
+    projects_list = []
+    for gap in gaps:
+        projects_list.append({
+            "title": f"{gap} Mini Project",
+            "description": f"Practice {gap} ({learning_style})",
+            "difficulty": "Very Easy" if motivation == "low" else "Easy",
+            "estimated_time": "3 days" if motivation == "low" else "1 week"
+        })
+    return projects_list
+
 @app.route("/projects/<firebase_uid>", methods=["GET"])
 def projects(firebase_uid):
     conn = get_db_connection()
@@ -589,35 +1510,80 @@ def projects(firebase_uid):
             return jsonify({"error": "No data"}), 404
 
         gaps = safe_json_loads(row["gaps"], [])
-        motivation = row["motivation_state"] or "medium"
-        learning_style = row["learning_style"] or "guided"
-
-        projects_list = []
-        for gap in gaps:
-            projects_list.append({
-                "title": f"{gap} Mini Project",
-                "description": f"Practice {gap} ({learning_style})",
-                "difficulty": "Very Easy" if motivation == "low" else "Easy",
-                "estimated_time": "3 days" if motivation == "low" else "1 week"
-            })
-
-        return jsonify({"projects": projects_list})
+        return jsonify({"projects": project_suggestions(gaps, row["learning_style"], row["motivation_state"])})
     finally:
         conn.close()
 
 # ======================
 # Matching
 # ======================
+# Scoring, PeerMatcher and the ANN index live in peers.py.
+def analysis_directions(user_ids):
+    """{user_id: analysis direction} for users that have an analysis row."""
+    directions = {}
+    conn = get_db_connection()
+    try:
+        for i in range(0, len(user_ids), _BULK_PARAMS):
+            chunk = user_ids[i:i + _BULK_PARAMS]
+            rows = conn.execute(
+                f"SELECT user_id, direction FROM analysis WHERE user_id IN ({', '.join('?' for _ in chunk)})",
+                chunk,
+            ).fetchall()
+            directions.update((r["user_id"], r["direction"]) for r in rows)
+    finally:
+        conn.close()
+    return directions
+
+def _peer_cards(conn, peers):
+    """Card data for matched peers: only what MatchingPage renders (no firebase_uid)."""
+    if not peers:
+        return []
+    ids = [p[0] for p in peers]
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT u.id, p.display_name, a.direction, a.gaps
+        FROM users u
+        LEFT JOIN profile p ON p.user_id = u.id
+        LEFT JOIN analysis a ON a.user_id = u.id
+        WHERE u.id IN ({", ".join("?" for _ in ids)})
+    """, ids)
+    meta = {r["id"]: r for r in cursor.fetchall()}
+
+    cards = []
+    for peer_id, score, sim in peers:
+        r = meta.get(peer_id)
+        if r is None:
+            continue
+        gaps = safe_json_loads(r["gaps"], [])
+        cards.append({
+            "id": peer_id,
+            "type": "Peer",
+            "name": r["display_name"] or "",
+            "field": r["direction"] or "",
+            "focus": gaps[0] if gaps and isinstance(gaps[0], str) else "",
+            "score": round(score * 100),
+        })
+    return cards
+
 @app.route("/matching/<firebase_uid>", methods=["GET"])
 def matching(firebase_uid):
+    # Results describe other users, so only the signed-in owner (or an admin) may ask
+    if not is_self_or_admin(firebase_uid):
+        return jsonify({"error": "Forbidden"}), 403
+
+    try:
+        k = max(1, min(int(request.args.get("k", 6)), 50))
+    except ValueError:
+        k = 6
+
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
         cursor.execute("""
-            SELECT p.work_preference, p.clarity_level, a.direction
+            SELECT u.id, p.work_preference, p.clarity_level, a.direction
             FROM users u
-            JOIN personality p ON p.user_id = u.id
-            JOIN analysis a ON a.user_id = u.id
+            LEFT JOIN personality p ON p.user_id = u.id
+            LEFT JOIN analysis a ON a.user_id = u.id
             WHERE u.firebase_uid = ?
         """, (firebase_uid,))
         row = cursor.fetchone()
@@ -625,10 +1591,16 @@ def matching(firebase_uid):
         if not row:
             return jsonify({"error": "No data"}), 404
 
+        peers = _peer_cards(conn, find_peers(row["id"], k))
+        if not peers and row["clarity_level"] is None and row["direction"] is None:
+            return jsonify({"error": "No data"}), 404
+
         matches = []
         if row["clarity_level"] == "lost":
             matches.append({"type": "Coach", "reason": "You need guidance and clarity"})
-        if row["work_preference"] in ["peer", "mentor"]:
+        if peers:
+            matches.extend(peers)
+        elif row["work_preference"] in ["peer", "mentor"]:
             matches.append({"type": "Peer", "reason": "Learning together boosts progress"})
 
         return jsonify({"matches": matches})
@@ -646,28 +1618,163 @@ try:
 except Exception:
     _OPENAI_AVAILABLE = False
 
+# --- Keyword intent classifier ---
+# Declarative keyword tables shared by _infer_intent (LLM coach),
+# _infer_action (rule-based coach) and _stuck_detect. Each table compiles
+# to a single regex; lower `priority` wins when several labels match,
+# which reproduces the old first-matching-list order. Extra keywords or
+# labels can be merged in from INTENT_KEYWORDS_FILE (same JSON shape).
+INTENT_KEYWORDS = {
+    "intent": {
+        "default": "chat",
+        "labels": [
+            {"label": "weekly_plan", "priority": 0, "keywords": ["خطة أسبوع", "weekly", "أسبوع"]},
+            {"label": "suggest_project", "priority": 1, "keywords": ["مشروع", "project", "فكرة مشروع"]},
+            {"label": "learn_now", "priority": 2, "keywords": ["أتعلم", "تعلم", "learn", "دراسة"]},
+            {"label": "priorities", "priority": 3, "keywords": ["أولويات", "رتب", "priorit"]},
+            {"label": "diagnose", "priority": 4, "keywords": ["5 أسئلة", "تشخيص", "diagnose"]},
+        ],
+    },
+    "action": {
+        "default": "priorities",
+        "labels": [
+            {"label": "priorities", "priority": 0, "keywords": ["priority", "priorit", "اولوي", "أولو", "رتب", "order"]},
+            {"label": "weekly_plan", "priority": 1, "keywords": ["week", "weekly", "خطة", "اسبوع", "أسبوع", "plan"]},
+            {"label": "project", "priority": 2, "keywords": ["project", "مشروع", "build", "idea"]},
+            {"label": "learn_now", "priority": 3, "keywords": ["learn", "تعلم", "course", "كور", "what now", "شو"]},
+            {"label": "daily", "priority": 4, "keywords": ["motivat", "حماس", "تعب", "stress", "قلق"]},
+        ],
+    },
+    "stuck": {
+        "default": None,
+        "labels": [
+            {"label": "stuck", "priority": 0, "keywords": ["ضايع", "ما بعرف", "محتار", "مو قادر", "ما عم استفيد", "تعبت", "زهقان"]},
+        ],
+    },
+}
+INTENT_KEYWORDS_FILE = os.getenv("INTENT_KEYWORDS_FILE", "")
+
+class KeywordClassifier:
+    """Substring keyword matcher compiled to one alternation regex.
+
+    Alternatives are ordered by (priority, -length), so the leftmost match
+    is the best keyword starting there. After a hit only strictly better
+    keywords matter, so the scan continues one character later with the
+    pattern restricted to those -- at most one search per priority level,
+    and the result is identical to scanning every list with `in`.
+    """
+
+    def __init__(self, labels, default=None):
+        self.default = default
+        self.rank = {}
+        best = {}
+        for entry in labels:
+            label, priority = entry["label"], entry.get("priority", 0)
+            for kw in entry.get("keywords") or []:
+                kw = str(kw).lower()
+                if kw and (kw not in best or priority < best[kw][0]):
+                    best[kw] = (priority, label)
+        self.keywords = best
+        ordered = sorted(best, key=lambda k: (best[k][0], -len(k), k))
+        self.pattern = self._compile(ordered)
+        # priority -> pattern of the keywords that beat it
+        self._better = {
+            p: self._compile([k for k in ordered if best[k][0] < p])
+            for p in {p for p, _ in best.values()}
+        }
+        lists = {}
+        for kw in ordered:
+            lists.setdefault(best[kw], []).append(kw)
+        self._lists = [(label, kws) for (_, label), kws in sorted(lists.items())]
+
+    @staticmethod
+    def _compile(keywords):
+        return re.compile("|".join(map(re.escape, keywords))) if keywords else None
+
+    def classify(self, text):
+        if self.pattern is None or not text:
+            return self.default
+        text = text.lower()
+        m = self.pattern.search(text)
+        if m is None:
+            return self.default
+        found = self.keywords[m.group()]
+        while True:
+            better = self._better[found[0]]
+            m = better.search(text, m.start() + 1) if better is not None else None
+            if m is None:
+                return found[1]
+            found = self.keywords[m.group()]
+
+    def scan(self, text):
+        """Reference implementation: the old per-list `any(k in m ...)` loop."""
+        m = (text or "").lower()
+        for label, kws in self._lists:
+            if any(k in m for k in kws):
+                return label
+        return self.default
+
+def _merge_keyword_tables(base, extra):
+    merged = {name: {"default": t.get("default"), "labels": [dict(e) for e in t["labels"]]} for name, t in base.items()}
+    for name, table in (extra or {}).items():
+        target = merged.setdefault(name, {"default": table.get("default"), "labels": []})
+        if "default" in table:
+            target["default"] = table["default"]
+        index = {e["label"]: e for e in target["labels"]}
+        for entry in table.get("labels") or []:
+            if entry.get("label") in index:
+                current = index[entry["label"]]
+                current["keywords"] = list(current.get("keywords") or []) + list(entry.get("keywords") or [])
+                if "priority" in entry:
+                    current["priority"] = entry["priority"]
+            else:
+                target["labels"].append(dict(entry))
+    return merged
+
+def load_keyword_classifiers(path=INTENT_KEYWORDS_FILE):
+    extra = {}
+    if path:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                extra = json.load(f)
+        except (OSError, ValueError):
+            app.logger.warning("Could not read INTENT_KEYWORDS_FILE %s; using built-in keywords", path)
+    tables = _merge_keyword_tables(INTENT_KEYWORDS, extra)
+    return {name: KeywordClassifier(t["labels"], t.get("default")) for name, t in tables.items()}
+
+keyword_classifiers = load_keyword_classifiers()
+
+def benchmark_keyword_classifiers(n_messages=5000, repeat=20, seed=0):
+    """Compiled classify() vs the old substring scan on synthetic chat messages."""
+    rng = random.Random(seed)
+    filler = ("hello i am not sure what to do next and need some help with my plans today "
+              "مرحبا بدي ابدأ شي جديد اليوم بس مو عارف من وين كيف ممكن").split()
+    report = {}
+    for name, clf in keyword_classifiers.items():
+        kws = list(clf.keywords)
+        messages = []
+        for _ in range(n_messages):
+            words = rng.choices(filler, k=rng.randint(3, 40))
+            for _ in range(rng.choice((0, 0, 1, 2))):
+                words.insert(rng.randint(0, len(words)), rng.choice(kws))
+            messages.append(" ".join(words))
+        mismatches = sum(clf.classify(m) != clf.scan(m) for m in messages)
+        timings = {}
+        for label, fn in (("compiled", clf.classify), ("substring_scan", clf.scan)):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for m in messages:
+                    fn(m)
+            timings[label] = round((time.perf_counter() - start) / (repeat * n_messages) * 1e6, 3)
+        report[name] = {"keywords": len(kws), "mismatches": mismatches, "us_per_message": timings}
+    return report
+
 def _daily_seed(uid: str) -> str:
-    today = datetime.datetime.utcnow().strftime("%Y-%m-%d")
+    today = datetime.utcnow().strftime("%Y-%m-%d")
     return f"{uid}:{today}"
 
-def _safe_json(v, default):
-    if v is None:
-        return default
-    if isinstance(v, (dict, list)):
-        return v
-    try:
-        return json.loads(v)
-    except Exception:
-        return default
-
 def _infer_intent(msg: str) -> str:
-    m = (msg or "").lower()
-    if any(k in m for k in ["خطة أسبوع", "weekly", "أسبوع"]): return "weekly_plan"
-    if any(k in m for k in ["مشروع", "project", "فكرة مشروع"]): return "suggest_project"
-    if any(k in m for k in ["أتعلم", "تعلم", "learn", "دراسة"]): return "learn_now"
-    if any(k in m for k in ["أولويات", "رتب", "priorit"]): return "priorities"
-    if any(k in m for k in ["5 أسئلة", "تشخيص", "diagnose"]): return "diagnose"
-    return "chat"
+    return keyword_classifiers["intent"].classify(msg)
 
 def _coach_persona():
     return (
@@ -680,42 +1787,27 @@ def _coach_persona():
     )
 
 def _fetch_context(uid: str):
-    conn = get_conn()
-    try:
-        cur = conn.cursor()
-
-        cur.execute("SELECT display_name, avatar, bio, interests FROM profile WHERE firebase_uid = ?", (uid,))
-        prow = cur.fetchone()
-        profile = dict(prow) if prow else {}
-        profile["interests"] = _safe_json(profile.get("interests"), {})
-
-        cur.execute("SELECT direction, gaps, strengths FROM analysis WHERE firebase_uid = ? ORDER BY id DESC LIMIT 1", (uid,))
-        arow = cur.fetchone()
-        analysis = dict(arow) if arow else {}
-        analysis["gaps"] = _safe_json(analysis.get("gaps"), [])
-        analysis["strengths"] = _safe_json(analysis.get("strengths"), [])
-
-        cur.execute("SELECT big5_percent, label FROM big5 WHERE firebase_uid = ? ORDER BY id DESC LIMIT 1", (uid,))
-        brow = cur.fetchone()
-        big5 = dict(brow) if brow else {}
-        big5["big5_percent"] = _safe_json(big5.get("big5_percent"), {})
-
-        cur.execute("SELECT project_id, progress, updated_at FROM project_progress WHERE firebase_uid = ? ORDER BY updated_at DESC LIMIT 6", (uid,))
-        rows = cur.fetchall()
-        progress = [dict(r) for r in rows] if rows else []
-        for p in progress:
-            p["progress"] = _safe_json(p.get("progress"), {})
-
-        return {"profile": profile, "analysis": analysis, "big5": big5, "progress": progress}
-    finally:
-        conn.close()
+    bundle = _fetch_user_bundle(uid) or {}
+    profile = bundle.get("profile", {})
+    big5 = bundle.get("big5", {})
+
+    return {
+        "profile": {
+            "display_name": profile.get("display_name", ""),
+            "avatar": profile.get("avatar", ""),
+            "bio": profile.get("bio", ""),
+            "interests": profile.get("meta", {}),
+        },
+        "analysis": bundle.get("analysis", {}),
+        "big5": {"big5_percent": big5.get("percent") or {}, "label": big5.get("label") or ""},
+        "progress": (bundle.get("progress") or [])[:6],
+    }
 
 def _stuck_detect(history):
     # إذا آخر 3 رسائل user فيها كلمات تدل على عجز/تكرار
     user_texts = [m.get("content","") for m in (history or []) if m.get("role") == "user"][-3:]
     if len(user_texts) < 3: return False
-    j = " ".join(user_texts).lower()
-    return any(k in j for k in ["ضايع", "ما بعرف", "محتار", "مو قادر", "ما عم استفيد", "تعبت", "زهقان"])
+    return keyword_classifiers["stuck"].classify(" ".join(user_texts)) is not None
 
 def _fallback_response(message, ctx, intent, history):
     profile = ctx.get("profile", {})
@@ -762,41 +1854,229 @@ def _fallback_response(message, ctx, intent, history):
       "safety": {"flagged": False},
     }
 
-@app.post("/ai/coach")
-def ai_coach():
-    body = request.get_json(silent=True) or {}
-    uid = body.get("firebase_uid")
-    email = body.get("email")
-    message = (body.get("message") or "").strip()
-    intent = (body.get("intent") or "").strip()
-    history = body.get("history") or []
-
-    if not uid or not message:
-        return jsonify({"error": "firebase_uid and message are required"}), 400
-
-    # ensure user exists
-    conn = get_conn()
-    try:
-        ensure_user(conn, uid, email)
-    finally:
-        conn.close()
+# --- LLM pipeline: bounded pool, per-request timeout, optional SSE ---
+# Calls run on a small dedicated pool; a semaphore held until the call
+# really finishes caps in-flight requests, and anything that cannot get a
+# slot or misses its deadline is answered by _fallback_response instead
+# of tying up a Flask worker.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "20"))
+LLM_SLOT_WAIT = float(os.getenv("LLM_SLOT_WAIT", "0.5"))
+_llm_executor = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix="llm")
+_llm_slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+# Requests allowed to wait for a slot; beyond that /ai/coach answers 429
+LLM_QUEUE_DEPTH = int(os.getenv("LLM_QUEUE_DEPTH", str(LLM_MAX_CONCURRENCY)))
+_llm_admission = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY + LLM_QUEUE_DEPTH)
+
+# One client per (key, base URL) so its HTTP connection pool is reused across
+# calls; lru_cache keeps the map thread-safe and bounded for pool threads.
+@functools.lru_cache(maxsize=8)
+def _openai_client(api_key, base_url):
+    return OpenAI(api_key=api_key, base_url=base_url, timeout=LLM_TIMEOUT, max_retries=0)
+
+def _llm_client(api_key):
+    return _openai_client(api_key, os.environ.get("OPENAI_BASE_URL") or None)
+
+# --- Prompt compaction + response cache ---
+# The same user asking the same thing on the same day produces the same
+# prompt, so model output is cached (in-process LRU over a SQLite table)
+# under a hash of the compacted prompt inputs. The daily seed is part of
+# the context, so entries roll over naturally at UTC midnight, and any
+# profile/analysis change alters the context and therefore the key.
+LLM_HISTORY_TURNS = int(os.getenv("LLM_HISTORY_TURNS", "10"))
+LLM_HISTORY_CHARS = int(os.getenv("LLM_HISTORY_CHARS", "800"))
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "2000"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+LLM_CACHE_MAX_ROWS = int(os.getenv("LLM_CACHE_MAX_ROWS", "20000"))
+_LLM_CACHE_PRUNE_EVERY = 200
+
+_EMPTY_VALUES = (None, "", [], {})
+
+# Output contract, serialized once without indentation
+_COACH_TEMPLATE_OBJ = {
+    "assistant_message": "...",
+    "intent": "<intent>",
+    "priorities": ["...", "..."],
+    "today_task": "...",
+    "weekly_plan": {"days": [{"day": "Sat", "tasks": ["..."]}]},
+    "suggestions": [
+        {"label": "...", "message": "...", "intent": "..."},
+        {"label": "...", "type": "navigate", "to": "/matching"},
+    ],
+    "safety": {"flagged": False},
+}
+_COACH_TEMPLATE = json.dumps(_COACH_TEMPLATE_OBJ, ensure_ascii=False, separators=(",", ":"))
+
+def compact_context(value):
+    """Recursively drop None/empty leaves and trim strings before serialization."""
+    if isinstance(value, dict):
+        out = {}
+        for k, v in value.items():
+            v = compact_context(v)
+            if v not in _EMPTY_VALUES:
+                out[k] = v
+        return out
+    if isinstance(value, (list, tuple)):
+        return [v for v in (compact_context(x) for x in value) if v not in _EMPTY_VALUES]
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, float):
+        return round(value, 2)
+    return value
+
+def compact_history(history, turns=LLM_HISTORY_TURNS, max_chars=LLM_HISTORY_CHARS):
+    """Last `turns` distinct user/assistant messages, whitespace-collapsed and truncated."""
+    out, seen = [], set()
+    for m in reversed(history or []):
+        if not isinstance(m, dict) or m.get("role") not in ("user", "assistant"):
+            continue
+        content = m.get("content")
+        if not isinstance(content, str):
+            continue
+        content = " ".join(content.split())[:max_chars]
+        if not content or (m["role"], content) in seen:
+            continue
+        seen.add((m["role"], content))
+        out.append({"role": m["role"], "content": content})
+        if len(out) >= turns:
+            break
+    out.reverse()
+    return out
+
+def estimate_tokens(text):
+    # ~4 UTF-8 bytes per token holds up for both English and Arabic text;
+    # exact counts come from the API's usage block when it is returned.
+    return (len(text.encode("utf-8")) + 3) // 4
+
+class LLMTokenStats:
+    """Running prompt-size and usage counters for the coach LLM path."""
+
+    FIELDS = ("calls", "cache_hits", "prompt_tokens_raw_est", "prompt_tokens_est",
+              "input_tokens", "output_tokens")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = dict.fromkeys(self.FIELDS, 0)
+
+    def add(self, **deltas):
+        with self._lock:
+            for k, v in deltas.items():
+                self.counts[k] += int(v or 0)
+
+    def record_usage(self, usage):
+        if usage is not None:
+            self.add(input_tokens=getattr(usage, "input_tokens", 0),
+                     output_tokens=getattr(usage, "output_tokens", 0))
+
+    def stats(self):
+        with self._lock:
+            out = dict(self.counts)
+        raw = out["prompt_tokens_raw_est"]
+        out["compaction_saving"] = round(1 - out["prompt_tokens_est"] / raw, 4) if raw else 0.0
+        return out
+
+llm_token_stats = LLMTokenStats()
+
+class LLMResponseCache:
+    """Model output keyed by prompt hash: in-process LRU over the llm_cache table."""
+
+    def __init__(self, maxsize, ttl, max_rows):
+        self.memory = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.db_hits = 0
+        self.writes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        text = self.memory.get(key)
+        if text is not None:
+            return text
+        now = time.time()
+        conn = get_db_connection()
+        try:
+            row = conn.execute(
+                "SELECT response, expires_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row["expires_at"] <= now:
+                return None
+            conn.execute("UPDATE llm_cache SET hits = hits + 1, last_hit = ? WHERE key = ?", (now, key))
+            conn.commit()
+        except sqlite3.Error:
+            app.logger.warning("llm_cache read failed", exc_info=True)
+            return None
+        finally:
+            conn.close()
+        self.db_hits += 1
+        self.memory.set(key, row["response"], ttl=row["expires_at"] - now)
+        return row["response"]
+
+    def set(self, key, text):
+        now = time.time()
+        self.memory.set(key, text)
+        conn = get_db_connection()
+        try:
+            conn.execute("""
+                INSERT INTO llm_cache (key, response, created_at, expires_at, last_hit, hits)
+                VALUES (?, ?, ?, ?, ?, 0)
+                ON CONFLICT(key) DO UPDATE SET
+                    response = excluded.response,
+                    created_at = excluded.created_at,
+                    expires_at = excluded.expires_at,
+                    last_hit = excluded.last_hit
+            """, (key, text, now, now + self.ttl, now))
+            with self._lock:
+                self.writes += 1
+                prune = self.writes % _LLM_CACHE_PRUNE_EVERY == 0
+            if prune:
+                self._prune(conn, now)
+            conn.commit()
+        except sqlite3.Error:
+            app.logger.warning("llm_cache write failed", exc_info=True)
+        finally:
+            conn.close()
+
+    def _prune(self, conn, now):
+        conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+        excess = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_rows
+        if excess > 0:
+            conn.execute("""
+                DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM llm_cache ORDER BY last_hit LIMIT ?
+                )
+            """, (excess,))
+
+    def clear(self):
+        self.memory.clear()
+        conn = get_db_connection()
+        try:
+            conn.execute("DELETE FROM llm_cache")
+            conn.commit()
+        finally:
+            conn.close()
 
-    if not intent:
-        intent = _infer_intent(message)
+    def stats(self):
+        out = self.memory.stats()
+        out.update({"db_hits": self.db_hits, "writes": self.writes, "max_rows": self.max_rows})
+        return out
 
-    ctx = _fetch_context(uid)
+llm_cache = LLMResponseCache(LLM_CACHE_SIZE, LLM_CACHE_TTL, LLM_CACHE_MAX_ROWS)
 
-    # --- OpenAI real call (optional) ---
-    api_key = os.environ.get("OPENAI_API_KEY")
-    if not (_OPENAI_AVAILABLE and api_key):
-        return jsonify(_fallback_response(message, ctx, intent, history)), 200
+def _llm_model():
+    return os.environ.get("OPENAI_MODEL", "gpt-4.1-mini")
 
-    client = OpenAI(api_key=api_key)
+def _cacheable(text):
+    try:
+        return isinstance(json.loads(text), dict)
+    except Exception:
+        return False
 
+def _coach_messages(message, ctx, intent, history, uid):
+    """Build the compacted prompt -> (messages, cache_key, raw_tokens_est)."""
     # compact context passed to the model (personalization)
     profile = ctx.get("profile", {})
     meta = profile.get("interests", {}) if isinstance(profile.get("interests"), dict) else {}
-    context_obj = {
+    raw_context = {
         "display_name": profile.get("display_name"),
         "bio": profile.get("bio"),
         "skills": meta.get("skills", []),
@@ -805,42 +2085,96 @@ def ai_coach():
         "big5": ctx.get("big5", {}),
         "progress": ctx.get("progress", []),
         "daily_seed": _daily_seed(uid),
-        "intent": intent
     }
+    context_obj = compact_context(raw_context)
+    turns = compact_history(history)
+    persona = _coach_persona()
 
     # IMPORTANT: the model must return suggestions[] too (dynamic buttons)
-    prompt_user = f"""
-رسالة المستخدم: {message}
-
-أرجع JSON فقط بالشكل التالي:
-{{
-  "assistant_message": "...",
-  "intent": "{intent}",
-  "priorities": ["...", "..."],
-  "today_task": "...",
-  "weekly_plan": {{"days":[{{"day":"Sat","tasks":["..."]}}]}},
-  "suggestions": [
-    {{"label":"...", "message":"...", "intent":"..."}},
-    {{"label":"...", "type":"navigate", "to":"/matching"}}
-  ],
-  "safety": {{"flagged": false}}
-}}
-"""
+    template = _COACH_TEMPLATE.replace("<intent>", intent)
+    prompt_user = f"رسالة المستخدم: {message}\n\nأرجع JSON فقط بالشكل التالي:\n{template}"
+
+    messages = [
+        {"role":"system","content": persona},
+        {"role":"system","content": "Context(JSON): " + json.dumps(context_obj, ensure_ascii=False, separators=(",", ":"))},
+        *turns,
+        {"role":"user","content": prompt_user}
+    ]
 
-    resp = client.responses.create(
-        model=os.environ.get("OPENAI_MODEL", "gpt-4.1-mini"),
-        input=[
-            {"role":"system","content": _coach_persona()},
-            {"role":"system","content": "Context(JSON): " + json.dumps(context_obj, ensure_ascii=False)},
-            *history[-10:],
-            {"role":"user","content": prompt_user}
-        ],
+    key_src = json.dumps(
+        [_llm_model(), persona, context_obj, intent, turns, " ".join(message.lower().split())],
+        ensure_ascii=False, sort_keys=True, separators=(",", ":"),
+    )
+    cache_key = hashlib.sha256(key_src.encode("utf-8")).hexdigest()
+
+    # What the uncompacted prompt would have cost, for the savings ratio
+    raw_parts = [
+        persona,
+        json.dumps(raw_context, ensure_ascii=False),
+        message,
+        json.dumps(_COACH_TEMPLATE_OBJ, ensure_ascii=False, indent=2),
+        *(str(m.get("content", "")) for m in history[-10:] if isinstance(m, dict)),
+    ]
+    return messages, cache_key, sum(estimate_tokens(t) for t in raw_parts)
+
+def _note_llm_call(messages, raw_tokens_est):
+    llm_token_stats.add(
+        calls=1,
+        prompt_tokens_raw_est=raw_tokens_est,
+        prompt_tokens_est=sum(estimate_tokens(m["content"]) for m in messages),
+    )
+
+def _llm_complete(api_key, messages):
+    resp = _llm_client(api_key).responses.create(
+        model=_llm_model(),
+        input=messages,
         temperature=0.7,
     )
+    llm_token_stats.record_usage(getattr(resp, "usage", None))
+    return getattr(resp, "output_text", "") or ""
 
-    text = getattr(resp, "output_text", "") or ""
+def _llm_stream(api_key, messages, sink, cancelled):
+    """Push text deltas into `sink`; None marks the end of the stream."""
+    try:
+        stream = _llm_client(api_key).responses.create(
+            model=_llm_model(),
+            input=messages,
+            temperature=0.7,
+            stream=True,
+        )
+        try:
+            for event in stream:
+                if cancelled.is_set():
+                    break
+                kind = getattr(event, "type", "")
+                if kind == "response.output_text.delta":
+                    sink.put(getattr(event, "delta", "") or "")
+                elif kind == "response.completed":
+                    llm_token_stats.record_usage(getattr(getattr(event, "response", None), "usage", None))
+        finally:
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+    finally:
+        sink.put(None)
+
+def _submit_llm(fn, *args):
+    """Run fn on the LLM pool if a slot frees up quickly; None when saturated."""
+    if not _llm_slots.acquire(timeout=LLM_SLOT_WAIT):
+        return None
+    try:
+        future = _llm_executor.submit(fn, *args)
+    except Exception:
+        _llm_slots.release()
+        raise
+    future.add_done_callback(lambda _f: _llm_slots.release())
+    return future
+
+def _coach_result(text, message, ctx, intent, history):
     try:
         data = json.loads(text)
+        if not isinstance(data, dict):
+            raise ValueError("expected a JSON object")
     except Exception:
         data = _fallback_response(message, ctx, intent, history)
 
@@ -852,88 +2186,373 @@ def ai_coach():
             {"label":"قدّم على كوتش","type":"navigate","to":"/coach-apply"},
             *data["suggestions"]
         ][:6]
+    return data
+
+class _AssistantMessageExtractor:
+    """Incrementally decode the "assistant_message" string out of streamed JSON."""
+
+    _START = re.compile(r'"assistant_message"\s*:\s*"')
+    _ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f"}
+
+    def __init__(self):
+        self.seek = ""
+        self.pending = ""
+        self.state = "seek"   # seek -> inside -> done
+
+    def feed(self, chunk):
+        if self.state == "done":
+            return ""
+        if self.state == "seek":
+            self.seek += chunk
+            m = self._START.search(self.seek)
+            if not m:
+                self.seek = self.seek[-64:]
+                return ""
+            chunk, self.seek, self.state = self.seek[m.end():], "", "inside"
+
+        text, self.pending = self.pending + chunk, ""
+        out = []
+        i = 0
+        while i < len(text):
+            ch = text[i]
+            if ch == '"':
+                self.state = "done"
+                break
+            if ch != "\\":
+                out.append(ch)
+                i += 1
+                continue
+            if i + 1 >= len(text):
+                self.pending = text[i:]
+                break
+            esc = text[i + 1]
+            if esc != "u":
+                out.append(self._ESCAPES.get(esc, esc))
+                i += 2
+                continue
+            if i + 6 > len(text):
+                self.pending = text[i:]
+                break
+            try:
+                code = int(text[i + 2:i + 6], 16)
+            except ValueError:
+                i += 6
+                continue
+            if 0xD800 <= code < 0xDC00:
+                if i + 12 > len(text):
+                    self.pending = text[i:]
+                    break
+                try:
+                    low = int(text[i + 8:i + 12], 16)
+                except ValueError:
+                    low = 0
+                if text[i + 6:i + 8] == "\\u" and 0xDC00 <= low < 0xE000:
+                    out.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                    i += 12
+                    continue
+                i += 6
+                continue
+            out.append(chr(code))
+            i += 6
+        return "".join(out)
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _replay_coach(text, finish):
+    """SSE body for a cached answer: the whole message as one token, then done."""
+    try:
+        piece = json.loads(text).get("assistant_message") or ""
+    except Exception:
+        piece = ""
+    if piece:
+        yield _sse("token", {"text": piece})
+    yield _sse("done", finish(text))
+
+def _stream_coach(api_key, messages, finish, cache_key=None):
+    """SSE body: `token` events with assistant_message text, then one `done` event."""
+    sink = queue.Queue()
+    cancelled = threading.Event()
+    future = _submit_llm(_llm_stream, api_key, messages, sink, cancelled)
+    if future is None:
+        yield _sse("done", finish(""))
+        return
+
+    deadline = time.monotonic() + LLM_TIMEOUT
+    extractor = _AssistantMessageExtractor()
+    parts = []
+    complete = False
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                delta = sink.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if delta is None:
+                complete = True
+                break
+            parts.append(delta)
+            piece = extractor.feed(delta)
+            if piece:
+                yield _sse("token", {"text": piece})
+    finally:
+        cancelled.set()
+    # A stream cut off by the deadline is never valid JSON -> fallback
+    text = "".join(parts) if complete else ""
+    if cache_key and _cacheable(text):
+        llm_cache.set(cache_key, text)
+    yield _sse("done", finish(text))
+
+def _wants_stream(body):
+    return bool(body.get("stream")) or "text/event-stream" in (request.headers.get("Accept") or "")
+
+class _ReleaseOnClose:
+    """Response iterable that calls release() once, even if never iterated."""
+
+    def __init__(self, body_iter, release):
+        self._it = iter(body_iter)
+        self._release = release
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._it)
+
+    def close(self):
+        release, self._release = self._release, None
+        if release is not None:
+            try:
+                close = getattr(self._it, "close", None)
+                if close:
+                    close()
+            finally:
+                release()
+
+@app.post("/ai/coach")
+@rate_limited
+def ai_coach():
+    body = request.get_json(silent=True) or {}
+    uid = body.get("firebase_uid")
+    email = body.get("email")
+    message = (body.get("message") or "").strip()
+    intent = (body.get("intent") or "").strip()
+    history = body.get("history") or []
+    if not isinstance(history, list):
+        history = []
+
+    if not uid or not message:
+        return jsonify({"error": "firebase_uid and message are required"}), 400
+
+    # ensure user exists
+    ensure_user(uid, email)
+
+    if not intent:
+        intent = _infer_intent(message)
+
+    ctx = _fetch_context(uid)
+
+    def finish(text):
+        return _coach_result(text, message, ctx, intent, history)
+
+    # --- OpenAI real call (optional) ---
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not (_OPENAI_AVAILABLE and api_key):
+        if _wants_stream(body):
+            return Response(iter([_sse("done", finish(""))]), mimetype="text/event-stream")
+        return jsonify(_fallback_response(message, ctx, intent, history)), 200
+
+    messages, cache_key, raw_tokens = _coach_messages(message, ctx, intent, history, uid)
+    cached = llm_cache.get(cache_key)
+    # Don't sit on a pooled connection while the model answers; the cache
+    # write afterwards checks out its own.
+    release_request_db()
+    if cached is not None:
+        llm_token_stats.add(cache_hits=1)
+    elif not _llm_admission.acquire(blocking=False):
+        admission.note("denied_llm_busy")
+        return too_many_requests(LLM_SLOT_WAIT)
+    else:
+        _note_llm_call(messages, raw_tokens)
+
+    if _wants_stream(body):
+        if cached is not None:
+            body_iter = _replay_coach(cached, finish)
+        else:
+            body_iter = _ReleaseOnClose(_stream_coach(api_key, messages, finish, cache_key), _llm_admission.release)
+        response = Response(body_iter, mimetype="text/event-stream")
+        response.headers["Cache-Control"] = "no-cache"
+        response.headers["X-Accel-Buffering"] = "no"
+        return response
+
+    if cached is not None:
+        return jsonify(finish(cached)), 200
+
+    text = ""
+    try:
+        future = _submit_llm(_llm_complete, api_key, messages)
+        if future is not None:
+            try:
+                text = future.result(timeout=LLM_TIMEOUT)
+            except Exception:
+                app.logger.warning("LLM coach call failed or timed out; serving fallback")
+    finally:
+        _llm_admission.release()
+    if _cacheable(text):
+        llm_cache.set(cache_key, text)
 
-    return jsonify(data), 200
+    return jsonify(finish(text)), 200
 
 
 # ======================
 # AI Coach (Rule-based "AI" for MVP)
 # ======================
-def _stable_daily_rng(firebase_uid: str) -> random.Random:
-    day = datetime.utcnow().strftime("%Y-%m-%d")
-    seed_src = f"{firebase_uid}:{day}".encode("utf-8")
-    seed = int(hashlib.sha256(seed_src).hexdigest()[:12], 16)
-    return random.Random(seed)
+def _utc_day(now=None):
+    return (now or datetime.utcnow()).strftime("%Y-%m-%d")
 
+def _utc_day_validator():
+    """(day, midnight epoch): daily coach output turns over at 00:00 UTC."""
+    midnight = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return midnight.strftime("%Y-%m-%d"), midnight.timestamp()
 
-def _fetch_user_bundle(firebase_uid: str):
-    """Fetch everything AI needs in one place."""
-    conn = get_db_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, firebase_uid, email, role, coach_level, created_at FROM users WHERE firebase_uid = ?", (firebase_uid,))
-        u = cursor.fetchone()
-        if not u:
-            return None
-        user_id = u["id"]
-
-        cursor.execute("SELECT display_name, avatar, bio, interests FROM profile WHERE user_id = ?", (user_id,))
-        p = cursor.fetchone()
+def _stable_daily_rng(firebase_uid: str, day=None) -> random.Random:
+    day = day or _utc_day()
+    seed_src = f"{firebase_uid}:{day}".encode("utf-8")
+    seed = int(hashlib.sha256(seed_src).hexdigest()[:12], 16)
+    return random.Random(seed)
 
-        cursor.execute("SELECT strengths, gaps, direction FROM analysis WHERE user_id = ?", (user_id,))
-        a = cursor.fetchone()
 
-        cursor.execute("SELECT learning_style, decision_style, work_preference, motivation_state, clarity_level FROM personality WHERE user_id = ?", (user_id,))
-        pers = cursor.fetchone()
+# One row per user: every 1:1 table is LEFT JOINed and the latest progress
+# rows are folded into a JSON array, so a bundle costs a single query.
+_BUNDLE_SELECT = """
+    SELECT u.id, u.firebase_uid, u.email, u.role, u.coach_level, u.created_at, u.data_version,
+           p.user_id AS has_profile, p.display_name, p.avatar, p.bio, p.interests,
+           a.strengths, a.gaps, a.direction,
+           pers.user_id AS has_personality, pers.learning_style, pers.decision_style,
+           pers.work_preference, pers.motivation_state, pers.clarity_level,
+           b.pct_o, b.pct_c, b.pct_e, b.pct_a, b.pct_n,
+           b.label AS big5_label, b.created_at AS big5_created_at,
+           (
+               SELECT json_group_array(json_object(
+                   'project_id', pp.project_id, 'progress', pp.progress, 'tasks', pp.tasks
+               ))
+               FROM (
+                   SELECT project_id, progress, tasks FROM project_progress
+                   WHERE user_id = u.id ORDER BY id DESC LIMIT 12
+               ) pp
+           ) AS progress_json
+    FROM users u
+    LEFT JOIN profile p ON p.user_id = u.id
+    LEFT JOIN analysis a ON a.user_id = u.id
+    LEFT JOIN personality pers ON pers.user_id = u.id
+    LEFT JOIN big5 b ON b.user_id = u.id
+"""
 
-        cursor.execute("SELECT scores, result, created_at FROM big5 WHERE user_id = ?", (user_id,))
-        b5 = cursor.fetchone()
+_BUNDLE_BATCH = 500  # stays well under SQLite's bound-parameter limit
+
+def _bundle_from_row(r):
+    profile_meta = safe_json_loads(r["interests"], {})
+    if not isinstance(profile_meta, dict):
+        profile_meta = {"interests": profile_meta}
+
+    personality = {}
+    if r["has_personality"] is not None:
+        personality = {
+            "learning_style": r["learning_style"],
+            "decision_style": r["decision_style"],
+            "work_preference": r["work_preference"],
+            "motivation_state": r["motivation_state"],
+            "clarity_level": r["clarity_level"],
+        }
 
-        cursor.execute("SELECT project_id, progress, tasks FROM project_progress WHERE user_id = ? ORDER BY id DESC LIMIT 12", (user_id,))
-        prog = cursor.fetchall() or []
+    return {
+        "user": {
+            "id": r["id"],
+            "firebase_uid": r["firebase_uid"],
+            "email": r["email"],
+            "role": r["role"],
+            "coach_level": r["coach_level"],
+            "created_at": r["created_at"],
+            "data_version": r["data_version"] or 0,
+        },
+        "profile": {
+            "display_name": r["display_name"] or "",
+            "avatar": r["avatar"] or "",
+            "bio": r["bio"] or "",
+            "meta": profile_meta,
+        },
+        "analysis": {
+            "strengths": safe_json_loads(r["strengths"], []),
+            "gaps": safe_json_loads(r["gaps"], []),
+            "direction": r["direction"] or "",
+        },
+        "personality": personality,
+        "big5": {
+            "percent": dict(zip(BIG5_TRAITS, big5_row_percent(r) or ())),
+            "label": r["big5_label"] or "",
+            "created_at": r["big5_created_at"] or "",
+        },
+        "progress": [
+            {
+                "project_id": item.get("project_id"),
+                "progress": item.get("progress"),
+                "tasks": safe_json_loads(item.get("tasks"), []),
+            }
+            for item in safe_json_loads(r["progress_json"], [])
+        ],
+    }
 
-        profile_meta = safe_json_loads(p["interests"], {}) if p else {}
-        if not isinstance(profile_meta, dict):
-            profile_meta = {"interests": profile_meta}
+def fetch_user_bundles(firebase_uids):
+    """Load bundles for many users at once -> {firebase_uid: bundle}."""
+    uids = list(dict.fromkeys(u for u in (firebase_uids or []) if u))
+    bundles = {}
+    if not uids:
+        return bundles
 
-        return {
-            "user": dict(u),
-            "profile": {
-                "display_name": (p["display_name"] if p else "") or "",
-                "avatar": (p["avatar"] if p else "") or "",
-                "bio": (p["bio"] if p else "") or "",
-                "meta": profile_meta,
-            },
-            "analysis": {
-                "strengths": safe_json_loads(a["strengths"], []) if a else [],
-                "gaps": safe_json_loads(a["gaps"], []) if a else [],
-                "direction": (a["direction"] if a else "") or "",
-            },
-            "personality": dict(pers) if pers else {},
-            "big5": {
-                "scores": safe_json_loads(b5["scores"], {}) if b5 else {},
-                "result": safe_json_loads(b5["result"], {}) if b5 else {},
-                "created_at": (b5["created_at"] if b5 else "") or "",
-            },
-            "progress": [
-                {
-                    "project_id": r["project_id"],
-                    "progress": r["progress"],
-                    "tasks": safe_json_loads(r["tasks"], []),
-                }
-                for r in prog
-            ],
-        }
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        for i in range(0, len(uids), _BUNDLE_BATCH):
+            chunk = uids[i:i + _BUNDLE_BATCH]
+            marks = ", ".join("?" for _ in chunk)
+            cursor.execute(f"{_BUNDLE_SELECT} WHERE u.firebase_uid IN ({marks})", chunk)
+            for r in cursor.fetchall():
+                bundles[r["firebase_uid"]] = _bundle_from_row(r)
+        return bundles
     finally:
         conn.close()
 
+def iter_user_bundles(batch_size=_BUNDLE_BATCH):
+    """Yield every user's bundle in id order, one keyset page at a time."""
+    last_id = 0
+    while True:
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"{_BUNDLE_SELECT} WHERE u.id > ? ORDER BY u.id LIMIT ?",
+                (last_id, batch_size),
+            )
+            rows = cursor.fetchall()
+        finally:
+            conn.close()
+        if not rows:
+            return
+        for r in rows:
+            yield _bundle_from_row(r)
+        last_id = rows[-1]["id"]
+
+def _fetch_user_bundle(firebase_uid: str):
+    """Fetch everything AI needs in one place."""
+    return fetch_user_bundles([firebase_uid]).get(firebase_uid)
+
 
 def _big5_style(bundle, override_percent=None, override_label=None):
     """Return a compact style profile used by the planner."""
-    percent = override_percent or bundle.get("big5", {}).get("result", {}).get("percent")
-    if not isinstance(percent, dict):
-        # maybe stored as scores.percent
-        percent = bundle.get("big5", {}).get("scores", {}).get("percent")
+    percent = override_percent or bundle.get("big5", {}).get("percent")
     if not isinstance(percent, dict):
         percent = {}
 
@@ -949,9 +2568,7 @@ def _big5_style(bundle, override_percent=None, override_label=None):
     A = get("A")
     N = get("N")
 
-    label = override_label or bundle.get("big5", {}).get("result", {}).get("label") or ""
-    if not label and isinstance(bundle.get("big5", {}).get("scores", {}), dict):
-        label = (bundle.get("big5", {}).get("scores", {}).get("label") or "")
+    label = override_label or bundle.get("big5", {}).get("label") or ""
 
     return {
         "label": label,
@@ -1163,17 +2780,7 @@ def _learn_now(bundle, style, rng: random.Random):
     direction = (bundle.get("analysis", {}).get("direction") or "").strip() or "General Developer"
 
     # Reuse COURSE_CATALOG ranking logic
-    ranked = []
-    for c in COURSE_CATALOG:
-        sc = course_score(c, gaps, None, direction)
-        item = dict(c)
-        item["_score"] = sc
-        ranked.append(item)
-    ranked.sort(key=lambda x: x.get("_score", 0), reverse=True)
-
-    top = ranked[:3]
-    for t in top:
-        t.pop("_score", None)
+    top = [dict(c) for c in course_index.top_k(gaps, None, direction, 3)]
 
     focus = _pick_focus(bundle, rng)
     micro_steps = [
@@ -1293,23 +2900,12 @@ def _render_reply(action: str, payload: dict):
 
 
 def _infer_action(message: str):
-    m = (message or "").lower()
-    if any(k in m for k in ["priority", "priorit", "اولوي", "أولو", "رتب", "order"]):
-        return "priorities"
-    if any(k in m for k in ["week", "weekly", "خطة", "اسبوع", "أسبوع", "plan"]):
-        return "weekly_plan"
-    if any(k in m for k in ["project", "مشروع", "build", "idea"]):
-        return "project"
-    if any(k in m for k in ["learn", "تعلم", "course", "كور", "what now", "شو"]):
-        return "learn_now"
-    if any(k in m for k in ["motivat", "حماس", "تعب", "stress", "قلق"]):
-        return "daily"
-    return "priorities"
-
-
-def _generate_ai(action: str, bundle: dict, override_big5=None, override_label=None):
+    return keyword_classifiers["action"].classify(message)
+
+
+def _generate_ai(action: str, bundle: dict, override_big5=None, override_label=None, day=None):
     uid = (bundle.get("user", {}).get("firebase_uid") or "seed")
-    rng = _stable_daily_rng(uid)
+    rng = _stable_daily_rng(uid, day)
     style = _big5_style(bundle, override_percent=override_big5, override_label=override_label)
 
     if action == "priorities":
@@ -1328,7 +2924,94 @@ def _generate_ai(action: str, bundle: dict, override_big5=None, override_label=N
     return style, out
 
 
-@app.route("/ai/coach", methods=["POST"])
+# Output is a pure function of (uid, action, UTC day, overrides, stored data,
+# course catalog), so entries are keyed on all six and expire at the next
+# UTC midnight; a catalog hot reload changes the key instead of serving stale picks.
+coach_cache = LRUCache(maxsize=int(os.getenv("COACH_CACHE_SIZE", "10000")))
+
+def _override_key(override_big5, override_label):
+    if override_big5 is None and override_label is None:
+        return ""
+    raw = json.dumps([override_big5, override_label], sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+def _seconds_until_utc_midnight(now=None):
+    now = now or datetime.utcnow()
+    midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return max(1.0, (midnight - now).total_seconds())
+
+def _coach_output(bundle, action, override_big5=None, override_label=None, day=None):
+    style, out = _generate_ai(action, bundle, override_big5=override_big5, override_label=override_label, day=day)
+    return {
+        "style": style,
+        "output": out,
+        "reply": _render_reply(action, out),
+        "direction": bundle.get("analysis", {}).get("direction") or "",
+    }
+
+def read_coach_daily(user_id, day, action, version, catalog_version):
+    """Precomputed output for (user, day, action), if still current."""
+    conn = get_db_connection()
+    try:
+        row = conn.execute(
+            """
+            SELECT result FROM coach_daily
+            WHERE user_id = ? AND day = ? AND action = ? AND data_version = ? AND catalog_version = ?
+            """,
+            (user_id, day, action, version, catalog_version),
+        ).fetchone()
+    finally:
+        conn.close()
+    return safe_json_loads(row["result"], None) if row else None
+
+def generate_coach_output(firebase_uid, action, override_big5=None, override_label=None):
+    """
+    Cached wrapper around _generate_ai for one user.
+    Returns {"style", "output", "reply", "direction"} or None for unknown users.
+    Without overrides, the nightly coach_daily rows are tried before
+    generating live.
+    """
+    version = get_data_version(firebase_uid)
+    if version is None:
+        return None
+
+    now = datetime.utcnow()
+    day = _utc_day(now)
+    override = _override_key(override_big5, override_label)
+    catalog_version = course_index.version
+    key = (firebase_uid, action, day, override, version, catalog_version)
+    cached = coach_cache.get(key)
+    if cached is not None:
+        return cached
+
+    result = None
+    if not override and action in COACH_ACTIONS:
+        result = read_coach_daily(lookup_user_id(firebase_uid), day, action, version, catalog_version)
+
+    if result is None:
+        bundle = _fetch_user_bundle(firebase_uid)
+        if not bundle:
+            return None
+        result = _coach_output(bundle, action, override_big5=override_big5, override_label=override_label, day=day)
+    coach_cache.set(key, result, ttl=_seconds_until_utc_midnight(now))
+    return result
+
+
+def coach_fragments(result):
+    """style/output/reply as JSONFragments, encoded once per cached result."""
+    encoded = result.get("_encoded")
+    if encoded is None:
+        encoded = {k: JSONFragment.encode(result[k]) for k in ("style", "output", "reply")}
+        result["_encoded"] = encoded
+    return encoded
+
+
+# /ai/coach itself is the chat endpoint (ai_coach above); the rule-based
+# actions get their own rule so the two views no longer shadow each other.
+@app.route("/ai/coach/actions", methods=["POST"])
+# Backward compatible alias for older frontend builds
+@app.route("/ai-coach", methods=["POST"])
+@rate_limited
 def ai_coach_post():
     data = request.get_json() or {}
     firebase_uid = data.get("firebase_uid")
@@ -1340,9 +3023,6 @@ def ai_coach_post():
         return jsonify({"error": "Missing firebase_uid"}), 400
 
     ensure_user(firebase_uid, email)
-    bundle = _fetch_user_bundle(firebase_uid)
-    if not bundle:
-        return jsonify({"error": "User not found"}), 404
 
     # Overrides from frontend localStorage (recommended for MVP)
     override_big5 = data.get("big5_percent") if isinstance(data.get("big5_percent"), dict) else None
@@ -1351,43 +3031,295 @@ def ai_coach_post():
     if not action:
         action = _infer_action(message)
 
-    style, out = _generate_ai(action, bundle, override_big5=override_big5, override_label=override_label)
+    result = generate_coach_output(firebase_uid, action, override_big5=override_big5, override_label=override_label)
+    if not result:
+        return jsonify({"error": "User not found"}), 404
 
+    encoded = coach_fragments(result)
     payload = {
         "action": action,
         "generated_at": now_iso(),
-        "style": style,
-        "output": out,
-        "reply": _render_reply(action, out),
+        "style": encoded["style"],
+        "output": encoded["output"],
+        "reply": encoded["reply"],
     }
     return jsonify(payload)
 
 
-# Backward compatible alias for older frontend builds
-@app.route("/ai-coach", methods=["POST"])
-def ai_coach_alias():
-    return ai_coach_post()
-
-
 # Backward compatible simple GET
 @app.route("/ai-coach/<firebase_uid>", methods=["GET"])
+# outermost, so a 304 revalidation is charged like any other call
+@rate_limited
+# weak: generated_at differs between otherwise identical bodies
+@conditional_get("private, no-cache", depends=_utc_day_validator, weak=True)
 def ai_coach_legacy(firebase_uid):
     ensure_user(firebase_uid, None)
-    bundle = _fetch_user_bundle(firebase_uid)
-    if not bundle:
+    result = generate_coach_output(firebase_uid, "daily")
+    if not result:
         return jsonify({"error": "User not found"}), 404
-    style, out = _generate_ai("daily", bundle)
+    out = result["output"]
     return jsonify({
-        "direction": (bundle.get("analysis", {}).get("direction") or "General Developer"),
+        "direction": (result["direction"] or "General Developer"),
         "priority": out.get("focus") if isinstance(out, dict) else "Foundations",
         "advice": out.get("advice", []) if isinstance(out, dict) else [],
         "weekly_plan": [],
         "generated_at": now_iso(),
     })
 
+# ======================
+# Nightly coach precompute
+# ======================
+# Rule-based output is deterministic per (user, UTC day, action, data), so
+# `flask precompute-coach` renders every action for every user once a day
+# (e.g. from cron just after 00:00 UTC) and the endpoints above read the
+# rows back. Rows carry the users.data_version and course catalog version
+# they were built from; a profile edit or catalog reload later that day makes
+# them stale and the live path takes over.
+COACH_ACTIONS = ("priorities", "weekly_plan", "project", "learn_now", "daily")
+COACH_DAILY_KEEP_DAYS = int(os.getenv("COACH_DAILY_KEEP_DAYS", "2"))
+
+def _precompute_coach_batch(bundles, day):
+    """Worker: render all actions for a batch of bundles -> coach_daily rows."""
+    stamp = now_iso()
+    index = course_index  # the catalog this worker ranks learn_now against
+    rows = []
+    for bundle in bundles:
+        user = bundle["user"]
+        for action in COACH_ACTIONS:
+            result = _coach_output(bundle, action, day=day)
+            rows.append((
+                user["id"], day, action, user["data_version"], index.version,
+                json.dumps(result, ensure_ascii=False), stamp,
+            ))
+    return rows
+
+def _store_coach_rows(rows):
+    conn = get_db_connection()
+    try:
+        conn.executemany(
+            _upsert_sql("coach_daily",
+                        ("user_id", "day", "action", "data_version", "catalog_version", "result", "created_at"),
+                        ("user_id", "day", "action"),
+                        ("data_version", "catalog_version", "result", "created_at")),
+            rows,
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return len(rows)
+
+def precompute_coach_daily(day=None, workers=None, batch_size=_BUNDLE_BATCH):
+    """Fill coach_daily for `day` (default: today, UTC) across a process pool."""
+    day = day or _utc_day()
+    # Rank against the live catalog (file/table), not whatever was loaded at
+    # import; forked workers inherit the refreshed index
+    catalog_store.refresh()
+    started = time.perf_counter()
+    users = rows_written = 0
+
+    def batches():
+        batch = []
+        for bundle in iter_user_bundles(batch_size):
+            batch.append(bundle)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for batch in batches():
+            users += len(batch)
+            pending.append(pool.submit(_precompute_coach_batch, batch, day))
+            # keep a bounded number of batches in flight
+            if len(pending) >= workers * 2:
+                rows_written += _store_coach_rows(pending.popleft().result())
+        while pending:
+            rows_written += _store_coach_rows(pending.popleft().result())
+
+    conn = get_db_connection()
+    try:
+        cutoff = _utc_day(datetime.strptime(day, "%Y-%m-%d") - timedelta(days=COACH_DAILY_KEEP_DAYS))
+        pruned = conn.execute("DELETE FROM coach_daily WHERE day < ?", (cutoff,)).rowcount
+        conn.commit()
+    finally:
+        conn.close()
+
+    return {
+        "day": day,
+        "users": users,
+        "rows": rows_written,
+        "pruned": pruned,
+        "workers": workers,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
 # ======================
 # Save Progress
 # ======================
+# The project page saves on every checkbox toggle, so saves go to a
+# write-behind buffer keyed on (user, project): the request returns once
+# the update is buffered, later toggles of the same project overwrite the
+# buffered one, and a background thread writes everything pending in one
+# transaction every PROGRESS_FLUSH_INTERVAL seconds (sooner once
+# PROGRESS_MAX_PENDING keys are waiting). The buffer is flushed at exit.
+# get_project_progress reads through it; other readers (coach bundle,
+# exports) and other worker processes see a save after the next flush.
+# Each save is stamped with its request time and the upsert only replaces
+# an older stamp, so when two toggles land on different workers the last
+# one saved wins whichever flushes last. If a batch fails it is retried
+# row by row; a row that still fails PROGRESS_MAX_RETRIES flushes in a row
+# (e.g. its user was deleted) is logged and dropped.
+# PROGRESS_WRITE_BEHIND=0 writes synchronously as before.
+PROGRESS_WRITE_BEHIND = os.getenv("PROGRESS_WRITE_BEHIND", "1") != "0"
+PROGRESS_FLUSH_INTERVAL = float(os.getenv("PROGRESS_FLUSH_INTERVAL", "0.5"))
+PROGRESS_MAX_PENDING = int(os.getenv("PROGRESS_MAX_PENDING", "5000"))
+PROGRESS_MAX_RETRIES = int(os.getenv("PROGRESS_MAX_RETRIES", "3"))
+
+_PROGRESS_UPSERT_SQL = _upsert_sql(
+    "project_progress", ("user_id", "project_id", "progress", "tasks", "updated_at"),
+    ("user_id", "project_id"), ("progress", "tasks", "updated_at"),
+    "project_progress.updated_at IS NULL OR excluded.updated_at >= project_progress.updated_at",
+)
+
+def write_progress_rows(conn, rows):
+    """rows: [(user_id, project_id, progress, tasks_json, updated_at)], one transaction's worth."""
+    conn.executemany(_PROGRESS_UPSERT_SQL, rows)
+    user_ids = list(dict.fromkeys(r[0] for r in rows))
+    bump_data_versions(conn, user_ids)
+    # progress is not part of the dashboard snapshot: carry it forward, don't rebuild it
+    carry_user_snapshots(conn.cursor(), user_ids)
+
+class ProgressWriteBehind:
+    """Coalescing buffer of project_progress upserts with a flusher thread."""
+
+    def __init__(self, interval, max_pending):
+        self.interval = interval
+        self.max_pending = max(1, max_pending)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = {}   # (user_id, project_id) -> (progress, tasks_json, updated_at)
+        self._flushing = {}  # batch being written; still visible to get()
+        self._failures = {}  # key -> consecutive failed flushes
+        self._thread = None
+        self._pid = None
+        self.stats_counts = {"saves": 0, "coalesced": 0, "flushes": 0, "rows_written": 0, "errors": 0,
+                             "dropped": 0}
+
+    def _ensure_thread(self):
+        # A forked worker inherits the object but not the thread
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                    self._pid = os.getpid()
+                    self._thread = threading.Thread(target=self._run, name="progress-flush", daemon=True)
+                    self._thread.start()
+
+    def put(self, user_id, project_id, progress, tasks_json, updated_at):
+        key = (user_id, project_id)
+        with self._lock:
+            self.stats_counts["saves"] += 1
+            if key in self._pending:
+                self.stats_counts["coalesced"] += 1
+            self._pending[key] = (progress, tasks_json, updated_at)
+            full = len(self._pending) >= self.max_pending
+        self._ensure_thread()
+        if full:
+            self._wake.set()
+
+    def get(self, user_id, project_id):
+        """Buffered (progress, tasks_json, updated_at) not yet committed, or None."""
+        key = (user_id, project_id)
+        with self._lock:
+            return self._pending.get(key) or self._flushing.get(key)
+
+    def flush(self):
+        """
+        Write everything pending in one transaction; returns rows written.
+        If that fails, rows are written one per transaction and only the
+        ones that fail go back to the buffer (dropped after PROGRESS_MAX_RETRIES).
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._flushing = batch
+            if not batch:
+                return 0
+            conn = get_db_connection()
+            try:
+                try:
+                    write_progress_rows(conn, [(*key, *value) for key, value in batch.items()])
+                    conn.commit()
+                    written, failed = list(batch), {}
+                except Exception:
+                    conn.rollback()
+                    app.logger.exception("Progress flush of %d rows failed; retrying row by row", len(batch))
+                    written, failed = self._write_rows_singly(conn, batch)
+            finally:
+                conn.close()
+            with self._lock:
+                for key in written:
+                    self._failures.pop(key, None)
+                for key, value in failed.items():
+                    attempts = self._failures.get(key, 0) + 1
+                    if attempts >= PROGRESS_MAX_RETRIES:
+                        self._failures.pop(key, None)
+                        self.stats_counts["dropped"] += 1
+                        app.logger.error("Dropping progress save for user %s project %s after %d failed flushes",
+                                         key[0], key[1], attempts)
+                    else:
+                        self._failures[key] = attempts
+                        # keep it unless a newer save for the same key arrived meanwhile
+                        self._pending.setdefault(key, value)
+                self._flushing = {}
+                self.stats_counts["flushes"] += 1
+                self.stats_counts["rows_written"] += len(written)
+                self.stats_counts["errors"] += len(failed)
+            return len(written)
+
+    def _write_rows_singly(self, conn, batch):
+        written, failed = [], {}
+        for key, value in batch.items():
+            try:
+                write_progress_rows(conn, [(*key, *value)])
+                conn.commit()
+                written.append(key)
+            except Exception as e:
+                conn.rollback()
+                app.logger.warning("Progress save for user %s project %s failed: %s", key[0], key[1], e)
+                failed[key] = value
+        return written, failed
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                app.logger.exception("Progress flush failed; retrying next interval")
+
+    def stats(self):
+        with self._lock:
+            out = dict(self.stats_counts)
+            out["pending"] = len(self._pending)
+        out["flush_interval_s"] = self.interval
+        out["enabled"] = PROGRESS_WRITE_BEHIND
+        return out
+
+progress_buffer = ProgressWriteBehind(PROGRESS_FLUSH_INTERVAL, PROGRESS_MAX_PENDING)
+
+@atexit.register
+def _flush_progress_buffer():
+    try:
+        progress_buffer.flush()
+    except Exception:
+        app.logger.exception("Progress flush at exit failed")
+
 @app.route("/save-progress", methods=["POST"])
 def save_progress():
     data = request.get_json() or {}
@@ -1409,34 +3341,17 @@ def save_progress():
     if progress_num < 0 or progress_num > 100:
         return jsonify({"error": "Progress must be between 0 and 100"}), 400
 
-    conn = get_db_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id FROM users WHERE firebase_uid = ?", (firebase_uid,))
-        user = cursor.fetchone()
-        if not user:
-            return jsonify({"error": "User not found"}), 404
-
-        user_id = user["id"]
+    user_id = lookup_user_id(firebase_uid)
+    if user_id is None:
+        return jsonify({"error": "User not found"}), 404
 
-        cursor.execute("""
-            SELECT id FROM project_progress
-            WHERE user_id = ? AND project_id = ?
-        """, (user_id, project_id))
-        existing = cursor.fetchone()
-
-        if existing:
-            cursor.execute("""
-                UPDATE project_progress
-                SET progress = ?, tasks = ?
-                WHERE id = ?
-            """, (progress_num, json.dumps(tasks), existing["id"]))
-        else:
-            cursor.execute("""
-                INSERT INTO project_progress (user_id, project_id, progress, tasks)
-                VALUES (?, ?, ?, ?)
-            """, (user_id, project_id, progress_num, json.dumps(tasks)))
+    if PROGRESS_WRITE_BEHIND:
+        progress_buffer.put(user_id, project_id, progress_num, json.dumps(tasks), time.time())
+        return jsonify({"status": "progress_saved"})
 
+    conn = get_db_connection()
+    try:
+        write_progress_rows(conn, [(user_id, project_id, progress_num, json.dumps(tasks), time.time())])
         conn.commit()
         return jsonify({"status": "progress_saved"})
     finally:
@@ -1444,16 +3359,20 @@ def save_progress():
 
 @app.route("/project-progress/<firebase_uid>/<project_id>", methods=["GET"])
 def get_project_progress(firebase_uid, project_id):
+    user_id = lookup_user_id(firebase_uid)
+    if user_id is None:
+        return jsonify({"progress": 0, "tasks": []})
+
+    buffered = progress_buffer.get(user_id, project_id)
+    if buffered is not None:
+        return jsonify({
+            "progress": buffered[0],
+            "tasks": safe_json_loads(buffered[1], [])
+        })
+
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
-        cursor.execute("SELECT id FROM users WHERE firebase_uid = ?", (firebase_uid,))
-        user = cursor.fetchone()
-        if not user:
-            return jsonify({"progress": 0, "tasks": []})
-
-        user_id = user["id"]
-
         cursor.execute("""
             SELECT progress, tasks
             FROM project_progress
@@ -1513,31 +3432,361 @@ COURSE_CATALOG = [
     },
 ]
 
-def course_score(course, gaps, level, direction):
-    score = 0
-    tags = course.get("tags", []) or []
-    title = (course.get("title") or "").lower()
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
 
-    # gaps boost (better match)
-    for g in (gaps or []):
-        g_low = (g or "").lower().strip()
-        if not g_low:
-            continue
-        if any(g_low in (t or "").lower() for t in tags) or g_low in title:
-            score += 5
+class CourseIndex:
+    """
+    Precomputed lookup structures over a course list, scoring exactly like
+    the old per-course scan (kept as the oracle in tests/test_course_index.py):
+    a gap matches when it is a substring of any tag or of the title. Every distinct lowercased tag/title is indexed once and located
+    through a trigram index, so a query only touches courses that can score.
+    Ties keep catalog order, as the old stable sort did.
+    """
+
+    def __init__(self, courses):
+        self.courses = list(courses)
+        # content hash; user_snapshot rows record which catalog they were built from
+        self.version = hashlib.sha1(
+            json.dumps(self.courses, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()[:16]
+        self.texts = []            # distinct lowercased tags + titles
+        self.text_courses = []     # text id -> course positions
+        self.grams = {}            # trigram -> text ids
+        self.tags = {}             # exact lowercased tag -> course positions
+        self.levels = {}           # lowercased level -> course positions
+        self.built_at = time.time()
+        self.encoded = {}          # (id(course), reason) -> JSONFragment, filled on demand
+
+        text_ids = {}
+        for pos, course in enumerate(self.courses):
+            tags = [(t or "").lower() for t in (course.get("tags", []) or [])]
+            title = (course.get("title") or "").lower()
+            for text in set(tags + [title]):
+                tid = text_ids.get(text)
+                if tid is None:
+                    tid = text_ids[text] = len(self.texts)
+                    self.texts.append(text)
+                    self.text_courses.append([])
+                    for gram in _trigrams(text):
+                        self.grams.setdefault(gram, []).append(tid)
+                self.text_courses[tid].append(pos)
+            for tag in set(tags):
+                self.tags.setdefault(tag, []).append(pos)
+            self.levels.setdefault((course.get("level") or "").lower(), []).append(pos)
+
+    def __len__(self):
+        return len(self.courses)
+
+    def _matching_courses(self, needle):
+        if len(needle) < 3:
+            text_ids = [tid for tid, text in enumerate(self.texts) if needle in text]
+        else:
+            postings = []
+            for gram in _trigrams(needle):
+                ids = self.grams.get(gram)
+                if not ids:
+                    return set()
+                postings.append(ids)
+            postings.sort(key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+            text_ids = [tid for tid in candidates if needle in self.texts[tid]]
+
+        matched = set()
+        for tid in text_ids:
+            matched.update(self.text_courses[tid])
+        return matched
+
+    def scores(self, gaps, level, direction):
+        """Sparse {position: score} for every course with a non-zero score."""
+        scores = {}
+        matches = {}
+        for g in (gaps or []):
+            g_low = (g or "").lower().strip()
+            if not g_low:
+                continue
+            if g_low not in matches:
+                matches[g_low] = self._matching_courses(g_low)
+            for pos in matches[g_low]:
+                scores[pos] = scores.get(pos, 0) + 5
+
+        if level:
+            for pos in self.levels.get(str(level).lower(), []):
+                scores[pos] = scores.get(pos, 0) + 2
+
+        if direction and "frontend" in direction.lower():
+            for pos in self.tags.get("react", []):
+                scores[pos] = scores.get(pos, 0) + 1
+
+        return scores
+
+    def top_k(self, gaps, level, direction, k):
+        """Best k courses, highest score first, then catalog order."""
+        scores = self.scores(gaps, level, direction)
+        best = heapq.nsmallest(k, scores.items(), key=lambda kv: (-kv[1], kv[0]))
+        ranked = [pos for pos, _ in best]
+        if len(ranked) < k:
+            for pos in range(len(self.courses)):
+                if pos not in scores:
+                    ranked.append(pos)
+                    if len(ranked) == k:
+                        break
+        return [self.courses[pos] for pos in ranked]
+
+    def fragment(self, course, reason):
+        """Course + reason as a JSONFragment, encoded once per index."""
+        key = (id(course), reason)
+        frag = self.encoded.get(key)
+        if frag is None:
+            frag = self.encoded[key] = JSONFragment.encode({**course, "reason": reason})
+        return frag
+
+course_index = CourseIndex(COURSE_CATALOG)
+
+def reload_course_catalog(courses):
+    """Rebuild the index off to the side, then swap it in with one assignment."""
+    global COURSE_CATALOG, course_index
+    index = CourseIndex(courses)
+    COURSE_CATALOG, course_index = index.courses, index
+    return index
+
+# ======================
+# Courses: external catalog store
+# ======================
+# Source priority: COURSE_CATALOG_FILE (JSON array or NDJSON), then the
+# `courses` table, then the built-in list above.
+BUILTIN_COURSE_CATALOG = COURSE_CATALOG
+COURSE_CATALOG_FILE = os.getenv("COURSE_CATALOG_FILE", "")
+CATALOG_RELOAD_INTERVAL = float(os.getenv("CATALOG_RELOAD_INTERVAL", "30"))
+COURSE_FIELDS = ("id", "title", "provider", "level", "duration", "tags", "url")
+
+def _normalize_course(raw):
+    if not isinstance(raw, dict) or not raw.get("id") or not raw.get("title"):
+        return None
+    tags = safe_json_loads(raw.get("tags"), [])
+    if not isinstance(tags, list):
+        tags = []
+    # Tags and levels repeat across thousands of rows; intern them once
+    return {
+        "id": str(raw["id"]),
+        "title": str(raw["title"]),
+        "provider": sys.intern(str(raw.get("provider") or "")),
+        "level": sys.intern(str(raw.get("level") or "")),
+        "duration": sys.intern(str(raw.get("duration") or "")),
+        "tags": [sys.intern(str(t)) for t in tags if t],
+        "url": str(raw.get("url") or ""),
+    }
+
+CATALOG_PARSE_CHUNK = 1 << 20
+
+def _iter_json_array(mm, chunk=CATALOG_PARSE_CHUNK):
+    """Yield the elements of a top-level JSON array, decoding the mmap a chunk at a time."""
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buf, pos, offset, started = "", 0, 0, False
+    while True:
+        if offset < len(mm):
+            buf = buf[pos:] + utf8.decode(mm[offset:offset + chunk])
+            offset += chunk
+            pos = 0
+        eof = offset >= len(mm)
+        while True:
+            while pos < len(buf) and (buf[pos].isspace() or (started and buf[pos] == ",")):
+                pos += 1
+            if pos == len(buf):
+                break
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError("catalog file is not a JSON array")
+                started, pos = True, pos + 1
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                break  # element runs past this chunk
+            nxt = end
+            while nxt < len(buf) and buf[nxt].isspace():
+                nxt += 1
+            if nxt == len(buf) or buf[nxt] not in ",]":
+                if not eof:
+                    break  # e.g. a number cut at the chunk edge: decode it again with more text
+                if nxt < len(buf):
+                    raise ValueError(f"unexpected {buf[nxt]!r} in catalog array")
+            yield item
+            pos = end
+        if eof:
+            raise ValueError("unterminated JSON array in catalog file")
+
+def read_catalog_file(path):
+    """
+    Parse a JSON array or NDJSON catalog straight from a read-only mmap:
+    the file's pages stay in the shared page cache and each process only
+    holds the parsed courses, never a private copy of the whole file.
+    """
+    courses = []
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return courses
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            head = mm[:64].lstrip()
+            if head.startswith(b"[") and _ORJSON_AVAILABLE:
+                with memoryview(mm) as view:  # orjson parses the mapping in place
+                    rows = orjson.loads(view)
+            elif head.startswith(b"["):
+                rows = _iter_json_array(mm)
+            else:
+                rows = (json.loads(line) for line in iter(mm.readline, b"") if line.strip())
+            for raw in rows:
+                course = _normalize_course(raw)
+                if course:
+                    courses.append(course)
+    return courses
+
+def read_catalog_table(conn):
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {', '.join(COURSE_FIELDS)} FROM courses ORDER BY position, rowid")
+    courses = []
+    for row in cursor:
+        course = _normalize_course(dict(row))
+        if course:
+            courses.append(course)
+    return courses
+
+def import_courses(courses):
+    """Upsert courses into the `courses` table, keeping their input order."""
+    rows = [c for c in (_normalize_course(c) for c in courses) if c]
+    stamp = now_iso()
+    columns = COURSE_FIELDS + ("position", "updated_at")
+    sql = _upsert_sql("courses", columns, ("id",), columns[1:])
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM courses")
+        start = cursor.fetchone()[0]
+        cursor.executemany(sql, [
+            (*(json.dumps(c["tags"]) if f == "tags" else c[f] for f in COURSE_FIELDS), start + i, stamp)
+            for i, c in enumerate(rows)
+        ])
+        conn.commit()
+        return len(rows)
+    finally:
+        conn.close()
+
+class CatalogStore:
+    """
+    Keeps course_index in sync with the external catalog source.
+    A background thread polls a cheap signature (file mtime/size or the
+    table's row count + newest updated_at) and rebuilds only on change;
+    requests keep reading the previous index until the swap.
+    """
 
-    # level match
-    if level and (course.get("level", "").lower() == str(level).lower()):
-        score += 2
+    def __init__(self, interval):
+        self.interval = interval
+        self.source = "builtin"
+        self.signature = None
+        self.loaded_at = None
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _signature(self):
+        if COURSE_CATALOG_FILE:
+            st = os.stat(COURSE_CATALOG_FILE)
+            return ("file", COURSE_CATALOG_FILE, st.st_mtime_ns, st.st_size)
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT COUNT(*), MAX(updated_at) FROM courses")
+            except sqlite3.OperationalError:
+                return ("builtin",)
+            count, newest = cursor.fetchone()
+            return ("table", count, newest) if count else ("builtin",)
+        finally:
+            conn.close()
+
+    def _load(self, signature):
+        kind = signature[0]
+        if kind == "file":
+            return read_catalog_file(COURSE_CATALOG_FILE)
+        if kind == "table":
+            conn = get_db_connection()
+            try:
+                return read_catalog_table(conn)
+            finally:
+                conn.close()
+        return BUILTIN_COURSE_CATALOG
+
+    def refresh(self, force=False):
+        """Reload when the source changed; returns True if a new index was swapped in."""
+        with self._lock:
+            try:
+                signature = self._signature()
+                if not force and signature == self.signature:
+                    return False
+                courses = self._load(signature)
+                reload_course_catalog(courses)
+                self.source = signature[0]
+                self.signature = signature
+                self.loaded_at = now_iso()
+                self.last_error = None
+                return True
+            except Exception as e:
+                self.last_error = str(e)
+                app.logger.exception("Course catalog reload failed")
+                return False
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.refresh()
+
+    def start(self):
+        if self._thread is not None or self.interval <= 0:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="catalog-reloader", daemon=True)
+                self._thread.start()
+
+    def status(self):
+        return {
+            "source": self.source,
+            "courses": len(course_index),
+            "loaded_at": self.loaded_at,
+            "reload_interval_s": self.interval,
+            "last_error": self.last_error,
+        }
+
+catalog_store = CatalogStore(CATALOG_RELOAD_INTERVAL)
+# Warm at import so no request pays the first load; with a preloading WSGI
+# server (gunicorn --preload) forked workers inherit this index copy-on-write.
+catalog_store.refresh()
 
-    # direction hint (simple)
-    if direction and "frontend" in direction.lower():
-        if any((t or "").lower() == "react" for t in tags):
-            score += 1
+COURSE_REASON = "Recommended based on your gaps and learning path."
 
-    return score
+def course_recommendations(gaps, direction, index=None, encoded=False):
+    """Top 18 courses with a reason; encoded=True returns JSONFragments for responses."""
+    # NOTE: if you store level later in DB, wire it here
+    level = None
+    index = index or course_index
+
+    ranked = []
+    for c in index.top_k(gaps, level, direction, 18):
+        if encoded:
+            ranked.append(index.fragment(c, COURSE_REASON))
+            continue
+        item = dict(c)
+        item["reason"] = COURSE_REASON
+        ranked.append(item)
+    return ranked
 
 @app.route("/courses/<firebase_uid>", methods=["GET"])
+@conditional_get("private, no-cache", depends=lambda: (course_index.version, course_index.built_at))
 def get_courses(firebase_uid):
     conn = get_db_connection()
     try:
@@ -1558,24 +3807,105 @@ def get_courses(firebase_uid):
             gaps = safe_json_loads(a["gaps"], [])
             direction = a["direction"] or direction
 
-        # NOTE: if you store level later in DB, wire it here
-        level = None
+        return jsonify({"courses": course_recommendations(gaps, direction, encoded=True)})
+    finally:
+        conn.close()
+
+# ======================
+# Dashboard read model
+# ======================
+# user_snapshot keeps each user's whole dashboard (profile, analysis, big5,
+# personality, projects, courses) as one pre-serialized JSON document.
+# Write routes rebuild it in the same transaction as their change (progress
+# saves, which it does not show, only carry its version forward), so
+# /dashboard/<uid> is one indexed lookup that returns the stored text as-is.
+# Rows remember the users.data_version and catalog they were built from;
+# a writer that skipped the refresh or a catalog reload costs one lazy
+# rebuild on the next read.
+_SNAPSHOT_SELECT = """
+    SELECT u.id, u.data_version,
+           p.user_id AS has_profile, p.display_name, p.avatar, p.bio, p.interests,
+           a.user_id AS has_analysis, a.strengths, a.gaps, a.direction,
+           pers.user_id AS has_personality, pers.learning_style, pers.decision_style,
+           pers.work_preference, pers.motivation_state, pers.clarity_level, pers.mbti_type,
+           pers.mbti_scores, pers.mbti_answers, pers.mbti_percentages,
+           b.user_id AS has_big5, {big5_columns}
+    FROM users u
+    LEFT JOIN profile p ON p.user_id = u.id
+    LEFT JOIN analysis a ON a.user_id = u.id
+    LEFT JOIN personality pers ON pers.user_id = u.id
+    LEFT JOIN big5 b ON b.user_id = u.id
+""".format(big5_columns=", ".join(f"b.{c}" for c in BIG5_VIEW_COLUMNS))
+
+def _snapshot_payload(r, index, stamp):
+    analysis = analysis_view(r) if r["has_analysis"] is not None else None
+    gaps = analysis["gaps"] if analysis else []
+    direction = (analysis["direction"] if analysis else None) or "General Developer"
+    return {
+        "profile": profile_view(r) if r["has_profile"] is not None else None,
+        "analysis": analysis,
+        "big5": big5_view(r) if r["has_big5"] is not None else None,
+        "personality": personality_view(r) if r["has_personality"] is not None else None,
+        "projects": project_suggestions(gaps, r["learning_style"], r["motivation_state"]) if analysis else [],
+        "courses": course_recommendations(gaps, direction, index),
+        "generated_at": stamp,
+    }
+
+def refresh_user_snapshots(cursor, user_ids):
+    """Rebuild user_snapshot rows inside the caller's transaction -> {user_id: payload}."""
+    ids = list(dict.fromkeys(user_ids))
+    index = course_index
+    stamp = now_iso()
+    rows = []
+    for i in range(0, len(ids), _BULK_PARAMS):
+        chunk = ids[i:i + _BULK_PARAMS]
+        marks = ", ".join("?" for _ in chunk)
+        cursor.execute(f"{_SNAPSHOT_SELECT} WHERE u.id IN ({marks})", chunk)
+        for r in cursor.fetchall():
+            payload = app.json.encode(_snapshot_payload(r, index, stamp)).decode("utf-8")
+            rows.append((r["id"], r["data_version"] or 0, index.version, payload, stamp))
+    if rows:
+        columns = ("user_id", "data_version", "catalog_version", "payload", "updated_at")
+        cursor.executemany(_upsert_sql("user_snapshot", columns, ("user_id",), columns[1:]), rows)
+    return {row[0]: row[3] for row in rows}
+
+_CARRY_SNAPSHOT_SQL = """
+    UPDATE user_snapshot SET data_version = (SELECT data_version FROM users WHERE id = ?)
+    WHERE user_id = ? AND data_version = (SELECT data_version FROM users WHERE id = ?) - 1
+"""
+
+def carry_user_snapshots(cursor, user_ids):
+    """
+    For writes that change nothing the snapshot shows (project progress):
+    after the data_version bump, move snapshots that were current onto the
+    new version instead of rebuilding them. Stale ones stay stale.
+    """
+    cursor.executemany(_CARRY_SNAPSHOT_SQL, [(u, u, u) for u in dict.fromkeys(user_ids)])
 
-        ranked = []
-        for c in COURSE_CATALOG:
-            sc = course_score(c, gaps, level, direction)
-            item = dict(c)
-            item["reason"] = "Recommended based on your gaps and learning path."
-            item["_score"] = sc
-            ranked.append(item)
+@app.route("/dashboard/<firebase_uid>", methods=["GET"])
+def dashboard(firebase_uid):
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT u.id, s.payload,
+                   s.data_version = COALESCE(u.data_version, 0) AND s.catalog_version = ? AS fresh
+            FROM users u
+            LEFT JOIN user_snapshot s ON s.user_id = u.id
+            WHERE u.firebase_uid = ?
+        """, (course_index.version, firebase_uid))
+        row = cursor.fetchone()
 
-        ranked.sort(key=lambda x: x["_score"], reverse=True)
-        for r in ranked:
-            r.pop("_score", None)
+        if not row:
+            return jsonify({"error": "User not found"}), 404
 
-        return jsonify({"courses": ranked[:18]})
+        payload = row["payload"]
+        if not row["fresh"]:
+            payload = refresh_user_snapshots(cursor, [row["id"]])[row["id"]]
+            conn.commit()
     finally:
         conn.close()
+    return Response(payload, mimetype="application/json")
 
 # ======================
 # Coach Apply
@@ -1635,6 +3965,464 @@ def coach_apply():
     finally:
         conn.close()
 
+COACH_APPLICATION_FIELDS = ("id", "user_id", "full_name", "email", "field", "years_experience",
+                            "linkedin", "github", "portfolio", "bio", "motivation",
+                            "availability_hours", "status", "created_at")
+
+@app.route("/admin/coach-applications", methods=["GET"])
+def admin_coach_applications():
+    """Review queue: newest first per status, paged with ?before=<created_at>."""
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+
+    status = (request.args.get("status") or "pending").strip()
+    before = request.args.get("before")
+    try:
+        limit = max(1, min(int(request.args.get("limit", 50)), 500))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+
+    sql = f"SELECT {', '.join(COACH_APPLICATION_FIELDS)} FROM coach_applications WHERE status = ?"
+    params = [status]
+    if before:
+        sql += " AND created_at < ?"
+        params.append(before)
+    sql += " ORDER BY created_at DESC LIMIT ?"
+    params.append(limit)
+
+    conn = get_db_connection()
+    try:
+        rows = [dict(r) for r in conn.execute(sql, params).fetchall()]
+    finally:
+        conn.close()
+    return jsonify({
+        "applications": rows,
+        "next_before": rows[-1]["created_at"] if len(rows) == limit else None,
+    })
+
+# ======================
+# Bulk import
+# ======================
+BULK_CHUNK = int(os.getenv("BULK_CHUNK", "500"))
+
+def _bulk_personality(record):
+    return personality_values(record)
+
+def _bulk_big5(record):
+    scores, answers, result = big5_payload(record)
+    return {**big5_columns(scores, answers, result), "created_at": now_iso()}
+
+def _bulk_analysis(record):
+    analysis_result = analysis_for(record)
+    return {
+        "strengths": json.dumps(analysis_result["strengths"]),
+        "gaps": json.dumps(analysis_result["gaps"]),
+        "direction": analysis_result["direction"],
+    }
+
+# kind -> (table, column builder); builders raise ValueError for bad records
+BULK_KINDS = {
+    "personality": ("personality", _bulk_personality),
+    "big5": ("big5", _bulk_big5),
+    "analysis": ("analysis", _bulk_analysis),
+}
+
+def _after_bulk_write(kind, written):
+    """Keep in-memory matching state in line with what was just committed."""
+    if kind == "big5":
+        directions = analysis_directions([user_id for user_id, _ in written])
+        for user_id, values in written:
+            peer_matcher.upsert(user_id, big5_row_percent(values), directions.get(user_id))
+    elif kind == "analysis":
+        for user_id, values in written:
+            peer_matcher.set_direction(user_id, values["direction"])
+    if kind in ("big5", "analysis"):
+        refresh_peer_vectors(list({user_id for user_id, _ in written}))
+
+def bulk_write(kind, records, offset=0):
+    """
+    Validate, resolve users and write one chunk in a single transaction.
+    Returns one status dict per record, in input order.
+    """
+    table, build = BULK_KINDS[kind]
+    results = [None] * len(records)
+    for i, rec in enumerate(records):
+        if not isinstance(rec, dict):
+            results[i] = {"index": offset + i, "status": "error", "error": "Record must be a JSON object"}
+        elif not rec.get("firebase_uid"):
+            results[i] = {"index": offset + i, "status": "error", "error": "Missing firebase_uid"}
+        elif not _valid_firebase_uid(rec["firebase_uid"]):
+            # checked before the uid is used as a dict key: lists/dicts are unhashable
+            results[i] = {"index": offset + i, "status": "error", "error": "Invalid firebase_uid"}
+        elif rec.get("email") is not None and not isinstance(rec["email"], str):
+            results[i] = {"index": offset + i, "firebase_uid": rec["firebase_uid"],
+                          "status": "error", "error": "email must be a string"}
+
+    ids = ensure_users(
+        (rec["firebase_uid"], rec.get("email")) for i, rec in enumerate(records) if results[i] is None
+    )
+
+    written, pending = [], []
+    for i, rec in enumerate(records):
+        if results[i] is not None:
+            continue
+        uid = rec["firebase_uid"]
+        user_id = ids.get(uid)
+        if user_id is None:
+            results[i] = {"index": offset + i, "firebase_uid": uid, "status": "error", "error": "Invalid firebase_uid"}
+            continue
+        try:
+            values = build(rec)
+        except (ValueError, TypeError) as e:
+            results[i] = {"index": offset + i, "firebase_uid": uid, "status": "error", "error": str(e)}
+            continue
+        written.append((user_id, values))
+        pending.append(i)
+
+    if written:
+        columns = ("user_id",) + tuple(written[0][1])
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.executemany(
+                _upsert_sql(table, columns, ("user_id",), columns[1:]),
+                [(user_id, *values.values()) for user_id, values in written],
+            )
+            bump_data_versions(conn, [user_id for user_id, _ in written])
+            refresh_user_snapshots(cursor, [user_id for user_id, _ in written])
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            for i in pending:
+                results[i] = {"index": offset + i, "firebase_uid": records[i]["firebase_uid"],
+                              "status": "error", "error": str(e)}
+            return results
+        finally:
+            conn.close()
+        _after_bulk_write(kind, written)
+
+    for i in pending:
+        results[i] = {"index": offset + i, "firebase_uid": records[i]["firebase_uid"], "status": "ok"}
+    return results
+
+def _iter_bulk_records():
+    """Records from an NDJSON body (streamed line by line) or a JSON array."""
+    if request.mimetype in ("application/x-ndjson", "application/jsonlines") or request.args.get("format") == "ndjson":
+        for raw in request.stream:
+            line = raw.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+        return
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get("records")
+    if not isinstance(data, list):
+        raise ValueError("Body must be a JSON array, {\"records\": [...]} or NDJSON")
+    yield from data
+
+@app.route("/bulk/<kind>", methods=["POST"])
+def bulk_import(kind):
+    """Admin-only cohort import for personality, big5 or analysis results."""
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    if kind not in BULK_KINDS:
+        return jsonify({"error": f"Unknown kind; choose one of {sorted(BULK_KINDS)}"}), 400
+
+    results, chunk = [], []
+    try:
+        for rec in _iter_bulk_records():
+            chunk.append(rec)
+            if len(chunk) >= BULK_CHUNK:
+                results.extend(bulk_write(kind, chunk, len(results)))
+                chunk = []
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if chunk:
+        results.extend(bulk_write(kind, chunk, len(results)))
+
+    saved = sum(1 for r in results if r["status"] == "ok")
+    return jsonify({
+        "kind": kind,
+        "total": len(results),
+        "saved": saved,
+        "failed": len(results) - saved,
+        "results": results,
+    })
+
+# ======================
+# Admin: streaming export
+# ======================
+# Per table: exportable columns, which of them hold JSON text, and the
+# timestamp column `since=` filters on (None = only since_id applies).
+EXPORT_TABLES = {
+    "users": {
+        "columns": ("email", "role", "coach_level", "created_at", "data_version"),
+        "json": (),
+        "time": "created_at",
+    },
+    "profile": {
+        "columns": ("display_name", "avatar", "bio", "interests"),
+        "json": ("interests",),
+        "time": None,
+    },
+    "personality": {
+        "columns": ("learning_style", "decision_style", "work_preference", "motivation_state",
+                    "clarity_level", "mbti_type", "mbti_scores", "mbti_answers", "mbti_percentages"),
+        "json": ("mbti_scores", "mbti_answers", "mbti_percentages"),
+        "time": None,
+    },
+    "analysis": {
+        "columns": ("strengths", "gaps", "direction"),
+        "json": ("strengths", "gaps"),
+        "time": None,
+    },
+    "big5": {
+        "columns": ("scores", "answers", "result", "created_at"),
+        "json": ("scores", "answers", "result"),
+        "packed": {"answers": "answers_packed"},
+        # NULL scores/result are rebuilt from the typed columns (big5_scores_result)
+        "typed": ("scores", "result"),
+        "time": "created_at",
+    },
+    "project_progress": {
+        "columns": ("project_id", "progress", "tasks"),
+        "json": ("tasks",),
+        "time": None,
+    },
+}
+EXPORT_CHUNK = int(os.getenv("EXPORT_CHUNK", "1000"))
+
+def _export_query(table, columns, since, since_id, limit):
+    spec = EXPORT_TABLES[table]
+    if table == "users":
+        select = ["t.id AS id", "t.firebase_uid AS firebase_uid"]
+        source = "users t"
+    else:
+        select = ["t.id AS id", "u.firebase_uid AS firebase_uid"]
+        source = f"{table} t JOIN users u ON u.id = t.user_id"
+    select += [f"t.{c} AS {c}" for c in columns]
+    packed = spec.get("packed", {})
+    select += [f"t.{packed[c]} AS {c}__packed" for c in columns if c in packed]
+    if any(c in spec.get("typed", ()) for c in columns):
+        select += [f"t.{c} AS {c}__typed" for c in BIG5_VIEW_COLUMNS if c not in ("answers", "answers_packed")]
+
+    where, params = ["t.id > ?"], [since_id]
+    if since:
+        where.append(f"t.{spec['time']} >= ?")
+        params.append(since)
+    sql = f"SELECT {', '.join(select)} FROM {source} WHERE {' AND '.join(where)} ORDER BY t.id"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return sql, params
+
+def _iter_export_rows(sql, params):
+    # Own checkout: the generator outlives the request that created it
+    conn = PooledConnection(db_pool, db_pool.acquire(), scoped=False)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(EXPORT_CHUNK)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+def _unpack_export_rows(chunks, columns):
+    """Re-expand packed columns (e.g. big5 answers) into their JSON text."""
+    for rows in chunks:
+        out = []
+        for r in rows:
+            item = dict(r)
+            for c in columns:
+                packed = item.pop(f"{c}__packed")
+                if packed is not None:
+                    item[c] = json.dumps(unpack_answers(packed))
+            out.append(item)
+        yield out
+
+def _rebuild_big5_export_rows(chunks, columns):
+    """Fill NULL scores/result (typed-column rows) with their JSON text."""
+    for rows in chunks:
+        out = []
+        for r in rows:
+            item = dict(r)
+            typed = {k[:-len("__typed")]: item.pop(k) for k in list(item) if k.endswith("__typed")}
+            scores, result = big5_scores_result(typed)
+            if "scores" in columns and item["scores"] is None:
+                item["scores"] = json.dumps(scores)
+            if "result" in columns and item["result"] is None:
+                item["result"] = json.dumps(result)
+            out.append(item)
+        yield out
+
+def _export_ndjson(chunks, json_cols):
+    for rows in chunks:
+        lines = []
+        for r in rows:
+            item = dict(r)
+            for c in json_cols:
+                if c in item:
+                    item[c] = safe_json_loads(item[c], None)
+            lines.append(app.json.encode(item, sort_keys=False))
+        yield b"\n".join(lines) + b"\n"
+
+def _export_csv(chunks, header):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+    for rows in chunks:
+        writer.writerows([r[c] for c in header] for r in rows)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+@app.route("/admin/export/<table>", methods=["GET"])
+def admin_export(table):
+    """
+    Stream one table as NDJSON (default) or CSV in constant memory.
+    Query: format=ndjson|csv, columns=a,b, since=<ISO time>, since_id=<id>, limit=<n>
+    """
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    spec = EXPORT_TABLES.get(table)
+    if not spec:
+        return jsonify({"error": f"Unknown table; choose one of {sorted(EXPORT_TABLES)}"}), 400
+
+    fmt = (request.args.get("format") or "ndjson").lower()
+    if fmt not in ("ndjson", "csv"):
+        return jsonify({"error": "format must be ndjson or csv"}), 400
+
+    requested = [c.strip() for c in (request.args.get("columns") or "").split(",") if c.strip()]
+    unknown = [c for c in requested if c not in spec["columns"]]
+    if unknown:
+        return jsonify({"error": f"Unknown columns: {', '.join(unknown)}"}), 400
+    columns = tuple(requested) or spec["columns"]
+
+    since = (request.args.get("since") or "").strip() or None
+    if since and not spec["time"]:
+        return jsonify({"error": f"since is not supported for {table}; use since_id"}), 400
+    try:
+        since_id = int(request.args.get("since_id", 0))
+        limit = int(request.args.get("limit", 0))
+    except ValueError:
+        return jsonify({"error": "since_id and limit must be integers"}), 400
+
+    sql, params = _export_query(table, columns, since, since_id, limit)
+    chunks = _iter_export_rows(sql, params)
+    packed = [c for c in columns if c in spec.get("packed", {})]
+    if packed:
+        chunks = _unpack_export_rows(chunks, packed)
+    if any(c in spec.get("typed", ()) for c in columns):
+        chunks = _rebuild_big5_export_rows(chunks, columns)
+    if fmt == "csv":
+        body = _export_csv(chunks, ("id", "firebase_uid") + columns)
+        mimetype = "text/csv"
+    else:
+        body = _export_ndjson(chunks, [c for c in columns if c in spec["json"]])
+        mimetype = "application/x-ndjson"
+
+    response = Response(body, mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename={table}.{fmt}"
+    return response
+
+# ======================
+# Query plan checks
+# ======================
+# Representative shapes of the per-request queries. `flask check-query-plans`
+# runs EXPLAIN QUERY PLAN on each and fails if any of them scans a table or
+# sorts through a temp b-tree, so a dropped or unused index shows up in CI.
+def hot_queries():
+    return [
+        ("user id lookup", "SELECT id FROM users WHERE firebase_uid = ?", ("u",)),
+        ("user data_version", "SELECT data_version FROM users WHERE firebase_uid = ?", ("u",)),
+        ("etag user state", "SELECT data_version, data_updated_at FROM users WHERE id = ?", (1,)),
+        ("profile by uid", """
+            SELECT p.display_name, p.avatar, p.bio, p.interests
+            FROM profile p JOIN users u ON p.user_id = u.id WHERE u.firebase_uid = ?
+        """, ("u",)),
+        ("analysis by uid", """
+            SELECT a.strengths, a.gaps, a.direction
+            FROM analysis a JOIN users u ON a.user_id = u.id WHERE u.firebase_uid = ?
+        """, ("u",)),
+        ("big5 by uid", f"""
+            SELECT {", ".join(f"b.{c}" for c in BIG5_VIEW_COLUMNS)}
+            FROM big5 b JOIN users u ON b.user_id = u.id WHERE u.firebase_uid = ?
+        """, ("u",)),
+        ("personality by uid", """
+            SELECT p.learning_style, p.mbti_type
+            FROM personality p JOIN users u ON p.user_id = u.id WHERE u.firebase_uid = ?
+        """, ("u",)),
+        ("projects by uid", """
+            SELECT a.gaps, p.learning_style, p.motivation_state
+            FROM users u JOIN analysis a ON a.user_id = u.id
+            LEFT JOIN personality p ON p.user_id = u.id WHERE u.firebase_uid = ?
+        """, ("u",)),
+        ("project progress get", """
+            SELECT progress, tasks FROM project_progress WHERE user_id = ? AND project_id = ?
+        """, (1, "p")),
+        ("project progress upsert", _PROGRESS_UPSERT_SQL, (1, "p", 0, "[]", 0.0)),
+        ("coach bundle", f"{_BUNDLE_SELECT} WHERE u.firebase_uid IN (?)", ("u",)),
+        ("coach bundle page", f"{_BUNDLE_SELECT} WHERE u.id > ? ORDER BY u.id LIMIT ?", (0, 10)),
+        ("coach_daily read", """
+            SELECT result FROM coach_daily
+            WHERE user_id = ? AND day = ? AND action = ? AND data_version = ? AND catalog_version = ?
+        """, (1, "2024-01-01", "daily", 0, "c")),
+        ("llm cache read", "SELECT response, expires_at FROM llm_cache WHERE key = ?", ("k",)),
+        ("dashboard snapshot carry", _CARRY_SNAPSHOT_SQL, (1, 1, 1)),
+        ("dashboard snapshot", """
+            SELECT u.id, s.payload
+            FROM users u LEFT JOIN user_snapshot s ON s.user_id = u.id WHERE u.firebase_uid = ?
+        """, ("u",)),
+        ("snapshot rebuild", f"{_SNAPSHOT_SELECT} WHERE u.id IN (?)", (1,)),
+        ("matching seed", """
+            SELECT u.id, p.work_preference, p.clarity_level, a.direction
+            FROM users u LEFT JOIN personality p ON p.user_id = u.id
+            LEFT JOIN analysis a ON a.user_id = u.id WHERE u.firebase_uid = ?
+        """, ("u",)),
+        ("coach application review", """
+            SELECT id, full_name, created_at FROM coach_applications
+            WHERE status = ? AND created_at < ? ORDER BY created_at DESC LIMIT ?
+        """, ("pending", "9999", 50)),
+        ("export page", _export_query("big5", ("scores",), None, 0, 100)[0], (0, 100)),
+    ]
+
+def _plan_problems(plan):
+    """Table scans and temp sorts in an EXPLAIN QUERY PLAN result."""
+    # Scanning a subquery's co-routine / materialized result is fine
+    derived = {d.split(" ", 1)[1] for d in plan if d.startswith(("CO-ROUTINE ", "MATERIALIZE "))}
+    problems = []
+    for detail in plan:
+        if detail.startswith("SCAN "):
+            target = detail.split(" ")[1]
+            if target not in derived and "VIRTUAL TABLE" not in detail:
+                problems.append(detail)
+        elif detail.startswith("USE TEMP B-TREE"):
+            problems.append(detail)
+    return problems
+
+def check_query_plans(conn=None):
+    """EXPLAIN QUERY PLAN for hot_queries() -> [{name, plan, problems}]."""
+    own = conn is None
+    conn = conn or get_db_connection()
+    try:
+        report = []
+        for name, sql, params in hot_queries():
+            plan = [r["detail"] for r in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+            report.append({"name": name, "plan": plan, "problems": _plan_problems(plan)})
+        return report
+    finally:
+        if own:
+            conn.close()
+
 # ======================
 # Health check
 # ======================
@@ -1642,9 +4430,133 @@ def coach_apply():
 def health():
     return jsonify({"status": "ok", "time": now_iso()})
 
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    if not (is_admin_request() or metrics_token_ok(request.headers.get("Authorization"))):
+        return jsonify({"error": "Forbidden"}), 403
+    pool = db_pool.metrics()
+    body = route_metrics.render_prometheus(gauges={
+        "db_pool_connections_open": pool["open"],
+        "db_pool_connections_in_use": pool["in_use"],
+    })
+    return Response(body, content_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.route("/admin/metrics", methods=["GET"])
+def admin_metrics():
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify({"routes": route_metrics.summary(), "admission": admission.stats()})
+
+@app.route("/admin/db-pool", methods=["GET"])
+def admin_db_pool():
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify(db_pool.metrics())
+
+@app.route("/admin/courses/reload", methods=["POST"])
+def admin_courses_reload():
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    catalog_store.refresh(force=True)
+    return jsonify(catalog_store.status())
+
+@app.route("/admin/caches", methods=["GET"])
+def admin_caches():
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify({
+        "user_ids": user_id_cache.stats(),
+        "data_versions": data_version_cache.stats(),
+        "coach_outputs": coach_cache.stats(),
+        "llm_responses": llm_cache.stats(),
+        "llm_tokens": llm_token_stats.stats(),
+        "progress_buffer": progress_buffer.stats(),
+    })
+
+# ======================
+# Profiling (admin, opt-in)
+# ======================
+# X-Profile request hooks and the /admin/profile* routes; see profiling.py.
+init_profiling(app, is_admin_request)
+
+# ======================
+# CLI
+# ======================
+@app.cli.command("import-courses")
+@click.argument("path")
+def import_courses_command(path):
+    """Load a JSON/NDJSON course file into the courses table."""
+    init_db()
+    count = import_courses(read_catalog_file(path))
+    click.echo(f"Imported {count} courses")
+
+@app.cli.command("build-peer-index")
+def build_peer_index_command():
+    """Build the ANN peer index from the database and save it next to it."""
+    if not _NUMPY_AVAILABLE:
+        raise click.ClickException("numpy is required for the peer index")
+    init_db()
+    load_peer_index(force_build=True)
+    click.echo(f"Indexed {len(peer_index)} users into {len(peer_index.lists)} lists -> {peer_index.path}")
+
+@app.cli.command("bench-peer-index")
+@click.option("--users", default=100000, show_default=True)
+@click.option("--queries", default=200, show_default=True)
+@click.option("--k", default=10, show_default=True)
+def bench_peer_index_command(users, queries, k):
+    """Recall vs latency of the ANN peer index on synthetic profiles."""
+    if not _NUMPY_AVAILABLE:
+        raise click.ClickException("numpy is required for the peer index")
+    click.echo(json.dumps(benchmark_peer_index(users, queries, k), indent=2))
+
+@app.cli.command("check-query-plans")
+@click.option("--verbose", is_flag=True, help="Print every plan, not just failures.")
+def check_query_plans_command(verbose):
+    """Fail if a hot query does a full table scan or a temp-b-tree sort."""
+    init_db()
+    failed = 0
+    for entry in check_query_plans():
+        if entry["problems"]:
+            failed += 1
+        if entry["problems"] or verbose:
+            click.echo(f"{'FAIL' if entry['problems'] else 'ok  '} {entry['name']}")
+            for detail in entry["plan"]:
+                click.echo(f"       {detail}")
+    conn = get_db_connection()
+    try:
+        click.echo(f"schema version {schema_version(conn)}/{SCHEMA_VERSION}")
+    finally:
+        conn.close()
+    if failed:
+        raise click.ClickException(f"{failed} hot queries need an index")
+    click.echo("all hot queries use indexes")
+
+@app.cli.command("precompute-coach")
+@click.option("--day", default=None, help="UTC day (YYYY-MM-DD); defaults to today.")
+@click.option("--workers", default=None, type=int, help="Worker processes; defaults to CPU count.")
+@click.option("--batch-size", default=_BUNDLE_BATCH, show_default=True)
+def precompute_coach_command(day, workers, batch_size):
+    """Render every rule-based coach action for every user into coach_daily."""
+    if day:
+        try:
+            datetime.strptime(day, "%Y-%m-%d")
+        except ValueError:
+            raise click.BadParameter("expected YYYY-MM-DD", param_hint="--day")
+    init_db()
+    click.echo(json.dumps(precompute_coach_daily(day, workers, batch_size), indent=2))
+
+@app.cli.command("bench-intents")
+@click.option("--messages", default=5000, show_default=True)
+@click.option("--repeat", default=20, show_default=True)
+def bench_intents_command(messages, repeat):
+    """Compiled keyword classifier vs the old substring scan."""
+    click.echo(json.dumps(benchmark_keyword_classifiers(messages, repeat), indent=2))
+
 # ======================
 # Run
 # ======================
 if __name__ == "__main__":
     init_db()
+    # SIGTERM -> normal exit, so atexit hooks (progress buffer flush) run
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
     app.run(debug=True)
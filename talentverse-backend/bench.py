@@ -0,0 +1,438 @@
+"""
+Benchmark suite for the Flask backend.
+
+    python bench.py seed --scale 100k                 # synthetic users -> bench.db
+    python bench.py run --scale 100k --out base.json  # drive every route
+    python bench.py compare base.json new.json        # exit 1 on regression
+
+Data goes to --db (default bench.db, never database.db unless asked for).
+Seeding is deterministic for a given --seed and skips users that already
+exist, so a scale can be grown in place (1k -> 100k -> 1m).
+
+`run` replays the same request mix twice: in-process through the Flask
+test client (one thread; pure handler cost), and over HTTP against a
+threaded local WSGI server with --concurrency clients. Each mode reports
+per-route p50/p95/p99 latency and overall requests/second.
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+UID_PREFIX = "bench-"
+PROJECT_IDS = ("p1", "p2", "p3", "p4")
+INTERESTS = ("web", "data", "mobile", "ai", "design", "devops", "security", "games")
+FIELDS_LEVELS = (("frontend", "beginner"), ("frontend", "intermediate"), ("fullstack", "beginner"), ("", ""))
+PERSONALITY_CHOICES = {
+    "learning_style": ("self", "guided", "mixed"),
+    "decision_style": ("logical", "intuitive"),
+    "work_preference": ("solo", "peer", "mentor"),
+    "motivation_state": ("low", "medium", "high"),
+    "clarity_level": ("lost", "exploring", "clear"),
+}
+
+app_module = None
+
+
+def load_app(db_path):
+    """Import app.py against db_path (the module reads its config at import)."""
+    global app_module
+    if app_module is None:
+        os.environ["DATABASE_PATH"] = os.path.abspath(db_path)
+        os.environ.setdefault("PEER_INDEX_PATH", os.path.abspath(db_path) + ".peers.npz")
+        os.environ.setdefault("RATE_LIMIT_ENABLED", "0")  # the mix hammers few IPs/uids by design
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        import app as module
+        module.init_db()
+        app_module = module
+    return app_module
+
+
+def uid(i):
+    return f"{UID_PREFIX}{i:07d}"
+
+
+# ----------------------
+# Seeding
+# ----------------------
+def _user_rows(i, rng, m):
+    field, level = FIELDS_LEVELS[i % len(FIELDS_LEVELS)]
+    analysis = m.analysis_for({"field": field, "level": level})
+    answers = {str(q): rng.randint(1, 5) for q in range(1, 51)}
+    percent = {t: rng.randint(0, 100) for t in "OCEAN"}
+    # same shape BigFivePage.jsx posts to /save-big5
+    big5 = m.big5_columns(*m.big5_payload({
+        "model": "big5_v1", "answers": answers, "label": "bench",
+        "scores_sum": {t: rng.randint(10, 50) for t in "OCEAN"}, "scores_percent": percent,
+    }))
+    return {
+        "profile": (f"User {i}", "", "", json.dumps(rng.sample(INTERESTS, 2))),
+        "analysis": (json.dumps(analysis["strengths"]), json.dumps(analysis["gaps"]), analysis["direction"]),
+        "personality": tuple(rng.choice(v) for v in PERSONALITY_CHOICES.values()),
+        "big5": big5,
+        "progress": [
+            (pid, rng.randint(0, 100), json.dumps([f"task {t}" for t in range(rng.randint(0, 4))]))
+            for pid in rng.sample(PROJECT_IDS, rng.randint(0, 2))
+        ],
+    }
+
+
+def seed(db_path, users, seed_value=42, batch=5_000):
+    m = load_app(db_path)
+    conn = m.get_db_connection()
+    try:
+        existing = conn.execute(
+            "SELECT COUNT(*) FROM users WHERE firebase_uid LIKE ?", (UID_PREFIX + "%",)
+        ).fetchone()[0]
+    finally:
+        conn.close()
+    if existing >= users:
+        print(f"{db_path}: {existing} bench users already present")
+        return existing
+
+    big5_cols = ("user_id", *m._BIG5_TYPED_COLUMNS, "scores", "result", "created_at")
+    started = time.perf_counter()
+    for start in range(existing, users, batch):
+        stop = min(users, start + batch)
+        stamp = m.now_iso()
+        conn = m.get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.executemany(
+                "INSERT OR IGNORE INTO users (firebase_uid, email, role, created_at, data_version, data_updated_at) "
+                "VALUES (?, ?, 'user', ?, 1, ?)",
+                [(uid(i), f"{uid(i)}@bench.local", stamp, stamp) for i in range(start, stop)],
+            )
+            ids = dict(cursor.execute(
+                "SELECT firebase_uid, id FROM users WHERE firebase_uid BETWEEN ? AND ?",
+                (uid(start), uid(stop - 1)),
+            ).fetchall())
+            rows = {"profile": [], "analysis": [], "personality": [], "big5": [], "progress": []}
+            for i in range(start, stop):
+                user_id = ids[uid(i)]
+                r = _user_rows(i, random.Random(seed_value * 1_000_003 + i), m)
+                rows["profile"].append((user_id, *r["profile"]))
+                rows["analysis"].append((user_id, *r["analysis"]))
+                rows["personality"].append((user_id, *r["personality"]))
+                b = r["big5"]
+                rows["big5"].append((user_id, *(b[c] for c in m._BIG5_TYPED_COLUMNS), b["scores"], b["result"], stamp))
+                rows["progress"].extend((user_id, *p) for p in r["progress"])
+            cursor.executemany(
+                "INSERT OR IGNORE INTO profile (user_id, display_name, avatar, bio, interests) VALUES (?, ?, ?, ?, ?)",
+                rows["profile"],
+            )
+            cursor.executemany(
+                "INSERT OR IGNORE INTO analysis (user_id, strengths, gaps, direction) VALUES (?, ?, ?, ?)",
+                rows["analysis"],
+            )
+            cursor.executemany(
+                f"INSERT OR IGNORE INTO personality (user_id, {', '.join(m.PERSONALITY_FIELDS)}) "
+                f"VALUES (?, {', '.join('?' for _ in m.PERSONALITY_FIELDS)})",
+                rows["personality"],
+            )
+            cursor.executemany(
+                f"INSERT OR IGNORE INTO big5 ({', '.join(big5_cols)}) VALUES ({', '.join('?' for _ in big5_cols)})",
+                rows["big5"],
+            )
+            cursor.executemany(
+                "INSERT OR IGNORE INTO project_progress (user_id, project_id, progress, tasks) VALUES (?, ?, ?, ?)",
+                rows["progress"],
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        print(f"  seeded {stop}/{users} users ({time.perf_counter() - started:.1f}s)", flush=True)
+    return users
+
+
+# ----------------------
+# Request mix
+# ----------------------
+def request_mix(users, count, seed_value=7, llm=False):
+    """Deterministic list of (route, method, path, body) over the seeded users."""
+    rng = random.Random(seed_value)
+    routes = [
+        # name, weight, method, path template, body factory
+        ("health", 1, "GET", "/health", None),
+        ("profile_get", 6, "GET", "/profile/{uid}", None),
+        ("personality_get", 4, "GET", "/personality/{uid}", None),
+        ("big5_get", 4, "GET", "/big5/{uid}", None),
+        ("analysis_get", 6, "GET", "/analysis/{uid}", None),
+        ("projects_get", 4, "GET", "/projects/{uid}", None),
+        ("courses_get", 6, "GET", "/courses/{uid}", None),
+        ("dashboard_get", 8, "GET", "/dashboard/{uid}", None),
+        ("matching_get", 3, "GET", "/matching/{uid}", None),
+        ("progress_get", 3, "GET", "/project-progress/{uid}/p1", None),
+        ("ai_coach_get", 4, "GET", "/ai-coach/{uid}", None),
+        ("ai_coach_post", 6, "POST", "/ai-coach",
+         lambda u: {"firebase_uid": u, "action": rng.choice(("priorities", "weekly_plan", "project", "learn_now", "daily"))}),
+        ("profile_post", 2, "POST", "/profile",
+         lambda u: {"firebase_uid": u, "display_name": f"User {rng.randint(0, 999)}", "interests": ["web"]}),
+        ("analyze_post", 1, "POST", "/analyze",
+         lambda u: {"firebase_uid": u, "field": "frontend", "level": rng.choice(("beginner", "intermediate"))}),
+        ("personality_post", 1, "POST", "/personality",
+         lambda u: {"firebase_uid": u, **{k: rng.choice(v) for k, v in PERSONALITY_CHOICES.items()}}),
+        ("big5_post", 1, "POST", "/save-big5",
+         lambda u: {"firebase_uid": u, "model": "big5_v1", "label": "bench",
+                    "scores_sum": {t: rng.randint(10, 50) for t in "OCEAN"},
+                    "scores_percent": {t: rng.randint(0, 100) for t in "OCEAN"}}),
+        ("progress_post", 4, "POST", "/save-progress",
+         lambda u: {"firebase_uid": u, "projectId": rng.choice(PROJECT_IDS), "progress": rng.randint(0, 100),
+                    "tasks": ["a", "b"]}),
+    ]
+    if llm:
+        routes.append(("ai_coach_llm", 2, "POST", "/ai/coach",
+                       lambda u: {"firebase_uid": u, "message": "اعمل لي خطة أسبوع"}))
+
+    weights = [r[1] for r in routes]
+    mix = []
+    for _ in range(count):
+        name, _, method, path, body = rng.choices(routes, weights)[0]
+        u = uid(rng.randrange(users))
+        mix.append((name, method, path.format(uid=u), json.dumps(body(u)).encode("utf-8") if body else None))
+    return mix
+
+
+# ----------------------
+# Drivers
+# ----------------------
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(q * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(samples, wall_s):
+    """samples: [(route, seconds, status)] -> report dict."""
+    by_route = {}
+    for name, seconds, status in samples:
+        by_route.setdefault(name, []).append((seconds, status))
+    routes = {}
+    for name, rows in sorted(by_route.items()):
+        times = sorted(s * 1000 for s, _ in rows)
+        routes[name] = {
+            "requests": len(rows),
+            "errors": sum(1 for _, status in rows if status >= 500 or status == 0),
+            "p50_ms": round(_percentile(times, 0.50), 3),
+            "p95_ms": round(_percentile(times, 0.95), 3),
+            "p99_ms": round(_percentile(times, 0.99), 3),
+            "mean_ms": round(sum(times) / len(times), 3),
+        }
+    everything = sorted(s * 1000 for _, s, _ in samples)
+    return {
+        "requests": len(samples),
+        "wall_s": round(wall_s, 3),
+        "rps": round(len(samples) / wall_s, 1) if wall_s else None,
+        "p50_ms": round(_percentile(everything, 0.50), 3),
+        "p95_ms": round(_percentile(everything, 0.95), 3),
+        "p99_ms": round(_percentile(everything, 0.99), 3),
+        "routes": routes,
+    }
+
+
+def admin_headers():
+    # /matching only answers its owner or an admin; the bench has no ID tokens
+    return {"X-Admin-Email": os.getenv("ADMIN_EMAIL", "admin@example.com")}
+
+
+def run_test_client(mix):
+    client = app_module.app.test_client()
+    headers = admin_headers()
+    samples = []
+    started = time.perf_counter()
+    for name, method, path, body in mix:
+        t = time.perf_counter()
+        response = client.open(path, method=method, data=body, headers=headers,
+                               content_type="application/json" if body else None)
+        response.get_data()
+        samples.append((name, time.perf_counter() - t, response.status_code))
+    return summarize(samples, time.perf_counter() - started)
+
+
+def run_wsgi(mix, concurrency):
+    from werkzeug.serving import make_server
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)  # no per-request access log
+    server = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+    port = server.server_port
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    local = threading.local()
+
+    def send(item):
+        name, method, path, body = item
+        conn = getattr(local, "conn", None)
+        if conn is None:
+            conn = local.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        headers = admin_headers()
+        if body:
+            headers["Content-Type"] = "application/json"
+        t = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            local.conn = None
+            status = 0
+        return name, time.perf_counter() - t, status
+
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = list(pool.map(send, mix))
+        wall = time.perf_counter() - started
+    finally:
+        server.shutdown()
+    report = summarize(samples, wall)
+    report["concurrency"] = concurrency
+    return report
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(args):
+    users = SCALES.get(args.scale, 0) if args.scale else args.users
+    seed(args.db, users, args.seed)
+    m = load_app(args.db)
+    import peers  # importable once load_app has put the backend on sys.path
+    if peers._NUMPY_AVAILABLE and peers.PEER_INDEX_MODE != "exact":
+        peers.load_peer_index()  # the app builds it in the background; measure the warm state
+    mix = request_mix(users, args.requests, args.seed, args.llm)
+    warmup = request_mix(users, args.warmup, args.seed + 1, args.llm)
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": m.now_iso(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "users": users,
+            "requests": args.requests,
+            "seed": args.seed,
+            "json_encoder": "orjson" if m.app.json.use_orjson else "stdlib",
+        },
+    }
+    if args.mode in ("client", "both"):
+        run_test_client(warmup)
+        report["client"] = run_test_client(mix)
+        print(_format(report["client"], "test client"))
+    if args.mode in ("wsgi", "both"):
+        run_wsgi(warmup, args.concurrency)
+        report["wsgi"] = run_wsgi(mix, args.concurrency)
+        print(_format(report["wsgi"], f"wsgi x{args.concurrency}"))
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"wrote {args.out}")
+    return report
+
+
+def _format(report, title):
+    lines = [f"== {title}: {report['requests']} requests, {report['rps']} req/s, "
+             f"p50 {report['p50_ms']} ms, p95 {report['p95_ms']} ms, p99 {report['p99_ms']} ms"]
+    for name, r in report["routes"].items():
+        lines.append(f"  {name:<18} n={r['requests']:<6} p50={r['p50_ms']:<9} p95={r['p95_ms']:<9} "
+                     f"p99={r['p99_ms']:<9} errors={r['errors']}")
+    return "\n".join(lines)
+
+
+# ----------------------
+# Baseline comparison
+# ----------------------
+def compare(args):
+    with open(args.baseline, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        cur = json.load(f)
+
+    regressions = []
+    for mode in ("client", "wsgi"):
+        if mode not in base or mode not in cur:
+            continue
+        b, c = base[mode], cur[mode]
+        print(f"== {mode}: rps {b['rps']} -> {c['rps']}, p95 {b['p95_ms']} -> {c['p95_ms']} ms")
+        if b["rps"] and c["rps"] < b["rps"] * (1 - args.tolerance):
+            regressions.append(f"{mode} rps {b['rps']} -> {c['rps']}")
+        for name, br in b["routes"].items():
+            cr = c["routes"].get(name)
+            if not cr:
+                continue
+            change = (cr["p95_ms"] - br["p95_ms"]) / br["p95_ms"] if br["p95_ms"] else 0.0
+            flag = ""
+            # sub-millisecond routes are mostly noise; ignore tiny absolute moves
+            if change > args.tolerance and cr["p95_ms"] - br["p95_ms"] > args.min_delta_ms:
+                flag = "  <-- regression"
+                regressions.append(f"{mode} {name} p95 {br['p95_ms']} -> {cr['p95_ms']} ms")
+            print(f"  {name:<18} p95 {br['p95_ms']:>9} -> {cr['p95_ms']:>9} ms ({change:+.1%}){flag}")
+
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+        for r in regressions:
+            print(f"  {r}")
+        return 1
+    print("no regressions")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_data_args(p):
+        p.add_argument("--db", default="bench.db")
+        p.add_argument("--scale", choices=sorted(SCALES), default=None)
+        p.add_argument("--users", type=int, default=1_000, help="used when --scale is not given")
+        p.add_argument("--seed", type=int, default=42)
+
+    p_seed = sub.add_parser("seed", help="insert synthetic users")
+    add_data_args(p_seed)
+
+    p_run = sub.add_parser("run", help="seed if needed, then benchmark every route")
+    add_data_args(p_run)
+    p_run.add_argument("--mode", choices=("client", "wsgi", "both"), default="both")
+    p_run.add_argument("--requests", type=int, default=5_000)
+    p_run.add_argument("--warmup", type=int, default=500)
+    p_run.add_argument("--concurrency", type=int, default=8)
+    p_run.add_argument("--llm", action="store_true", help="include /ai/coach (point OPENAI_BASE_URL at llm_stub.py)")
+    p_run.add_argument("--out", default=None, help="write the JSON report here")
+
+    p_cmp = sub.add_parser("compare", help="compare two run reports")
+    p_cmp.add_argument("baseline")
+    p_cmp.add_argument("current")
+    p_cmp.add_argument("--tolerance", type=float, default=0.15)
+    p_cmp.add_argument("--min-delta-ms", type=float, default=0.5)
+
+    args = parser.parse_args()
+    if args.command == "seed":
+        seed(args.db, SCALES.get(args.scale, 0) if args.scale else args.users, args.seed)
+    elif args.command == "run":
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+SQLite connection pool.
+
+Inside a request get_db_connection() hands out one pooled connection per
+request (kept on flask.g and returned on teardown); outside a request each
+call checks out a private connection that close() gives back.
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from flask import g, has_request_context
+
+from metrics import request_timer
+
+DATABASE_PATH = os.getenv("DATABASE_PATH", "database.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+
+# Applied once per physical connection. WAL lets readers run while a writer
+# commits; NORMAL sync is durable in WAL mode except on power loss.
+DB_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",      # ~16MB page cache per connection
+    "PRAGMA mmap_size=134217728",    # 128MB memory-mapped reads
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections shared by request threads."""
+
+    def __init__(self, path, size=8, timeout=10.0):
+        self.path = path
+        self.size = max(1, int(size))
+        self.timeout = timeout
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._opened_at = {}
+        self._checked_out_at = {}
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "wait_ms_total": 0.0,
+            "wait_ms_max": 0.0,
+            "hold_ms_total": 0.0,
+            "hold_ms_max": 0.0,
+            "opened": 0,
+            "closed": 0,
+        }
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for pragma in DB_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        # A forked worker must not reuse the parent's file handles
+        if os.getpid() != self._pid:
+            self._reset()
+
+        started = time.monotonic()
+        waited = False
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._created < self.size
+                if can_open:
+                    self._created += 1
+            if can_open:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+                with self._lock:
+                    self._opened_at[id(conn)] = time.monotonic()
+                    self._stats["opened"] += 1
+            else:
+                waited = True
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._stats["timeouts"] += 1
+                    raise RuntimeError("Database busy: connection pool exhausted")
+
+        now = time.monotonic()
+        wait_ms = (now - started) * 1000.0
+        with self._lock:
+            self._stats["checkouts"] += 1
+            if waited:
+                self._stats["waits"] += 1
+            self._stats["wait_ms_total"] += wait_ms
+            self._stats["wait_ms_max"] = max(self._stats["wait_ms_max"], wait_ms)
+            self._checked_out_at[id(conn)] = now
+        return conn
+
+    def release(self, conn):
+        with self._lock:
+            started = self._checked_out_at.pop(id(conn), None)
+            if started is not None:
+                hold_ms = (time.monotonic() - started) * 1000.0
+                self._stats["hold_ms_total"] += hold_ms
+                self._stats["hold_ms_max"] = max(self._stats["hold_ms_max"], hold_ms)
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self.discard(conn)
+            return
+        self._idle.put(conn)
+
+    def discard(self, conn):
+        with self._lock:
+            self._checked_out_at.pop(id(conn), None)
+            self._opened_at.pop(id(conn), None)
+            self._created -= 1
+            self._stats["closed"] += 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def close_all(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(conn)
+
+    def metrics(self):
+        now = time.monotonic()
+        with self._lock:
+            stats = dict(self._stats)
+            ages = [now - t for t in self._opened_at.values()]
+            in_use = len(self._checked_out_at)
+            created = self._created
+        checkouts = stats["checkouts"] or 1
+        return {
+            "size": self.size,
+            "open": created,
+            "in_use": in_use,
+            "idle": self._idle.qsize(),
+            "checkouts": stats["checkouts"],
+            "waits": stats["waits"],
+            "timeouts": stats["timeouts"],
+            "wait_ms_avg": round(stats["wait_ms_total"] / checkouts, 3),
+            "wait_ms_max": round(stats["wait_ms_max"], 3),
+            "hold_ms_avg": round(stats["hold_ms_total"] / checkouts, 3),
+            "hold_ms_max": round(stats["hold_ms_max"], 3),
+            "connections_opened": stats["opened"],
+            "connections_closed": stats["closed"],
+            "connection_age_s_max": round(max(ages), 1) if ages else 0.0,
+        }
+
+class TimedCursor:
+    """sqlite3 cursor proxy that adds statement count/time to a RequestTimer."""
+
+    def __init__(self, cursor, timer):
+        self._cursor = cursor
+        self._timer = timer
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def _timed(self, fn, *args, statement=False):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self._timer.sql_s += time.perf_counter() - started
+            if statement:
+                self._timer.queries += 1
+
+    def execute(self, sql, parameters=()):
+        self._timed(self._cursor.execute, sql, parameters, statement=True)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._timed(self._cursor.executemany, sql, seq_of_parameters, statement=True)
+        return self
+
+    def fetchone(self):
+        return self._timed(self._cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self._timed(self._cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._timed(self._cursor.fetchall)
+
+class PooledConnection:
+    """
+    Thin handle over a pooled sqlite3 connection.
+    Inside a request the handle lives on flask.g, so close() only drops
+    uncommitted work; the connection goes back to the pool on teardown.
+    """
+
+    def __init__(self, pool, conn, scoped):
+        self._pool = pool
+        self._conn = conn
+        self._scoped = scoped
+        self._on_commit = []
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def on_commit(self, callback):
+        """Run callback once the current transaction commits (dropped on rollback)."""
+        self._on_commit.append(callback)
+
+    def commit(self):
+        self._conn.commit()
+        callbacks, self._on_commit = self._on_commit, []
+        for callback in callbacks:
+            callback()
+
+    def rollback(self):
+        self._on_commit = []
+        self._conn.rollback()
+
+    def cursor(self, *args):
+        cursor = self._conn.cursor(*args)
+        timer = request_timer()
+        return TimedCursor(cursor, timer) if timer is not None else cursor
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def close(self):
+        if self._conn is None:
+            return
+        if self._scoped:
+            if self._conn.in_transaction:
+                self.rollback()
+            return
+        self.release()
+
+    def release(self):
+        self._on_commit = []
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.release(conn)
+
+db_pool = ConnectionPool(DATABASE_PATH, DB_POOL_SIZE, DB_POOL_TIMEOUT)
+
+def get_db_connection():
+    """Request-scoped pooled connection; a private checkout outside requests."""
+    if has_request_context():
+        handle = g.get("db")
+        if handle is None:
+            handle = g.db = PooledConnection(db_pool, db_pool.acquire(), scoped=True)
+        return handle
+    return PooledConnection(db_pool, db_pool.acquire(), scoped=False)
+
+def release_request_db():
+    """
+    Commit and hand the request's connection back before a long wait (LLM
+    calls); a later get_db_connection() in the same request checks out a
+    fresh one.
+    """
+    handle = g.pop("db", None)
+    if handle is not None:
+        handle.commit()
+        handle.release()
+
+def release_db_connection(exc):
+    handle = g.pop("db", None)
+    if handle is not None:
+        handle.release()
+
+def safe_json_loads(value, default):
+    if value is None or value == "":
+        return default
+    if isinstance(value, (dict, list)):
+        return value
+    try:
+        return json.loads(value)
+    except Exception:
+        return default
+
+def init_app(app):
+    app.teardown_request(release_db_connection)
@@ -0,0 +1,114 @@
+"""
+Local stand-in for the OpenAI Responses API, for exercising the coach's
+LLM pipeline (timeouts, concurrency cap, SSE streaming) without a key.
+
+    python llm_stub.py --port 8089 --delay 0.5
+    OPENAI_API_KEY=stub OPENAI_BASE_URL=http://127.0.0.1:8089/v1 python app.py
+
+--delay is applied before the first byte; --token-delay between streamed
+deltas, so values above LLM_TIMEOUT exercise the fallback path.
+"""
+import argparse
+import json
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = {
+    "assistant_message": "تمام! خلّينا نبدأ بخطوة صغيرة اليوم: \"ساعة تعلم\" ثم تطبيق.",
+    "intent": "chat",
+    "priorities": ["ثبّت اتجاهك", "سدّ أكبر فجوة"],
+    "today_task": "اكتب هدفك + 3 نتائج قابلة للقياس.",
+    "weekly_plan": {"days": [{"day": "Sat", "tasks": ["60 دقيقة تعلم"]}]},
+    "suggestions": [{"label": "خطة أسبوع", "message": "اعمل لي خطة أسبوع عملية.", "intent": "weekly_plan"}],
+    "safety": {"flagged": False},
+}
+
+
+def _response_object(text):
+    return {
+        "id": f"resp_{uuid.uuid4().hex[:12]}",
+        "object": "response",
+        "created_at": int(time.time()),
+        "status": "completed",
+        "model": "stub",
+        "output": [{
+            "id": f"msg_{uuid.uuid4().hex[:12]}",
+            "type": "message",
+            "role": "assistant",
+            "status": "completed",
+            "content": [{"type": "output_text", "text": text, "annotations": []}],
+        }],
+        "parallel_tool_calls": False,
+        "tool_choice": "auto",
+        "tools": [],
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+    token_delay = 0.0
+    chunk_size = 8
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/responses"):
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(self.delay)
+
+        text = json.dumps(REPLY, ensure_ascii=False)
+        if not body.get("stream"):
+            payload = json.dumps(_response_object(text)).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            try:
+                self.wfile.write(payload)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # client gave up (timeout test)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        try:
+            for i in range(0, len(text), self.chunk_size):
+                self._event("response.output_text.delta", {
+                    "item_id": "msg_stub", "output_index": 0, "content_index": 0,
+                    "delta": text[i:i + self.chunk_size], "sequence_number": i,
+                })
+                time.sleep(self.token_delay)
+            self._event("response.completed", {"response": _response_object(text), "sequence_number": len(text)})
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _event(self, kind, data):
+        data = {"type": kind, **data}
+        self.wfile.write(f"event: {kind}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--delay", type=float, default=0.0)
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    args = parser.parse_args()
+
+    StubHandler.delay = args.delay
+    StubHandler.token_delay = args.token_delay
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    print(f"LLM stub listening on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
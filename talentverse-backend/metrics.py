@@ -0,0 +1,189 @@
+"""
+Request metrics.
+
+Every request records wall time, SQL statement count/time (through the
+pooled connection's cursors), JSON encode time and response size into
+per-(route, method, status) histograms. `GET /metrics` renders them in
+Prometheus text format, `GET /admin/metrics` as JSON percentiles, and each
+response carries a Server-Timing header. Counters are per process.
+/metrics needs the admin header or `Authorization: Bearer $METRICS_TOKEN`
+(for scrapers). METRICS_ENABLED=0 turns the hooks off.
+"""
+import bisect
+import hmac
+import os
+import threading
+import time
+
+from flask import g, has_request_context, request
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+LATENCY_BUCKETS_S = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus layout) with quantile estimates."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Linear interpolation inside the bucket holding rank q*count."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+class RequestTimer:
+    """Per-request accumulator kept on flask.g."""
+    __slots__ = ("started", "queries", "sql_s", "json_s")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_s = 0.0
+        self.json_s = 0.0
+
+def request_timer():
+    return g.get("request_timer") if has_request_context() else None
+
+class RouteMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.series = {}  # (route, method, status) -> dict
+
+    def observe(self, route, method, status, timer, elapsed, size):
+        key = (route, method, str(status))
+        with self._lock:
+            s = self.series.get(key)
+            if s is None:
+                s = self.series[key] = {
+                    "duration": Histogram(LATENCY_BUCKETS_S),
+                    "sql": Histogram(LATENCY_BUCKETS_S),
+                    "size": Histogram(SIZE_BUCKETS_BYTES),
+                    "queries": 0,
+                    "json_s": 0.0,
+                }
+            s["duration"].observe(elapsed)
+            s["sql"].observe(timer.sql_s)
+            if size is not None:
+                s["size"].observe(size)
+            s["queries"] += timer.queries
+            s["json_s"] += timer.json_s
+
+    def summary(self):
+        """Routes by total time spent, with p50/p95/p99 latency."""
+        out = []
+        with self._lock:
+            for (route, method, status), s in self.series.items():
+                d = s["duration"]
+                out.append({
+                    "route": route, "method": method, "status": status,
+                    "requests": d.count,
+                    "total_s": round(d.sum, 4),
+                    **{f"p{int(q * 100)}_ms": round(d.quantile(q) * 1000, 2) for q in (0.5, 0.95, 0.99)},
+                    "sql_queries_avg": round(s["queries"] / d.count, 2),
+                    "sql_ms_avg": round(s["sql"].sum / d.count * 1000, 3),
+                    "json_ms_avg": round(s["json_s"] / d.count * 1000, 3),
+                    "bytes_avg": round(s["size"].sum / s["size"].count) if s["size"].count else None,
+                })
+        out.sort(key=lambda r: -r["total_s"])
+        return out
+
+    def render_prometheus(self, prefix="talentverse", gauges=None):
+        """Prometheus text; `gauges` ({name: value}) are appended as-is."""
+        def labels(route, method, status, **extra):
+            pairs = {"route": route, "method": method, "status": status, **extra}
+            return ",".join(f'{k}="{_prom_escape(v)}"' for k, v in pairs.items())
+
+        def histogram(name, help_text, which):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} histogram")
+            for key, s in series:
+                h = s[which]
+                cumulative = 0
+                for bound, n in zip(h.buckets + ("+Inf",), h.counts):
+                    cumulative += n
+                    lines.append(f"{prefix}_{name}_bucket{{{labels(*key, le=bound)}}} {cumulative}")
+                lines.append(f"{prefix}_{name}_sum{{{labels(*key)}}} {h.sum:.6f}")
+                lines.append(f"{prefix}_{name}_count{{{labels(*key)}}} {h.count}")
+
+        def counter(name, help_text, value):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} counter")
+            for key, s in series:
+                lines.append(f"{prefix}_{name}{{{labels(*key)}}} {value(s)}")
+
+        with self._lock:
+            series = sorted(
+                (key, {k: (copy_histogram(v) if isinstance(v, Histogram) else v) for k, v in s.items()})
+                for key, s in self.series.items()
+            )
+        lines = []
+        histogram("http_request_duration_seconds", "Request wall time.", "duration")
+        histogram("http_request_sql_seconds", "SQLite time per request.", "sql")
+        histogram("http_response_size_bytes", "Response body size on the wire.", "size")
+        counter("http_sql_queries_total", "SQL statements executed.", lambda s: s["queries"])
+        counter("http_json_encode_seconds_total", "Time spent encoding JSON responses.", lambda s: f"{s['json_s']:.6f}")
+
+        for name, value in (gauges or {}).items():
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+def copy_histogram(h):
+    c = Histogram(h.buckets)
+    c.counts, c.sum, c.count = list(h.counts), h.sum, h.count
+    return c
+
+def _prom_escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+route_metrics = RouteMetrics()
+
+def token_ok(header):
+    """True for `Bearer $METRICS_TOKEN` (scrapers); always False when unset."""
+    header = header or ""
+    return bool(METRICS_TOKEN) and header.startswith("Bearer ") and hmac.compare_digest(
+        header[7:].strip().encode("utf-8"), METRICS_TOKEN.encode("utf-8")
+    )
+
+def start_request_timer():
+    if METRICS_ENABLED:
+        g.request_timer = RequestTimer()
+
+def record_request_metrics(response):
+    timer = g.pop("request_timer", None)
+    if timer is None:
+        return response
+    elapsed = time.perf_counter() - timer.started
+    route = request.url_rule.rule if request.url_rule else "<unmatched>"
+    # streamed bodies (SSE, exports) have no length; their time is headers-only
+    route_metrics.observe(route, request.method, response.status_code, timer, elapsed, response.content_length)
+    response.headers["Server-Timing"] = (
+        f'app;dur={elapsed * 1000:.2f}, '
+        f'db;dur={timer.sql_s * 1000:.2f};desc="{timer.queries} queries", '
+        f'json;dur={timer.json_s * 1000:.2f}'
+    )
+    return response
+
+def init_app(app):
+    app.before_request(start_request_timer)
+    app.after_request(record_request_metrics)
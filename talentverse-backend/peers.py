@@ -0,0 +1,671 @@
+"""
+Peer matching.
+
+PeerMatcher keeps every user's Big Five vector in memory and answers
+exact top-k queries with one mat-vec product; PeerIndex is the IVF
+approximate index that find_peers switches to for large user bases
+(PEER_INDEX=auto|ann|exact). numpy is optional: without it the exact
+matcher runs in pure Python and the ANN index stays off.
+"""
+import atexit
+import functools
+import hashlib
+import heapq
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+from db import DATABASE_PATH, get_db_connection, safe_json_loads
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np  # pip install numpy
+    _NUMPY_AVAILABLE = True
+except Exception:
+    np = None
+    _NUMPY_AVAILABLE = False
+
+BIG5_TRAITS = ("O", "C", "E", "A", "N")
+MATCH_WEIGHT_BIG5 = 0.75
+MATCH_WEIGHT_DIRECTION = 0.25
+MATCHING_REFRESH_INTERVAL = float(os.getenv("MATCHING_REFRESH_INTERVAL", "300"))
+# typed big5 columns (see migration 4); every matcher query selects them
+BIG5_PCT_COLUMNS = ("pct_o", "pct_c", "pct_e", "pct_a", "pct_n")
+
+def big5_row_percent(row):
+    """[O, C, E, A, N] from the typed columns, or None when no scores are stored."""
+    if row["pct_o"] is None:
+        return None
+    return [float(row[c]) for c in BIG5_PCT_COLUMNS]
+
+def _centered_unit(values):
+    # Center on 50% so "both high" and "both low" agree; all-50 maps to 0
+    v = [(x - 50.0) / 50.0 for x in values]
+    norm = sum(x * x for x in v) ** 0.5
+    return [x / norm for x in v] if norm else v
+
+def _direction_tokens(direction):
+    return frozenset(re.findall(r"[a-z0-9.+#]+", (direction or "").lower()))
+
+def _direction_overlap(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+class PeerMatcher:
+    """
+    In-memory Big Five matrix for peer search.
+    Rows hold centered, unit-length O/C/E/A/N vectors, so one mat-vec
+    product yields cosine similarity against every user. Directions are
+    interned to small ids, so direction overlap is computed once per
+    distinct direction and gathered per row.
+    """
+
+    def __init__(self, refresh_interval=300.0):
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self._rebuild_lock = threading.Lock()  # one rebuild at a time
+        self._replay = None  # writes that land while a rebuild reads the DB
+        self._loaded_at = None
+        self._reset()
+
+    def _reset(self):
+        self._user_ids = []
+        self._rows = {}
+        self._vectors = np.zeros((0, len(BIG5_TRAITS)), dtype=np.float32) if _NUMPY_AVAILABLE else []
+        self._dir_ids = []
+        self._dir_lookup = {}
+        self._dir_tokens = []
+
+    def _dir_id(self, direction):
+        tokens = _direction_tokens(direction)
+        did = self._dir_lookup.get(tokens)
+        if did is None:
+            did = self._dir_lookup[tokens] = len(self._dir_tokens)
+            self._dir_tokens.append(tokens)
+        return did
+
+    def __len__(self):
+        return len(self._user_ids)
+
+    def rebuild(self):
+        with self._rebuild_lock:
+            self._load()
+
+    def _stale(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_interval
+
+    def _load(self):
+        with self._lock:
+            self._replay = []
+        try:
+            conn = get_db_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT b.user_id, b.pct_o, b.pct_c, b.pct_e, b.pct_a, b.pct_n, a.direction
+                    FROM big5 b
+                    LEFT JOIN analysis a ON a.user_id = b.user_id
+                """)
+                rows = cursor.fetchall()
+            finally:
+                conn.close()
+        except Exception:
+            with self._lock:
+                self._replay = None
+            raise
+
+        with self._lock:
+            self._reset()
+            vectors = []
+            for r in rows:
+                percent = big5_row_percent(r)
+                if percent is None:
+                    continue
+                self._rows[r["user_id"]] = len(self._user_ids)
+                self._user_ids.append(r["user_id"])
+                self._dir_ids.append(self._dir_id(r["direction"]))
+                vectors.append(_centered_unit(percent))
+            if _NUMPY_AVAILABLE:
+                self._vectors = np.array(vectors, dtype=np.float32).reshape(-1, len(BIG5_TRAITS))
+                self._dir_ids = np.array(self._dir_ids, dtype=np.int32)
+            else:
+                self._vectors = vectors
+            self._loaded_at = time.monotonic()
+            # the snapshot may predate these commits; applying them again is harmless
+            replay, self._replay = self._replay, None
+            for fn, args in replay:
+                fn(*args)
+
+    def _ensure_fresh(self):
+        if not self._stale():
+            return
+        # Single flight: one caller rebuilds while the others keep querying
+        # the current matrix (only the very first load makes them wait).
+        if not self._rebuild_lock.acquire(blocking=self._loaded_at is None):
+            return
+        try:
+            if self._stale():
+                self._load()
+        finally:
+            self._rebuild_lock.release()
+
+    def upsert(self, user_id, percent, direction=None):
+        """
+        Apply one user's new Big Five result without a full rebuild.
+        Pass the user's current analysis direction; None keeps the stored one.
+        """
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append((self.upsert, (user_id, percent, direction)))
+            if self._loaded_at is None or percent is None:
+                return
+            vec = _centered_unit(percent)
+            row = self._rows.get(user_id)
+            if row is not None:
+                self._vectors[row] = vec
+                if direction is not None:
+                    self._dir_ids[row] = self._dir_id(direction)
+                return
+            self._rows[user_id] = len(self._user_ids)
+            self._user_ids.append(user_id)
+            did = self._dir_id(direction)
+            if _NUMPY_AVAILABLE:
+                self._vectors = np.vstack([self._vectors, np.array([vec], dtype=np.float32)])
+                self._dir_ids = np.append(self._dir_ids, np.int32(did))
+            else:
+                self._vectors.append(vec)
+                self._dir_ids.append(did)
+
+    def set_direction(self, user_id, direction):
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append((self.set_direction, (user_id, direction)))
+            row = self._rows.get(user_id)
+            if row is not None:
+                self._dir_ids[row] = self._dir_id(direction)
+
+    def query(self, user_id, k=6):
+        """Top-k peers for user_id -> [(peer_user_id, score, big5_similarity)]."""
+        self._ensure_fresh()
+        with self._lock:
+            row = self._rows.get(user_id)
+            if row is None or len(self._user_ids) < 2:
+                return []
+            target_dir = self._dir_tokens[self._dir_ids[row]]
+            dir_scores = [_direction_overlap(target_dir, t) for t in self._dir_tokens]
+
+            if _NUMPY_AVAILABLE:
+                sims = self._vectors @ self._vectors[row]
+                overlap = np.asarray(dir_scores, dtype=np.float32)[self._dir_ids]
+                scores = MATCH_WEIGHT_BIG5 * (sims + 1.0) / 2.0 + MATCH_WEIGHT_DIRECTION * overlap
+                scores[row] = -np.inf
+                k = min(k, len(self._user_ids) - 1)
+                top = np.argpartition(-scores, k - 1)[:k]
+                top = top[np.argsort(-scores[top], kind="stable")]
+                return [(self._user_ids[i], float(scores[i]), float(sims[i])) for i in top]
+
+            target = self._vectors[row]
+            ranked = []
+            for i, vec in enumerate(self._vectors):
+                if i == row:
+                    continue
+                sim = sum(a * b for a, b in zip(vec, target))
+                score = MATCH_WEIGHT_BIG5 * (sim + 1.0) / 2.0 + MATCH_WEIGHT_DIRECTION * dir_scores[self._dir_ids[i]]
+                ranked.append((self._user_ids[i], score, sim))
+            return heapq.nlargest(k, ranked, key=lambda x: x[1])
+
+peer_matcher = PeerMatcher(MATCHING_REFRESH_INTERVAL)
+
+# ======================
+# Matching: approximate index (IVF) for large user bases
+# ======================
+# Profile vector = sqrt(0.6) * Big Five unit vector (5 dims)
+#                + sqrt(0.4) * hashed bag of gaps/strengths/interests/direction,
+# normalised, so a dot product blends the two similarities 60/40.
+PEER_INDEX_MODE = os.getenv("PEER_INDEX", "auto")          # auto | ann | exact
+PEER_INDEX_MIN_USERS = int(os.getenv("PEER_INDEX_MIN_USERS", "20000"))
+PEER_INDEX_NPROBE = int(os.getenv("PEER_INDEX_NPROBE", "16"))
+PEER_INDEX_SAVE_EVERY = int(os.getenv("PEER_INDEX_SAVE_EVERY", "5000"))
+PEER_INDEX_CHECK_INTERVAL = float(os.getenv("PEER_INDEX_CHECK_INTERVAL", "300"))
+# One index per database file, so a bench or test DB never shares it with production
+PEER_INDEX_PATH = os.getenv("PEER_INDEX_PATH", os.path.abspath(DATABASE_PATH) + ".peers.npz")
+_CATCH_UP_BATCH = 500  # stays well under SQLite's bound-parameter limit
+PROFILE_HASH_DIMS = 27
+PROFILE_BIG5_WEIGHT = 0.6
+
+@functools.lru_cache(maxsize=65536)
+def _term_bucket(term):
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=4).digest(), "little") % PROFILE_HASH_DIMS
+
+def _profile_terms(gaps, strengths, interests, direction):
+    terms = []
+    if isinstance(interests, dict):
+        interests = (interests.get("skills") or []) + (interests.get("interests") or [])
+    for group in (gaps, strengths, interests):
+        if isinstance(group, list):
+            terms.extend(t.strip().lower() for t in group if isinstance(t, str) and t.strip())
+    terms.extend(_direction_tokens(direction))
+    return terms
+
+def profile_vector(percent, terms):
+    bag = [0.0] * PROFILE_HASH_DIMS
+    for t in terms:
+        bag[_term_bucket(t)] += 1.0
+    norm = sum(x * x for x in bag) ** 0.5
+    bag = [x / norm for x in bag] if norm else bag
+    b5 = _centered_unit(percent) if percent else [0.0] * len(BIG5_TRAITS)
+    wb, ws = PROFILE_BIG5_WEIGHT ** 0.5, (1 - PROFILE_BIG5_WEIGHT) ** 0.5
+    vec = [wb * x for x in b5] + [ws * x for x in bag]
+    norm = sum(x * x for x in vec) ** 0.5
+    return [x / norm for x in vec] if norm else vec
+
+_PROFILE_VECTOR_SELECT = """
+    SELECT u.id, u.data_version, b.pct_o, b.pct_c, b.pct_e, b.pct_a, b.pct_n,
+           a.gaps, a.strengths, a.direction, p.interests
+    FROM big5 b
+    JOIN users u ON u.id = b.user_id
+    LEFT JOIN analysis a ON a.user_id = u.id
+    LEFT JOIN profile p ON p.user_id = u.id
+"""
+
+def _profile_vector_from_row(r):
+    percent = big5_row_percent(r)
+    if percent is None:
+        return None
+    terms = _profile_terms(
+        safe_json_loads(r["gaps"], []),
+        safe_json_loads(r["strengths"], []),
+        safe_json_loads(r["interests"], []),
+        r["direction"],
+    )
+    return profile_vector(percent, terms)
+
+def _spherical_kmeans(X, nlist, iters=10, seed=0, sample_size=100000):
+    rng = np.random.default_rng(seed)
+    if len(X) > sample_size:
+        X = X[rng.choice(len(X), sample_size, replace=False)]
+    centroids = X[rng.choice(len(X), nlist, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(X @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, X)
+        counts = np.bincount(assign, minlength=nlist)
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = X[rng.choice(len(X), int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = (sums / np.maximum(norms, 1e-12)).astype(np.float32)
+    return centroids
+
+class _InvertedList:
+    __slots__ = ("ids", "vecs", "size")
+
+    def __init__(self, dim, ids=None, vecs=None):
+        self.ids = ids if ids is not None else np.zeros(16, dtype=np.int64)
+        self.vecs = vecs if vecs is not None else np.zeros((16, dim), dtype=np.float32)
+        self.size = len(ids) if ids is not None else 0
+
+    def append(self, user_id, vec):
+        if self.size == len(self.ids):
+            cap = max(16, 2 * len(self.ids))
+            self.ids = np.resize(self.ids, cap)
+            self.vecs = np.resize(self.vecs, (cap, self.vecs.shape[1]))
+        self.ids[self.size] = user_id
+        self.vecs[self.size] = vec
+        self.size += 1
+        return self.size - 1
+
+    def remove(self, pos):
+        """Swap-remove; returns the id moved into `pos`, if any."""
+        last = self.size - 1
+        moved = None
+        if pos != last:
+            self.ids[pos] = self.ids[last]
+            self.vecs[pos] = self.vecs[last]
+            moved = int(self.ids[pos])
+        self.size = last
+        return moved
+
+class PeerIndex:
+    """
+    Inverted-file ANN index over profile vectors: spherical k-means picks
+    ~4*sqrt(N) centroids, each user lives in the list of its closest
+    centroid, and a query only scans the `nprobe` best lists. Inserts and
+    updates go straight into their list; the index is persisted next to
+    its database (<db>.peers.npz) and caught up against users.data_version
+    on load.
+    """
+
+    DIM = len(BIG5_TRAITS) + PROFILE_HASH_DIMS
+
+    def __init__(self, path, nprobe=16):
+        self.path = path
+        self.nprobe = nprobe
+        self._lock = threading.RLock()
+        self.centroids = None
+        self.lists = []
+        self.where = {}      # user_id -> (list no, position)
+        self.versions = {}   # user_id -> users.data_version embedded
+        self.dirty = 0
+        self._saving = False
+
+    @property
+    def ready(self):
+        return self.centroids is not None
+
+    def __len__(self):
+        return len(self.where)
+
+    def build(self, ids, vectors, versions=None, nlist=None):
+        X = np.asarray(vectors, dtype=np.float32).reshape(-1, self.DIM)
+        ids = np.asarray(ids, dtype=np.int64)
+        nlist = nlist or int(min(4096, max(1, 4 * len(X) ** 0.5)))
+        nlist = min(nlist, max(1, len(X)))
+        centroids = _spherical_kmeans(X, nlist) if len(X) else np.zeros((1, self.DIM), dtype=np.float32)
+        assign = np.empty(len(X), dtype=np.int64)
+        for i in range(0, len(X), 65536):
+            assign[i:i + 65536] = np.argmax(X[i:i + 65536] @ centroids.T, axis=1)
+
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(len(centroids) + 1))
+        lists, where = [], {}
+        for j in range(len(centroids)):
+            rows = order[bounds[j]:bounds[j + 1]]
+            lists.append(_InvertedList(self.DIM, ids[rows].copy(), X[rows].copy()))
+            for pos, uid in enumerate(ids[rows].tolist()):
+                where[uid] = (j, pos)
+
+        with self._lock:
+            self.centroids, self.lists, self.where = centroids, lists, where
+            self.versions = dict(versions or {})
+            self.dirty = 0
+
+    def build_from_db(self):
+        ids, vectors, versions = [], [], {}
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(_PROFILE_VECTOR_SELECT)
+            while True:
+                rows = cursor.fetchmany(10000)
+                if not rows:
+                    break
+                for r in rows:
+                    vec = _profile_vector_from_row(r)
+                    if vec is not None:
+                        ids.append(r["id"])
+                        vectors.append(vec)
+                        versions[r["id"]] = r["data_version"] or 0
+        finally:
+            conn.close()
+        self.build(ids, vectors, versions)
+        self.save()
+
+    def upsert(self, user_id, vec, version=None):
+        with self._lock:
+            if not self.ready:
+                return
+            vec = np.asarray(vec, dtype=np.float32)
+            target = int(np.argmax(self.centroids @ vec))
+            loc = self.where.get(user_id)
+            if loc is not None and loc[0] == target:
+                self.lists[target].vecs[loc[1]] = vec
+            else:
+                if loc is not None:
+                    self.remove(user_id)
+                self.where[user_id] = (target, self.lists[target].append(user_id, vec))
+            if version is not None:
+                self.versions[user_id] = version
+            self.dirty += 1
+            if self.dirty >= PEER_INDEX_SAVE_EVERY:
+                self.save_async()
+
+    def remove(self, user_id):
+        with self._lock:
+            loc = self.where.pop(user_id, None)
+            if loc is None:
+                return
+            moved = self.lists[loc[0]].remove(loc[1])
+            if moved is not None:
+                self.where[moved] = loc
+
+    def vector(self, user_id):
+        loc = self.where.get(user_id)
+        if loc is None:
+            return None
+        return self.lists[loc[0]].vecs[loc[1]].copy()
+
+    def search(self, vec, k=6, nprobe=None, exclude=None):
+        """Approximate top-k by cosine -> [(user_id, similarity)]."""
+        with self._lock:
+            if not self.ready:
+                return []
+            nprobe = min(nprobe or self.nprobe, len(self.lists))
+            probe = np.argpartition(-(self.centroids @ vec), nprobe - 1)[:nprobe]
+            ids = [self.lists[j].ids[:self.lists[j].size] for j in probe]
+            vecs = [self.lists[j].vecs[:self.lists[j].size] for j in probe]
+            ids = np.concatenate(ids) if ids else np.zeros(0, dtype=np.int64)
+            if not len(ids):
+                return []
+            sims = np.concatenate(vecs) @ vec
+        if exclude is not None:
+            sims[ids == exclude] = -np.inf
+        k = min(k, len(ids))
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top], kind="stable")]
+        return [(int(ids[i]), float(sims[i])) for i in top if np.isfinite(sims[i])]
+
+    def save(self):
+        with self._lock:
+            if not self.ready:
+                return
+            sizes = np.array([lst.size for lst in self.lists], dtype=np.int64)
+            ids = np.concatenate([lst.ids[:lst.size] for lst in self.lists])
+            vecs = np.concatenate([lst.vecs[:lst.size] for lst in self.lists])
+            centroids = self.centroids.copy()
+            ver_keys = np.fromiter(self.versions.keys(), dtype=np.int64, count=len(self.versions))
+            ver_vals = np.fromiter(self.versions.values(), dtype=np.int64, count=len(self.versions))
+            self.dirty = 0
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, centroids=centroids, sizes=sizes, ids=ids, vecs=vecs,
+                     ver_keys=ver_keys, ver_vals=ver_vals)
+        os.replace(tmp, self.path)
+
+    def save_async(self):
+        if self._saving:
+            return
+        self._saving = True
+
+        def run():
+            try:
+                self.save()
+            except Exception:
+                logger.exception("Peer index save failed")
+            finally:
+                self._saving = False
+
+        threading.Thread(target=run, name="peer-index-save", daemon=True).start()
+
+    def load(self):
+        """Load the persisted index; returns False when there is none."""
+        if not os.path.exists(self.path):
+            return False
+        with np.load(self.path) as data:
+            centroids, sizes = data["centroids"], data["sizes"]
+            ids, vecs = data["ids"], data["vecs"]
+            versions = dict(zip(data["ver_keys"].tolist(), data["ver_vals"].tolist()))
+        if centroids.shape[1] != self.DIM:
+            return False
+        lists, where, start = [], {}, 0
+        for j, n in enumerate(sizes.tolist()):
+            lists.append(_InvertedList(self.DIM, ids[start:start + n].copy(), vecs[start:start + n].copy()))
+            for pos, uid in enumerate(ids[start:start + n].tolist()):
+                where[uid] = (j, pos)
+            start += n
+        with self._lock:
+            self.centroids, self.lists, self.where, self.versions = centroids, lists, where, versions
+            self.dirty = 0
+        return True
+
+    def catch_up(self):
+        """Re-embed users whose data_version moved on since the index was saved."""
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT u.id, u.data_version FROM users u JOIN big5 b ON b.user_id = u.id")
+            stale = [r["id"] for r in cursor.fetchall() if self.versions.get(r["id"]) != (r["data_version"] or 0)]
+        finally:
+            conn.close()
+        for i in range(0, len(stale), _CATCH_UP_BATCH):
+            refresh_peer_vectors(stale[i:i + _CATCH_UP_BATCH])
+        return len(stale)
+
+peer_index = PeerIndex(PEER_INDEX_PATH, PEER_INDEX_NPROBE)
+_peer_index_lock = threading.Lock()
+_peer_index_state = {"next_check": 0.0, "loading": False}
+
+def load_peer_index(force_build=False):
+    """
+    Load (and catch up) or build the ANN index; returns True once it is ready.
+    In auto mode a fresh database below PEER_INDEX_MIN_USERS stays on the
+    exact matcher unless force_build is set.
+    """
+    if not force_build and PEER_INDEX_MODE != "ann" and not os.path.exists(peer_index.path):
+        conn = get_db_connection()
+        try:
+            count = conn.execute("SELECT COUNT(*) FROM big5").fetchone()[0]
+        finally:
+            conn.close()
+        if count < PEER_INDEX_MIN_USERS:
+            return False
+    if not force_build and peer_index.load():
+        peer_index.catch_up()
+    else:
+        peer_index.build_from_db()
+        peer_index.catch_up()  # writes that landed while the scan ran
+    return True
+
+def _load_peer_index_background():
+    try:
+        load_peer_index()
+    except Exception:
+        logger.exception("Peer index load failed")
+    finally:
+        with _peer_index_lock:
+            _peer_index_state["loading"] = False
+
+def _use_peer_index():
+    """
+    True once the ANN index is ready. Until then requests use the exact
+    matcher while, at most every PEER_INDEX_CHECK_INTERVAL seconds, a
+    background thread checks the user count and loads or builds the index.
+    """
+    if PEER_INDEX_MODE == "exact" or not _NUMPY_AVAILABLE:
+        return False
+    if peer_index.ready:
+        return True
+    now = time.monotonic()
+    with _peer_index_lock:
+        if _peer_index_state["loading"] or now < _peer_index_state["next_check"]:
+            return False
+        _peer_index_state["loading"] = True
+        _peer_index_state["next_check"] = now + PEER_INDEX_CHECK_INTERVAL
+    threading.Thread(target=_load_peer_index_background, name="peer-index-load", daemon=True).start()
+    return False
+
+def refresh_peer_vectors(user_ids):
+    """Re-embed the given users into the ANN index (no-op until it is loaded)."""
+    if not peer_index.ready or not user_ids:
+        return
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"{_PROFILE_VECTOR_SELECT} WHERE u.id IN ({', '.join('?' for _ in user_ids)})",
+            list(user_ids),
+        )
+        rows = cursor.fetchall()
+    finally:
+        conn.close()
+    for r in rows:
+        vec = _profile_vector_from_row(r)
+        if vec is not None:
+            peer_index.upsert(r["id"], vec, r["data_version"] or 0)
+
+def find_peers(user_id, k=6):
+    """Top-k peers -> [(peer_user_id, score 0..1, big5_similarity)]."""
+    if not _use_peer_index():
+        return peer_matcher.query(user_id, k)
+    vec = peer_index.vector(user_id)
+    if vec is None:
+        return []
+    # Big Five similarity = cosine of the 5-dim slices; their share of the
+    # normalised vector varies with how many profile terms a user has
+    n = len(BIG5_TRAITS)
+    own = vec[:n]
+    own_norm = float(np.linalg.norm(own))
+    peers = []
+    for peer_id, sim in peer_index.search(vec, k, exclude=user_id):
+        other = peer_index.vector(peer_id)
+        norms = own_norm * float(np.linalg.norm(other[:n])) if other is not None else 0.0
+        b5 = float(other[:n] @ own) / norms if norms else 0.0
+        peers.append((peer_id, (sim + 1.0) / 2.0, b5))
+    return peers
+
+@atexit.register
+def _save_peer_index():
+    if peer_index.ready and peer_index.dirty:
+        peer_index.save()
+
+def benchmark_peer_index(n_users=100000, n_queries=200, k=10, nprobes=(1, 2, 4, 8, 16, 32), seed=0):
+    """Recall@k and latency of PeerIndex against brute force on synthetic profiles."""
+    rng = random.Random(seed)
+    vocab = [f"skill{i}" for i in range(400)]
+    X = np.array([
+        profile_vector([rng.randint(0, 100) for _ in BIG5_TRAITS], rng.sample(vocab, rng.randint(1, 8)))
+        for _ in range(n_users)
+    ], dtype=np.float32)
+    index = PeerIndex(os.devnull)
+    started = time.perf_counter()
+    index.build(np.arange(n_users), X)
+    build_s = time.perf_counter() - started
+
+    queries = rng.sample(range(n_users), min(n_queries, n_users))
+    truth, exact_ms = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        sims = X @ X[q]
+        sims[q] = -np.inf
+        top = np.argpartition(-sims, k - 1)[:k]
+        exact_ms.append((time.perf_counter() - t0) * 1000)
+        truth.append(set(top.tolist()))
+
+    results = []
+    for nprobe in nprobes:
+        hits, lat = 0, []
+        for q, expected in zip(queries, truth):
+            t0 = time.perf_counter()
+            found = index.search(X[q], k, nprobe=nprobe, exclude=q)
+            lat.append((time.perf_counter() - t0) * 1000)
+            hits += len(expected & {uid for uid, _ in found})
+        lat.sort()
+        results.append({
+            "nprobe": nprobe,
+            "recall_at_k": round(hits / (k * len(queries)), 4),
+            "p50_ms": round(lat[len(lat) // 2], 3),
+            "p95_ms": round(lat[int(len(lat) * 0.95) - 1], 3),
+        })
+    exact_ms.sort()
+    return {
+        "users": n_users,
+        "lists": len(index.lists),
+        "build_s": round(build_s, 2),
+        "exact_p50_ms": round(exact_ms[len(exact_ms) // 2], 3),
+        "results": results,
+    }
@@ -0,0 +1,243 @@
+"""
+Admin request profiling (opt-in).
+
+With PROFILING_ENABLED=1 an admin request can carry `X-Profile: cprofile`
+(deterministic, higher overhead) or `X-Profile: sample` (stack sampling of
+that request's thread every PROFILE_SAMPLE_INTERVAL_MS); the response gets
+an X-Profile-Id to fetch from /admin/profiles/<id>. POST
+/admin/profile/sample samples every in-flight request for N seconds.
+Output is pstats text, a raw pstats dump (snakeviz) or collapsed stacks
+(flamegraph.pl / speedscope). When disabled no hooks are registered.
+"""
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from flask import Response, g, jsonify, request
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "2"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+
+class StackSampler:
+    """Background thread that counts collapsed stacks of selected threads."""
+
+    def __init__(self, interval_s, thread_ids=None):
+        self.interval_s = max(0.0005, interval_s)
+        self.thread_ids = thread_ids  # set of idents, a callable -> set, or None for all
+        self.stacks = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval_s):
+            wanted = self.thread_ids() if callable(self.thread_ids) else self.thread_ids
+            for tid, frame in sys._current_frames().items():
+                if tid == own or (wanted is not None and tid not in wanted):
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                key = ";".join(reversed(names))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+                self.samples += 1
+
+def collapsed_stacks(stacks):
+    return "".join(f"{stack} {n}\n" for stack, n in sorted(stacks.items(), key=lambda kv: -kv[1]))
+
+class ProfileStore:
+    """Last PROFILE_KEEP profiles, newest first."""
+
+    def __init__(self, keep):
+        self._items = deque(maxlen=max(1, keep))
+        self._lock = threading.Lock()
+        self._next_id = 1
+
+    def add(self, kind, data, **meta):
+        with self._lock:
+            pid = self._next_id
+            self._next_id += 1
+            self._items.appendleft({"id": pid, "kind": kind, "created_at": datetime.utcnow().isoformat() + "Z", "data": data, **meta})
+        return pid
+
+    def get(self, pid):
+        with self._lock:
+            return next((p for p in self._items if p["id"] == pid), None)
+
+    def list(self):
+        with self._lock:
+            return [{k: v for k, v in p.items() if k != "data"} for p in self._items]
+
+profile_store = ProfileStore(PROFILE_KEEP)
+_cprofile_lock = threading.Lock()  # cProfile allows one active profiler per process
+_request_threads = set()           # idents of threads inside a request (sampling)
+_request_threads_lock = threading.Lock()
+PROFILE_FORMATS = {"cprofile": ("text", "raw"), "sample": ("text", "collapsed")}
+_admin_check = None  # set by init_app
+
+def _is_admin():
+    return _admin_check is not None and _admin_check()
+
+def request_thread_ids():
+    """Snapshot of the in-request thread idents (safe to iterate)."""
+    with _request_threads_lock:
+        return set(_request_threads)
+
+class _ProfileStats:
+    """Profile-like holder; pstats.Stats takes over (and empties) .stats."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+def render_profile(entry, fmt, sort="cumulative", limit=60):
+    """Response body + mimetype for a stored profile."""
+    if entry["kind"] == "cprofile":
+        if fmt == "raw":
+            return marshal.dumps(entry["data"]), "application/octet-stream"
+        stream = io.StringIO()
+        holder = _ProfileStats(dict(entry["data"]))
+        pstats.Stats(holder, stream=stream).sort_stats(sort).print_stats(limit)
+        return stream.getvalue(), "text/plain"
+    return collapsed_stacks(entry["data"]), "text/plain"
+
+def start_request_profile():
+    with _request_threads_lock:
+        _request_threads.add(threading.get_ident())
+    mode = (request.headers.get("X-Profile") or "").strip().lower()
+    if not mode:
+        return
+    if mode not in PROFILE_FORMATS:
+        return jsonify({"error": "X-Profile must be 'cprofile' or 'sample'"}), 400
+    if not _is_admin():
+        return
+    if mode == "sample":
+        g.profiler = ("sample", StackSampler(PROFILE_SAMPLE_INTERVAL_MS / 1000.0, {threading.get_ident()}).start())
+    elif _cprofile_lock.acquire(blocking=False):
+        profiler = cProfile.Profile()
+        g.profiler = ("cprofile", profiler)
+        profiler.enable()
+    g.profile_started = time.perf_counter()
+
+def finish_request_profile(response):
+    entry = _stop_request_profile()
+    if entry is not None:
+        kind, data = entry
+        pid = profile_store.add(
+            kind, data, method=request.method, path=request.path, status=response.status_code,
+            duration_ms=round((time.perf_counter() - g.profile_started) * 1000, 3),
+        )
+        response.headers["X-Profile-Id"] = str(pid)
+    return response
+
+def end_request_profile(exc):
+    with _request_threads_lock:
+        _request_threads.discard(threading.get_ident())
+    _stop_request_profile()  # after_request skipped (e.g. unhandled error)
+
+def _stop_request_profile():
+    entry = g.pop("profiler", None)
+    if entry is None:
+        return None
+    kind, profiler = entry
+    if kind == "cprofile":
+        profiler.disable()
+        _cprofile_lock.release()
+        profiler.create_stats()
+        return kind, profiler.stats
+    return kind, profiler.stop()
+
+def _profiling_guard():
+    if not _is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+    if not PROFILING_ENABLED:
+        return jsonify({"error": "Profiling is disabled (set PROFILING_ENABLED=1)"}), 404
+    return None
+
+def admin_profiles():
+    denied = _profiling_guard()
+    if denied:
+        return denied
+    return jsonify({"profiles": profile_store.list()})
+
+def admin_profile(pid):
+    """Query: format=text|raw (cProfile) or text|collapsed (sample), sort=<pstats key>, limit=<n>."""
+    denied = _profiling_guard()
+    if denied:
+        return denied
+    entry = profile_store.get(pid)
+    if not entry:
+        return jsonify({"error": "Profile not found"}), 404
+    fmt = (request.args.get("format") or "text").lower()
+    if fmt not in PROFILE_FORMATS[entry["kind"]]:
+        allowed = "|".join(PROFILE_FORMATS[entry["kind"]])
+        return jsonify({"error": f"format must be {allowed} for {entry['kind']} profiles"}), 400
+    sort = request.args.get("sort") or "cumulative"
+    try:
+        limit = int(request.args.get("limit", 60))
+        body, mimetype = render_profile(entry, fmt, sort, limit)
+    except (ValueError, KeyError) as e:
+        return jsonify({"error": f"Bad sort/limit: {e}"}), 400
+    return Response(body, mimetype=mimetype)
+
+def admin_profile_sample():
+    """
+    Sample every thread that is inside a request for N seconds.
+    Body: {"seconds": 10, "interval_ms": 5, "all_threads": false}
+    Blocks for the duration, then returns collapsed stacks (X-Profile-Id set).
+    """
+    denied = _profiling_guard()
+    if denied:
+        return denied
+    data = request.get_json(silent=True) or {}
+    try:
+        seconds = min(float(data.get("seconds", 10)), PROFILE_MAX_SECONDS)
+        interval_ms = max(float(data.get("interval_ms", PROFILE_SAMPLE_INTERVAL_MS)), 0.5)
+    except (TypeError, ValueError):
+        return jsonify({"error": "seconds and interval_ms must be numbers"}), 400
+
+    me = threading.get_ident()
+    targets = None if data.get("all_threads") else (lambda: request_thread_ids() - {me})
+    sampler = StackSampler(interval_ms / 1000.0, targets).start()
+    time.sleep(max(0.0, seconds))
+    stacks = sampler.stop()
+    pid = profile_store.add("sample", stacks, method="*", path="*", seconds=seconds,
+                            interval_ms=interval_ms, samples=sampler.samples)
+    response = Response(collapsed_stacks(stacks), mimetype="text/plain")
+    response.headers["X-Profile-Id"] = str(pid)
+    return response
+
+def init_app(app, is_admin):
+    """Register the request hooks (only when enabled) and the /admin/profile* routes."""
+    global _admin_check
+    _admin_check = is_admin
+    if PROFILING_ENABLED:
+        app.before_request(start_request_profile)
+        app.after_request(finish_request_profile)
+        app.teardown_request(end_request_profile)
+    app.add_url_rule("/admin/profiles", view_func=admin_profiles, methods=["GET"])
+    app.add_url_rule("/admin/profiles/<int:pid>", view_func=admin_profile, methods=["GET"])
+    app.add_url_rule("/admin/profile/sample", view_func=admin_profile_sample, methods=["POST"])
@@ -0,0 +1,183 @@
+"""
+Admission control for the coach endpoints.
+
+The coach endpoints are the most expensive per request. Each call takes
+one token from a per-IP and a per-firebase_uid bucket (refilled
+continuously up to a burst size); an empty bucket is answered at once
+with 429 + Retry-After. Buckets live in process memory, or with
+RATE_LIMIT_BACKEND=sqlite in the rate_buckets table so every worker
+sharing the database enforces one limit. LLM requests that would queue
+behind more than LLM_QUEUE_DEPTH others are turned away the same way
+(see ai_coach in app.py).
+"""
+import functools
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import jsonify, request
+
+from db import get_db_connection
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") != "0"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()  # memory | sqlite
+RATE_LIMITS = {  # scope -> (tokens per second, burst); a rate of 0 disables the scope
+    "ip": (float(os.getenv("RATE_LIMIT_IP_PER_MIN", "120")) / 60.0, float(os.getenv("RATE_LIMIT_IP_BURST", "40"))),
+    "uid": (float(os.getenv("RATE_LIMIT_UID_PER_MIN", "30")) / 60.0, float(os.getenv("RATE_LIMIT_UID_BURST", "10"))),
+}
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "0") == "1"
+
+class MemoryBuckets:
+    """Token buckets in an LRU-bounded dict."""
+
+    def __init__(self, max_keys):
+        self.max_keys = max(1, max_keys)
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, now):
+        """-> seconds until a token is available (0.0 = taken)."""
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+            wait = 0.0
+            if tokens >= 1.0:
+                tokens -= 1.0
+            else:
+                wait = (1.0 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def refund(self, key, burst):
+        """Give back a token taken by take()."""
+        with self._lock:
+            entry = self._buckets.get(key)
+            if entry is not None:
+                self._buckets[key] = (min(burst, entry[0] + 1.0), entry[1])
+
+class SQLiteBuckets:
+    """Token buckets in rate_buckets; one UPSERT per take, shared by all workers."""
+
+    _TAKE_SQL = """
+        INSERT INTO rate_buckets (key, tokens, updated_at) VALUES (:key, :burst - 1, :now)
+        ON CONFLICT(key) DO UPDATE SET
+            tokens = MIN(:burst, tokens + MAX(0, :now - updated_at) * :rate) - 1,
+            updated_at = :now
+        WHERE MIN(:burst, tokens + MAX(0, :now - updated_at) * :rate) >= 1
+        RETURNING tokens
+    """
+    PRUNE_EVERY = 1000
+
+    def __init__(self):
+        self._takes = 0
+
+    def take(self, key, rate, burst, now):
+        params = {"key": key, "rate": rate, "burst": burst, "now": now}
+        conn = get_db_connection()
+        try:
+            row = conn.execute(self._TAKE_SQL, params).fetchone()
+            wait = 0.0
+            if row is None:
+                current = conn.execute(
+                    "SELECT tokens, updated_at FROM rate_buckets WHERE key = ?", (key,)
+                ).fetchone()
+                tokens = min(burst, current["tokens"] + max(0.0, now - current["updated_at"]) * rate)
+                wait = max(0.0, 1.0 - tokens) / rate
+            self._takes += 1
+            if self._takes % self.PRUNE_EVERY == 0:
+                # a bucket idle for an hour is full again; dropping it changes nothing
+                conn.execute("DELETE FROM rate_buckets WHERE updated_at < ?", (now - 3600,))
+            conn.commit()
+        finally:
+            conn.close()
+        return wait
+
+    def refund(self, key, burst):
+        conn = get_db_connection()
+        try:
+            conn.execute("UPDATE rate_buckets SET tokens = MIN(?, tokens + 1) WHERE key = ?", (burst, key))
+            conn.commit()
+        finally:
+            conn.close()
+
+class AdmissionController:
+    def __init__(self, buckets, limits):
+        self.buckets = buckets
+        self.limits = {scope: (rate, max(1.0, burst)) for scope, (rate, burst) in limits.items() if rate > 0}
+        self._lock = threading.Lock()
+        self.counts = {"admitted": 0, "denied_ip": 0, "denied_uid": 0, "denied_llm_busy": 0}
+
+    def note(self, outcome):
+        with self._lock:
+            self.counts[outcome] += 1
+
+    def admit(self, ip, firebase_uid):
+        """
+        None when admitted, else seconds the caller should wait. A denied
+        call costs nothing: tokens taken from earlier scopes are refunded.
+        """
+        now = time.time()
+        taken = []
+        for scope, value in (("ip", ip), ("uid", firebase_uid)):
+            if value is None or scope not in self.limits:
+                continue
+            rate, burst = self.limits[scope]
+            key = f"{scope}:{value}"
+            wait = self.buckets.take(key, rate, burst, now)
+            if wait > 0:
+                for taken_key, taken_burst in taken:
+                    self.buckets.refund(taken_key, taken_burst)
+                self.note(f"denied_{scope}")
+                return wait
+            taken.append((key, burst))
+        self.note("admitted")
+        return None
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+        return {
+            "enabled": RATE_LIMIT_ENABLED,
+            "backend": RATE_LIMIT_BACKEND,
+            "limits": {s: {"per_min": round(r * 60, 3), "burst": b} for s, (r, b) in self.limits.items()},
+            **counts,
+        }
+
+admission = AdmissionController(
+    SQLiteBuckets() if RATE_LIMIT_BACKEND == "sqlite" else MemoryBuckets(RATE_LIMIT_MAX_KEYS),
+    RATE_LIMITS,
+)
+
+def client_ip():
+    if RATE_LIMIT_TRUST_PROXY:
+        forwarded = (request.headers.get("X-Forwarded-For") or "").split(",")[0].strip()
+        if forwarded:
+            return forwarded
+    return request.remote_addr or "unknown"
+
+def too_many_requests(retry_after):
+    seconds = max(1, int(math.ceil(retry_after)))
+    response = jsonify({"error": "Too many requests", "retry_after": seconds})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(seconds)
+    return response
+
+def rate_limited(view):
+    """Charge the caller's IP and firebase_uid (URL or JSON body) one token."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if RATE_LIMIT_ENABLED:
+            uid = kwargs.get("firebase_uid")
+            if uid is None and request.is_json:
+                uid = (request.get_json(silent=True) or {}).get("firebase_uid")
+            wait = admission.admit(client_ip(), uid if isinstance(uid, str) and uid else None)
+            if wait is not None:
+                return too_many_requests(wait)
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,31 @@
+"""
+Shared setup: app reads DATABASE_PATH at import, so every test module runs
+against one freshly migrated temporary database.
+"""
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+_DB_DIR = tempfile.mkdtemp(prefix="talentverse-tests-")
+os.environ["DATABASE_PATH"] = os.path.join(_DB_DIR, "tests.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+
+app_module.init_db()
+
+ADMIN_HEADERS = {"X-Admin-Email": os.getenv("ADMIN_EMAIL", "admin@example.com")}
+
+
+@pytest.fixture
+def client():
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def uid():
+    """A fresh firebase_uid per test."""
+    return f"user-{uuid.uuid4().hex[:12]}"
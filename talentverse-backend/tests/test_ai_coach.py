@@ -0,0 +1,44 @@
+"""AI coach: slow LLM calls must not pin pooled DB connections."""
+import threading
+import time
+
+import app
+import db
+
+
+def test_slow_llm_calls_leave_the_pool_free(client, uid, monkeypatch):
+    calls = 2
+    in_llm = threading.Semaphore(0)
+    release = threading.Event()
+
+    def slow_complete(api_key, messages):
+        in_llm.release()
+        release.wait(10)
+        return ""
+
+    assert client.post("/profile", json={"firebase_uid": uid, "displayName": "Sam"}).status_code == 200
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(app, "_OPENAI_AVAILABLE", True)
+    monkeypatch.setattr(app, "_llm_complete", slow_complete)
+    monkeypatch.setattr(db, "db_pool", db.ConnectionPool(db.DATABASE_PATH, calls, timeout=1.0))
+
+    statuses = []
+
+    def coach(i):
+        r = app.app.test_client().post("/ai/coach", json={"firebase_uid": uid, "message": f"plan {i}"})
+        statuses.append(r.status_code)
+
+    threads = [threading.Thread(target=coach, args=(i,)) for i in range(calls)]
+    for t in threads:
+        t.start()
+    try:
+        for _ in range(calls):
+            assert in_llm.acquire(timeout=10)
+        # every pooled connection would be taken if the coach held one
+        assert client.get(f"/profile/{uid}").status_code == 200
+        assert db.db_pool.metrics()["in_use"] == 0
+    finally:
+        release.set()
+        for t in threads:
+            t.join(10)
+    assert statuses == [200] * calls
@@ -0,0 +1,47 @@
+"""Big Five saves: typed columns round-trip; odd percentages never 500."""
+import pytest
+
+import app
+from conftest import ADMIN_HEADERS
+
+PAYLOAD = {
+    "scores_sum": {"O": 40, "C": 35, "E": 20, "A": 38, "N": 18},
+    "scores_percent": {"O": 80, "C": 70, "E": 40, "A": 76, "N": 36},
+    "answers": {"1": 4, "2": 5, "3": 1},
+    "label": "Explorer",
+    "model": "big5_v1",
+}
+
+BAD_PERCENTS = [
+    {"O": "nan", "C": 50, "E": 50, "A": 50, "N": 50},
+    {"O": "inf", "C": "-inf", "E": 50, "A": 50, "N": 50},
+    {"O": 1e30, "C": -5, "E": 10 ** 400, "A": 50, "N": 50},
+]
+
+
+def test_frontend_payload_round_trips(client, uid):
+    assert client.post("/save-big5", json={"firebase_uid": uid, **PAYLOAD}).status_code == 200
+    body = client.get(f"/big5/{uid}").get_json()
+    assert body["scores"] == {"sum": PAYLOAD["scores_sum"], "percent": PAYLOAD["scores_percent"], "model": "big5_v1"}
+    assert body["result"] == {"label": "Explorer", "percent": PAYLOAD["scores_percent"]}
+    assert body["answers"] == PAYLOAD["answers"]
+
+
+@pytest.mark.parametrize("percent", BAD_PERCENTS)
+def test_out_of_range_percent_is_saved(client, uid, percent):
+    payload = {**PAYLOAD, "scores_percent": percent}
+    assert client.post("/save-big5", json={"firebase_uid": uid, **payload}).status_code == 200
+    assert client.get(f"/big5/{uid}").status_code == 200
+
+
+@pytest.mark.parametrize("percent", BAD_PERCENTS)
+def test_out_of_range_percent_in_bulk(client, uid, percent):
+    record = {"firebase_uid": uid, **PAYLOAD, "scores_percent": percent}
+    r = client.post("/bulk/big5", json=[record], headers=ADMIN_HEADERS)
+    assert r.status_code == 200
+    assert r.get_json()["saved"] == 1
+
+
+def test_percentages_are_clamped():
+    percent = app.big5_percent({"percent": {"O": "nan", "C": 1e30, "E": -5, "A": 10 ** 400, "N": 42.5}}, None)
+    assert percent == [0.0, 100.0, 0.0, 0.0, 42.5]
@@ -0,0 +1,63 @@
+"""Bulk import: admin only, one status per record, bad records don't sink the batch."""
+import json
+import uuid
+
+import app
+from conftest import ADMIN_HEADERS
+
+PERSONALITY = {
+    "learning_style": "visual", "decision_style": "logic", "work_preference": "solo",
+    "motivation_state": "high", "clarity_level": "clear",
+}
+
+
+def _uid():
+    return f"bulk-{uuid.uuid4().hex[:12]}"
+
+
+def test_bulk_requires_admin(client):
+    assert client.post("/bulk/personality", json=[]).status_code == 403
+
+
+def test_unknown_kind_is_rejected(client):
+    assert client.post("/bulk/nope", json=[], headers=ADMIN_HEADERS).status_code == 400
+
+
+def test_errors_are_reported_per_record(client):
+    good, missing_field = _uid(), _uid()
+    records = [
+        {"firebase_uid": good, **PERSONALITY},
+        "not an object",
+        {**PERSONALITY},
+        {"firebase_uid": ["x"], **PERSONALITY},
+        {"firebase_uid": _uid(), "email": 5, **PERSONALITY},
+        {"firebase_uid": missing_field, "learning_style": "visual"},
+    ]
+    r = client.post("/bulk/personality", json={"records": records}, headers=ADMIN_HEADERS)
+    assert r.status_code == 200
+    body = r.get_json()
+    assert (body["total"], body["saved"], body["failed"]) == (6, 1, 5)
+    statuses = [(res["index"], res["status"]) for res in body["results"]]
+    assert statuses == [(0, "ok")] + [(i, "error") for i in range(1, 6)]
+    assert body["results"][2]["error"] == "Missing firebase_uid"
+    assert body["results"][3]["error"] == "Invalid firebase_uid"
+    assert body["results"][4]["error"] == "email must be a string"
+    assert body["results"][5]["error"].startswith("Missing ")
+
+    assert client.get(f"/personality/{good}").get_json()["clarity_level"] == "clear"
+    assert app.lookup_user_id(missing_field) is not None  # user exists, row was not written
+    assert client.get(f"/personality/{missing_field}").status_code == 404
+
+
+def test_ndjson_body_with_a_bad_line(client):
+    uids = [_uid(), _uid()]
+    body = "\n".join([
+        json.dumps({"firebase_uid": uids[0], "field": "frontend", "level": "beginner"}),
+        "{not json",
+        json.dumps({"firebase_uid": uids[1], "field": "frontend", "level": "intermediate"}),
+    ])
+    r = client.post("/bulk/analysis", data=body, content_type="application/x-ndjson", headers=ADMIN_HEADERS)
+    assert r.status_code == 200
+    result = r.get_json()
+    assert [res["status"] for res in result["results"]] == ["ok", "error", "ok"]
+    assert client.get(f"/analysis/{uids[1]}").get_json()["direction"] == "Frontend Developer"
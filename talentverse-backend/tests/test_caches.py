@@ -0,0 +1,68 @@
+"""In-process caches: LRU/TTL bounds and the firebase_uid -> users.id map."""
+import time
+
+import app
+
+
+def test_lru_evicts_least_recently_used():
+    cache = app.LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" is now the oldest
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expires_entries():
+    cache = app.LRUCache(maxsize=4, ttl=0.05)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=10)
+    assert cache.get("a") == 1
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+
+
+def test_ensure_user_writes_through_to_the_id_cache(uid):
+    user_id = app.ensure_user(uid, "a@example.com")
+    assert app.user_id_cache.get(uid) == user_id
+
+    checkouts = app.db_pool.metrics()["checkouts"]
+    assert app.ensure_user(uid) == user_id
+    assert app.lookup_user_id(uid) == user_id
+    assert app.db_pool.metrics()["checkouts"] == checkouts  # served from the cache
+
+
+def test_lookup_repopulates_after_eviction(uid):
+    user_id = app.ensure_user(uid)
+    app.user_id_cache.pop(uid)
+    assert app.lookup_user_id(uid) == user_id
+    assert app.user_id_cache.get(uid) == user_id
+
+
+def test_unknown_uid_is_not_cached(uid):
+    assert app.lookup_user_id(uid) is None
+    assert app.user_id_cache.get(uid) is None
+
+
+def test_coach_output_is_cached_per_data_version(client, uid):
+    assert client.post("/analyze", json={"firebase_uid": uid, "field": "frontend", "level": "beginner"}).status_code == 200
+    first = app.generate_coach_output(uid, "priorities")
+    assert app.generate_coach_output(uid, "priorities") is first
+    assert first["direction"] == "Junior Frontend Developer"
+
+    # a write bumps data_version, so the next read misses and regenerates
+    assert client.post("/analyze", json={"firebase_uid": uid, "field": "frontend", "level": "intermediate"}).status_code == 200
+    second = app.generate_coach_output(uid, "priorities")
+    assert second is not first
+    assert second["direction"] == "Frontend Developer"
+
+
+def test_coach_overrides_get_their_own_entry(uid):
+    app.ensure_user(uid)
+    plain = app.generate_coach_output(uid, "daily")
+    override = app.generate_coach_output(uid, "daily", override_big5={"O": 90, "C": 10, "E": 50, "A": 50, "N": 50})
+    assert override is not plain
+    assert app.generate_coach_output(uid, "daily") is plain
@@ -0,0 +1,91 @@
+"""CourseIndex.top_k against the per-course scan it replaced."""
+import random
+
+import pytest
+
+import app
+
+
+def course_score(course, gaps, level, direction):
+    """The original scorer, run against every course on every request."""
+    score = 0
+    tags = course.get("tags", []) or []
+    title = (course.get("title") or "").lower()
+
+    # gaps boost (better match)
+    for g in (gaps or []):
+        g_low = (g or "").lower().strip()
+        if not g_low:
+            continue
+        if any(g_low in (t or "").lower() for t in tags) or g_low in title:
+            score += 5
+
+    # level match
+    if level and (course.get("level", "").lower() == str(level).lower()):
+        score += 2
+
+    # direction hint (simple)
+    if direction and "frontend" in direction.lower():
+        if any((t or "").lower() == "react" for t in tags):
+            score += 1
+
+    return score
+
+
+def reference_top_k(courses, gaps, level, direction, k):
+    return sorted(courses, key=lambda c: course_score(c, gaps, level, direction), reverse=True)[:k]
+
+
+WORDS = ["React", "react", "JS", "JavaScript", "TypeScript", "CSS", "HTML", "Python", "SQL", "ML",
+         "Data", "Testing", "Node", "APIs", "Docker", "Git", "Go", "R", "Design", "UX"]
+LEVELS = ["Beginner", "Intermediate", "Advanced", ""]
+
+
+def random_catalog(rng, n):
+    return [{
+        "id": f"c{i}",
+        "title": " ".join(rng.sample(WORDS, rng.randint(1, 3))),
+        "level": rng.choice(LEVELS),
+        "tags": rng.sample(WORDS, rng.randint(0, 4)),
+    } for i in range(n)]
+
+
+def random_gap(rng):
+    word = rng.choice(WORDS)
+    kind = rng.random()
+    if kind < 0.4:
+        return word
+    if kind < 0.7:
+        start = rng.randrange(len(word))
+        return word[start:start + rng.randint(1, 4)].upper()  # substring, any case
+    if kind < 0.8:
+        return rng.choice(["", "  ", None])
+    return f" {word.lower()} "
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_top_k_matches_the_reference_scan(seed):
+    rng = random.Random(seed)
+    courses = random_catalog(rng, rng.randint(1, 120))
+    index = app.CourseIndex(courses)
+    for _ in range(20):
+        gaps = [random_gap(rng) for _ in range(rng.randint(0, 5))]
+        level = rng.choice(LEVELS + [None, "beginner"])
+        direction = rng.choice([None, "Frontend Developer", "Data Scientist", "frontend"])
+        k = rng.randint(1, len(courses) + 2)
+
+        expected = reference_top_k(courses, gaps, level, direction, k)
+        assert [c["id"] for c in index.top_k(gaps, level, direction, k)] == [c["id"] for c in expected]
+
+        sparse = index.scores(gaps, level, direction)
+        assert sparse == {
+            pos: course_score(c, gaps, level, direction)
+            for pos, c in enumerate(courses) if course_score(c, gaps, level, direction)
+        }
+
+
+def test_builtin_catalog_matches_the_reference_scan():
+    gaps = ["JavaScript", "React", "Testing"]
+    expected = reference_top_k(app.BUILTIN_COURSE_CATALOG, gaps, None, "Junior Frontend Developer", 18)
+    index = app.CourseIndex(app.BUILTIN_COURSE_CATALOG)
+    assert index.top_k(gaps, None, "Junior Frontend Developer", 18) == expected
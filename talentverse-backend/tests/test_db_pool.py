@@ -0,0 +1,57 @@
+"""Connection pool: bounded checkouts, timeout when exhausted, release on teardown."""
+import pytest
+
+import db
+
+
+@pytest.fixture
+def pool():
+    pool = db.ConnectionPool(db.DATABASE_PATH, 2, timeout=0.1)
+    yield pool
+    pool.close_all()
+
+
+def test_exhausted_pool_times_out_then_recovers(pool):
+    first, second = pool.acquire(), pool.acquire()
+    with pytest.raises(RuntimeError, match="exhausted"):
+        pool.acquire()
+    assert pool.metrics()["timeouts"] == 1
+
+    pool.release(first)
+    again = pool.acquire()
+    assert again is first  # reused, not reopened
+    assert pool.metrics()["connections_opened"] == 2
+    pool.release(again)
+    pool.release(second)
+    assert pool.metrics()["in_use"] == 0
+
+
+def test_release_rolls_back_uncommitted_work(pool, uid):
+    conn = pool.acquire()
+    conn.execute("INSERT INTO users (firebase_uid, email) VALUES (?, '')", (uid,))
+    pool.release(conn)
+
+    conn = pool.acquire()
+    try:
+        assert conn.execute("SELECT 1 FROM users WHERE firebase_uid = ?", (uid,)).fetchone() is None
+    finally:
+        pool.release(conn)
+
+
+def test_request_connection_is_returned_on_teardown(client, uid, pool, monkeypatch):
+    monkeypatch.setattr(db, "db_pool", pool)
+    assert client.post("/profile", json={"firebase_uid": uid, "displayName": "Sam"}).status_code == 200
+    # more requests than connections: each one must hand its connection back
+    for _ in range(5):
+        assert client.get(f"/profile/{uid}").status_code == 200
+    assert pool.metrics()["in_use"] == 0
+    assert pool.metrics()["timeouts"] == 0
+
+
+def test_one_connection_per_request(client, uid, monkeypatch):
+    pool = db.ConnectionPool(db.DATABASE_PATH, 1, timeout=0.1)
+    monkeypatch.setattr(db, "db_pool", pool)
+    # ensure_user, the upsert and the snapshot refresh all share g.db
+    assert client.post("/profile", json={"firebase_uid": uid, "displayName": "Sam"}).status_code == 200
+    assert pool.metrics()["checkouts"] == 1
+    pool.close_all()
@@ -0,0 +1,68 @@
+"""Admin export: admin only, streamed NDJSON/CSV, JSON columns decoded."""
+import csv
+import io
+import json
+
+import pytest
+
+from conftest import ADMIN_HEADERS
+
+
+@pytest.fixture
+def profiled(client, uid):
+    r = client.post("/profile", json={"firebase_uid": uid, "display_name": "Sam", "interests": ["ml", "web"]})
+    assert r.status_code == 200
+    return uid
+
+
+def _ndjson(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines() if line]
+
+
+def test_export_requires_admin(client, profiled):
+    assert client.get("/admin/export/profile").status_code == 403
+    assert client.get("/admin/export/profile", headers={"X-Admin-Email": "someone@example.com"}).status_code == 403
+
+
+def test_ndjson_export_streams_decoded_rows(client, profiled):
+    r = client.get("/admin/export/profile", headers=ADMIN_HEADERS)
+    assert r.status_code == 200
+    assert r.is_streamed
+    assert r.mimetype == "application/x-ndjson"
+    [row] = [row for row in _ndjson(r) if row["firebase_uid"] == profiled]
+    assert row["display_name"] == "Sam"
+    assert row["interests"] == ["ml", "web"]
+
+
+def test_csv_export_has_header_and_selected_columns(client, profiled):
+    r = client.get("/admin/export/profile?format=csv&columns=display_name", headers=ADMIN_HEADERS)
+    assert r.status_code == 200
+    assert r.mimetype == "text/csv"
+    rows = list(csv.reader(io.StringIO(r.get_data(as_text=True))))
+    assert rows[0] == ["id", "firebase_uid", "display_name"]
+    assert [profiled, "Sam"] in [row[1:] for row in rows[1:]]
+
+
+def test_since_id_pages_through_rows(client, profiled):
+    first = _ndjson(client.get("/admin/export/profile?limit=1", headers=ADMIN_HEADERS))
+    assert len(first) == 1
+    rest = _ndjson(client.get(f"/admin/export/profile?since_id={first[0]['id']}", headers=ADMIN_HEADERS))
+    assert all(row["id"] > first[0]["id"] for row in rest)
+    assert profiled in [row["firebase_uid"] for row in first + rest]
+
+
+def test_big5_export_rebuilds_typed_scores(client, uid):
+    payload = {"scores_sum": {"O": 40, "C": 35, "E": 20, "A": 38, "N": 18},
+               "scores_percent": {"O": 80, "C": 70, "E": 40, "A": 76, "N": 36},
+               "answers": {"1": 4}, "label": "Explorer", "model": "big5_v1"}
+    assert client.post("/save-big5", json={"firebase_uid": uid, **payload}).status_code == 200
+    rows = _ndjson(client.get("/admin/export/big5", headers=ADMIN_HEADERS))
+    [row] = [row for row in rows if row["firebase_uid"] == uid]
+    assert row["scores"]["percent"] == payload["scores_percent"]
+    assert row["result"]["label"] == "Explorer"
+    assert row["answers"] == {"1": 4}
+
+
+@pytest.mark.parametrize("query", ["format=xml", "columns=nope", "since_id=x"])
+def test_bad_query_is_rejected(client, query):
+    assert client.get(f"/admin/export/profile?{query}", headers=ADMIN_HEADERS).status_code == 400
@@ -0,0 +1,60 @@
+"""ETag / 304 handling and data-version invalidation on commit."""
+import pytest
+
+import app
+
+
+@pytest.fixture
+def profiled(client, uid):
+    assert client.post("/profile", json={"firebase_uid": uid, "display_name": "Sam"}).status_code == 200
+    return uid
+
+
+def test_if_none_match_returns_304(client, profiled):
+    first = client.get(f"/profile/{profiled}")
+    etag = first.headers["ETag"]
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"] == "private, no-cache"
+
+    again = client.get(f"/profile/{profiled}", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+    assert again.get_data() == b""
+
+
+def test_etag_changes_after_a_write(client, profiled):
+    etag = client.get(f"/profile/{profiled}").headers["ETag"]
+    assert client.post("/profile", json={"firebase_uid": profiled, "display_name": "Sami"}).status_code == 200
+
+    r = client.get(f"/profile/{profiled}", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["ETag"] != etag
+    assert r.get_json()["display_name"] == "Sami"
+
+
+def test_if_modified_since_returns_304(client, profiled):
+    last_modified = client.get(f"/profile/{profiled}").headers["Last-Modified"]
+    assert client.get(f"/profile/{profiled}", headers={"If-Modified-Since": last_modified}).status_code == 304
+
+
+def test_unknown_user_falls_through(client, uid):
+    assert client.get(f"/profile/{uid}", headers={"If-None-Match": "*"}).status_code == 404
+
+
+def test_memoised_version_is_dropped_only_after_commit(uid):
+    user_id = app.ensure_user(uid)
+    version, _ = app.user_data_state(user_id)
+
+    conn = app.get_db_connection()
+    try:
+        app.bump_data_version(conn, user_id)
+        assert app.data_version_cache.get(user_id) is not None  # uncommitted: keep serving it
+        conn.rollback()
+        assert app.user_data_state(user_id)[0] == version
+
+        app.bump_data_version(conn, user_id)
+        conn.commit()
+        assert app.data_version_cache.get(user_id) is None
+        assert app.user_data_state(user_id)[0] == version + 1
+    finally:
+        conn.close()
@@ -0,0 +1,49 @@
+"""/matching access: the signed-in owner or an admin, never another user."""
+import pytest
+
+import app
+from conftest import ADMIN_HEADERS
+
+PERSONALITY = {
+    "learning_style": "visual", "decision_style": "logic", "work_preference": "peer",
+    "motivation_state": "high", "clarity_level": "lost",
+}
+
+
+@pytest.fixture
+def owner(client, uid):
+    assert client.post("/personality", json={"firebase_uid": uid, **PERSONALITY}).status_code == 200
+    return uid
+
+
+@pytest.fixture
+def verified(monkeypatch):
+    """Treat `Bearer <uid>` as a valid ID token for <uid>."""
+    monkeypatch.setattr(app, "FIREBASE_AUTH_CONFIGURED", True)
+    monkeypatch.setattr(app, "_verify_id_token", lambda token: token)
+
+
+def bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_owner_sees_matches(client, owner, verified):
+    r = client.get(f"/matching/{owner}", headers=bearer(owner))
+    assert r.status_code == 200
+    assert r.get_json()["matches"]
+
+
+def test_other_user_is_forbidden(client, owner, verified):
+    assert client.get(f"/matching/{owner}", headers=bearer("someone-else")).status_code == 403
+    assert client.get(f"/matching/{owner}").status_code == 403
+
+
+def test_admin_needs_no_token(client, owner):
+    assert client.get(f"/matching/{owner}", headers=ADMIN_HEADERS).status_code == 200
+
+
+def test_unverifiable_token_is_a_server_error(client, owner, monkeypatch):
+    monkeypatch.setattr(app, "FIREBASE_AUTH_CONFIGURED", False)
+    r = client.get(f"/matching/{owner}", headers=bearer(owner))
+    assert r.status_code == 503
+    assert "not configured" in r.get_json()["error"]
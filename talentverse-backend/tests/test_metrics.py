@@ -0,0 +1,32 @@
+"""Request metrics: histogram quantiles, Server-Timing and the /metrics scrape."""
+import metrics
+from conftest import ADMIN_HEADERS
+
+
+def test_histogram_quantile_interpolates_inside_a_bucket():
+    h = metrics.Histogram((1.0, 2.0, 4.0))
+    for value in (0.5, 1.5, 1.5, 3.0):
+        h.observe(value)
+    assert h.counts == [1, 2, 1, 0]
+    assert h.quantile(0.5) == 1.5  # rank 2 is halfway through the (1, 2] bucket
+    assert h.quantile(1.0) == 4.0
+    assert metrics.Histogram((1.0,)).quantile(0.5) is None
+
+
+def test_responses_carry_server_timing(client):
+    r = client.get("/health")
+    assert r.headers["Server-Timing"].startswith("app;dur=")
+
+
+def test_metrics_scrape_needs_admin_or_token(client, monkeypatch):
+    assert client.get("/metrics").status_code == 403
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "scrape-secret")
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 403
+
+    client.get("/health")
+    r = client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert r.status_code == 200
+    body = r.get_data(as_text=True)
+    assert 'talentverse_http_request_duration_seconds_count{route="/health",method="GET",status="200"}' in body
+    assert "talentverse_db_pool_connections_in_use " in body
+    assert client.get("/metrics", headers=ADMIN_HEADERS).status_code == 200
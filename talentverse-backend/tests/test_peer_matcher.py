@@ -0,0 +1,72 @@
+"""Exact peer matcher: single-flight rebuilds, writes during a rebuild, directions."""
+import threading
+import time
+
+import pytest
+
+import app
+import peers
+
+PERCENT = {"O": 80, "C": 70, "E": 40, "A": 76, "N": 36}
+
+
+@pytest.fixture
+def uid2(uid):
+    return uid + "-late"
+
+
+def _save_big5(client, uid, percent=PERCENT):
+    payload = {"firebase_uid": uid, "scores_sum": {t: 10 for t in PERCENT}, "scores_percent": percent,
+               "answers": {"1": 3}, "label": "x", "model": "big5_v1"}
+    assert client.post("/save-big5", json=payload).status_code == 200
+    return app.lookup_user_id(uid)
+
+
+def _direction_of(matcher, user_id):
+    return matcher._dir_tokens[matcher._dir_ids[matcher._rows[user_id]]]
+
+
+def test_big5_save_keeps_the_analysis_direction(client, uid):
+    peers.peer_matcher.rebuild()
+    assert client.post("/analyze", json={"firebase_uid": uid, "field": "frontend", "level": "beginner"}).status_code == 200
+    user_id = _save_big5(client, uid)
+    assert _direction_of(peers.peer_matcher, user_id) == peers._direction_tokens("Junior Frontend Developer")
+
+
+def test_stale_matrix_is_rebuilt_once(monkeypatch):
+    matcher = peers.PeerMatcher(refresh_interval=3600)
+    matcher.rebuild()
+    matcher._loaded_at = time.monotonic() - 7200
+    loads = []
+    real_load = matcher._load
+
+    def slow_load():
+        loads.append(1)
+        time.sleep(0.2)
+        real_load()
+
+    monkeypatch.setattr(matcher, "_load", slow_load)
+    threads = [threading.Thread(target=matcher._ensure_fresh) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert len(loads) == 1
+    assert not matcher._stale()
+
+
+def test_upsert_during_rebuild_is_not_lost(client, uid, uid2, monkeypatch):
+    matcher = peers.PeerMatcher(refresh_interval=3600)
+    matcher.rebuild()
+    late_id = app.ensure_user(uid2)
+    real_connection = peers.get_db_connection
+
+    def connection_with_concurrent_write():
+        # the write lands after the rebuild started reading
+        matcher.upsert(late_id, [90.0, 10.0, 50.0, 50.0, 50.0], "Data Scientist")
+        return real_connection()
+
+    monkeypatch.setattr(peers, "get_db_connection", connection_with_concurrent_write)
+    matcher.rebuild()
+    assert late_id in matcher._rows
+    assert _direction_of(matcher, late_id) == peers._direction_tokens("Data Scientist")
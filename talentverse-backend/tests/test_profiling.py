@@ -0,0 +1,57 @@
+"""Profiler: X-Profile capture for admins, stored profiles and their formats."""
+import marshal
+
+import pytest
+from flask import Flask, request
+
+import profiling
+from conftest import ADMIN_HEADERS
+
+
+@pytest.fixture
+def profiled(monkeypatch):
+    """A bare app with profiling on; the admin check is the X-Admin-Email header."""
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(profiling, "_admin_check", None)
+    app = Flask("profiled")
+
+    @app.route("/work")
+    def work():
+        return {"total": sum(i * i for i in range(20000))}
+
+    profiling.init_app(app, lambda: request.headers.get("X-Admin-Email") == ADMIN_HEADERS["X-Admin-Email"])
+    return app.test_client()
+
+
+def test_cprofile_request_is_stored_and_rendered(profiled):
+    r = profiled.get("/work", headers={**ADMIN_HEADERS, "X-Profile": "cprofile"})
+    assert r.status_code == 200
+    pid = r.headers["X-Profile-Id"]
+
+    listed = profiled.get("/admin/profiles", headers=ADMIN_HEADERS).get_json()["profiles"]
+    assert any(str(p["id"]) == pid and p["path"] == "/work" for p in listed)
+    text = profiled.get(f"/admin/profiles/{pid}?limit=5", headers=ADMIN_HEADERS)
+    assert "function calls" in text.get_data(as_text=True)
+    raw = profiled.get(f"/admin/profiles/{pid}?format=raw", headers=ADMIN_HEADERS)
+    assert isinstance(marshal.loads(raw.data), dict)
+    assert profiled.get(f"/admin/profiles/{pid}?format=collapsed", headers=ADMIN_HEADERS).status_code == 400
+
+
+def test_non_admin_cannot_profile(profiled):
+    r = profiled.get("/work", headers={"X-Profile": "cprofile"})
+    assert r.status_code == 200 and "X-Profile-Id" not in r.headers
+    assert profiled.get("/admin/profiles").status_code == 403
+    assert profiled.get("/work", headers={**ADMIN_HEADERS, "X-Profile": "bogus"}).status_code == 400
+
+
+def test_sampling_returns_collapsed_stacks(profiled):
+    r = profiled.post("/admin/profile/sample", json={"seconds": 0.05, "interval_ms": 1, "all_threads": True},
+                      headers=ADMIN_HEADERS)
+    assert r.status_code == 200 and r.headers["X-Profile-Id"]
+    entry = profiling.profile_store.get(int(r.headers["X-Profile-Id"]))
+    assert entry["kind"] == "sample" and entry["samples"] > 0
+
+
+def test_disabled_profiling_answers_404(client, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", False)
+    assert client.get("/admin/profiles", headers=ADMIN_HEADERS).status_code == 404
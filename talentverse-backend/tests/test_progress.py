@@ -0,0 +1,105 @@
+"""Write-behind progress saves: coalescing, read-through, retries, last save wins."""
+import json
+
+import pytest
+
+import app
+
+BAD_USER = -1  # rows for this user_id are rejected by a trigger
+
+
+@pytest.fixture
+def buffer():
+    # long interval: the flusher thread never fires on its own during a test
+    return app.ProgressWriteBehind(3600, 10_000)
+
+
+@pytest.fixture
+def user_id(uid):
+    return app.ensure_user(uid)
+
+
+@pytest.fixture
+def failing_rows():
+    conn = app.get_db_connection()
+    try:
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS test_reject_progress BEFORE INSERT ON project_progress
+            WHEN NEW.user_id = {BAD_USER} BEGIN SELECT RAISE(ABORT, 'rejected'); END
+        """)
+        conn.commit()
+        yield
+        conn.execute("DROP TRIGGER test_reject_progress")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _stored(user_id, project_id):
+    conn = app.get_db_connection()
+    try:
+        row = conn.execute(
+            "SELECT progress, tasks FROM project_progress WHERE user_id = ? AND project_id = ?",
+            (user_id, project_id),
+        ).fetchone()
+        return (row["progress"], json.loads(row["tasks"])) if row else None
+    finally:
+        conn.close()
+
+
+def test_saves_coalesce_until_flush(buffer, user_id):
+    buffer.put(user_id, "p1", 10, "[]", 1.0)
+    buffer.put(user_id, "p1", 20, '["a"]', 2.0)
+    assert buffer.get(user_id, "p1")[:2] == (20, '["a"]')
+    assert _stored(user_id, "p1") is None
+
+    assert buffer.flush() == 1
+    assert _stored(user_id, "p1") == (20, ["a"])
+    assert buffer.get(user_id, "p1") is None
+    assert buffer.stats()["coalesced"] == 1
+
+
+def test_older_save_never_overwrites_a_newer_one(buffer, user_id):
+    buffer.put(user_id, "p1", 50, "[]", 5.0)
+    buffer.flush()
+    # e.g. an earlier toggle that another worker flushes late
+    buffer.put(user_id, "p1", 20, "[]", 4.0)
+    buffer.flush()
+    assert _stored(user_id, "p1") == (50, [])
+
+    buffer.put(user_id, "p1", 70, "[]", 6.0)
+    buffer.flush()
+    assert _stored(user_id, "p1") == (70, [])
+
+
+def test_bad_row_is_retried_then_dropped(buffer, user_id, failing_rows, monkeypatch):
+    monkeypatch.setattr(app, "PROGRESS_MAX_RETRIES", 2)
+    buffer.put(user_id, "p1", 10, "[]", 1.0)
+    buffer.put(BAD_USER, "p1", 10, "[]", 1.0)
+
+    assert buffer.flush() == 1  # the good row still lands
+    assert _stored(user_id, "p1") == (10, [])
+    assert buffer.stats()["pending"] == 1
+
+    buffer.put(user_id, "p2", 30, "[]", 2.0)
+    assert buffer.flush() == 1
+    assert buffer.stats()["pending"] == 0
+    assert buffer.stats()["dropped"] == 1
+    assert _stored(user_id, "p2") == (30, [])
+
+
+def test_save_progress_reads_through_the_buffer(client, uid, monkeypatch):
+    monkeypatch.setattr(app, "PROGRESS_WRITE_BEHIND", True)
+    body = {"firebase_uid": uid, "projectId": "p9", "progress": 40, "tasks": ["x"]}
+    client.post("/profile", json={"firebase_uid": uid})
+    assert client.post("/save-progress", json=body).get_json() == {"status": "progress_saved"}
+    assert client.get(f"/project-progress/{uid}/p9").get_json() == {"progress": 40, "tasks": ["x"]}
+
+    app.progress_buffer.flush()
+    assert _stored(app.lookup_user_id(uid), "p9") == (40, ["x"])
+
+
+@pytest.mark.parametrize("progress", [-1, 101, "abc"])
+def test_save_progress_validates(client, uid, progress):
+    body = {"firebase_uid": uid, "projectId": "p1", "progress": progress}
+    assert client.post("/save-progress", json=body).status_code == 400
@@ -0,0 +1,31 @@
+"""
+EXPLAIN QUERY PLAN gate for the hot queries: every indexed lookup in
+app.hot_queries() must stay an index search on a freshly migrated database.
+"""
+import pytest
+
+import app
+
+
+@pytest.fixture(scope="module")
+def conn():
+    handle = app.get_db_connection()
+    yield handle
+    handle.close()
+
+
+def test_schema_is_fully_migrated(conn):
+    assert app.schema_version(conn) == app.SCHEMA_VERSION
+
+
+@pytest.mark.parametrize("name,sql,params", app.hot_queries(), ids=[q[0] for q in app.hot_queries()])
+def test_hot_query_uses_an_index(conn, name, sql, params):
+    plan = [r["detail"] for r in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+    problems = app._plan_problems(plan)
+    assert not problems, f"{name}: {problems} in plan {plan}"
+
+
+def test_unindexed_lookup_is_reported(conn):
+    # keeps the gate honest: a lookup on an unindexed column must be flagged
+    plan = [r["detail"] for r in conn.execute("EXPLAIN QUERY PLAN SELECT id FROM users WHERE email = ?", ("x",))]
+    assert any(p.startswith("SCAN users") for p in app._plan_problems(plan))
@@ -0,0 +1,70 @@
+"""Token buckets and the 429 + Retry-After admission response."""
+import pytest
+
+import app
+import ratelimit
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def buckets(request):
+    return ratelimit.MemoryBuckets(100) if request.param == "memory" else ratelimit.SQLiteBuckets()
+
+
+@pytest.fixture
+def limited(monkeypatch):
+    """Per-uid burst of 2 at 1/min; the per-IP scope is off."""
+    controller = ratelimit.AdmissionController(ratelimit.MemoryBuckets(100), {"ip": (0.0, 1.0), "uid": (1 / 60.0, 2.0)})
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(ratelimit, "admission", controller)
+    return controller
+
+
+def test_bucket_allows_burst_then_reports_wait(buckets, uid):
+    key, rate, now = f"test:{uid}", 0.5, 1000.0
+    assert buckets.take(key, rate, 2.0, now) == 0.0
+    assert buckets.take(key, rate, 2.0, now) == 0.0
+    assert buckets.take(key, rate, 2.0, now) == pytest.approx(2.0)
+    # refills continuously: one token after 1/rate seconds
+    assert buckets.take(key, rate, 2.0, now + 2.0) == 0.0
+
+
+def test_bucket_never_refills_past_burst(buckets, uid):
+    key = f"test:{uid}"
+    assert buckets.take(key, 1.0, 1.0, 0.0) == 0.0
+    assert buckets.take(key, 1.0, 1.0, 3600.0) == 0.0
+    assert buckets.take(key, 1.0, 1.0, 3600.0) > 0
+
+
+def test_empty_bucket_answers_429_with_retry_after(client, uid, limited):
+    body = {"firebase_uid": uid, "action": "daily"}
+    assert client.post("/ai/coach/actions", json=body).status_code == 200
+    assert client.post("/ai/coach/actions", json=body).status_code == 200
+
+    r = client.post("/ai/coach/actions", json=body)
+    assert r.status_code == 429
+    assert int(r.headers["Retry-After"]) >= 59
+    assert r.get_json()["retry_after"] == int(r.headers["Retry-After"])
+    assert limited.stats()["denied_uid"] == 1
+
+    # another user is not affected
+    assert client.post("/ai/coach/actions", json={**body, "firebase_uid": uid + "-b"}).status_code == 200
+
+
+def test_denied_uid_does_not_spend_the_ip_token(buckets, uid):
+    controller = ratelimit.AdmissionController(buckets, {"ip": (1 / 60.0, 3.0), "uid": (1 / 60.0, 1.0)})
+    ip = f"ip-{uid}"
+    assert controller.admit(ip, uid + "-a") is None
+    assert controller.admit(ip, uid + "-a") > 0  # uid bucket empty
+    assert controller.admit(ip, uid + "-b") is None
+    assert controller.admit(ip, uid + "-c") is None  # the refunded IP token
+    assert controller.admit(ip, uid + "-d") > 0
+    assert (controller.counts["denied_uid"], controller.counts["denied_ip"]) == (1, 1)
+
+
+def test_revalidation_is_rate_limited(client, uid, limited):
+    app.ensure_user(uid)
+    first = client.get(f"/ai-coach/{uid}")
+    assert first.status_code == 200
+    again = client.get(f"/ai-coach/{uid}", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    assert client.get(f"/ai-coach/{uid}", headers={"If-None-Match": first.headers["ETag"]}).status_code == 429
@@ -0,0 +1,50 @@
+"""UPSERT write path: one row per user, stable ids, untouched columns kept."""
+import app
+
+PERSONALITY = {
+    "learning_style": "visual", "decision_style": "logic", "work_preference": "solo",
+    "motivation_state": "high", "clarity_level": "clear",
+}
+
+
+def _rows(table, uid):
+    conn = app.get_db_connection()
+    try:
+        return [dict(r) for r in conn.execute(
+            f"SELECT t.* FROM {table} t JOIN users u ON u.id = t.user_id WHERE u.firebase_uid = ?", (uid,)
+        )]
+    finally:
+        conn.close()
+
+
+def test_profile_update_keeps_row_id(client, uid):
+    assert client.post("/profile", json={"firebase_uid": uid, "display_name": "Sam"}).status_code == 200
+    [before] = _rows("profile", uid)
+    assert client.post("/profile", json={"firebase_uid": uid, "display_name": "Sami"}).status_code == 200
+    [after] = _rows("profile", uid)
+    assert after["id"] == before["id"]
+    assert after["display_name"] == "Sami"
+
+
+def test_personality_update_keeps_mbti_columns(client, uid):
+    assert client.post("/personality", json={"firebase_uid": uid, **PERSONALITY}).status_code == 200
+    [before] = _rows("personality", uid)
+    conn = app.get_db_connection()
+    try:
+        conn.execute("UPDATE personality SET mbti_type = 'INTJ' WHERE id = ?", (before["id"],))
+        conn.commit()
+    finally:
+        conn.close()
+
+    changed = {**PERSONALITY, "clarity_level": "lost"}
+    assert client.post("/personality", json={"firebase_uid": uid, **changed}).status_code == 200
+    [after] = _rows("personality", uid)
+    assert after["id"] == before["id"]
+    assert after["clarity_level"] == "lost"
+    assert after["mbti_type"] == "INTJ"
+
+
+def test_upsert_sql_shape():
+    sql = app._upsert_sql("profile", ("user_id", "bio"), ("user_id",), ("bio",))
+    assert sql == ("INSERT INTO profile (user_id, bio) VALUES (?, ?) "
+                   "ON CONFLICT(user_id) DO UPDATE SET bio=excluded.bio")
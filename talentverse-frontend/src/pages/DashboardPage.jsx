@@ -28,15 +28,12 @@ const DashboardPage = () => {
 
     (async () => {
       try {
-        const [analysisData, personalityData, profileData] = await Promise.all([
-          apiFetch(`/analysis/${user.uid}`).catch(() => null),
-          apiFetch(`/personality/${user.uid}`).catch(() => null),
-          apiFetch(`/profile/${user.uid}`).catch(() => null),
-        ]);
-
-        setAnalysis(analysisData);
-        setPersonality(personalityData);
-        setProfile(profileData);
+        // One snapshot read instead of separate analysis/personality/profile calls
+        const snapshot = await apiFetch(`/dashboard/${user.uid}`).catch(() => null);
+
+        setAnalysis(snapshot?.analysis || null);
+        setPersonality(snapshot?.personality || null);
+        setProfile(snapshot?.profile || null);
       } finally {
         setLoading(false);
       }
@@ -48,7 +48,11 @@ const MatchingPage = () => {
       if (!user) return;
 
       try {
-        const data = await apiFetch(`/matching/${user.uid}`).catch(() => null);
+        // matches describe other users, so the backend wants proof of who is asking
+        const token = await user.getIdToken();
+        const data = await apiFetch(`/matching/${user.uid}`, {
+          headers: { Authorization: `Bearer ${token}` },
+        }).catch(() => null);
         setMatches(Array.isArray(data?.matches) ? data.matches : []);
 
         // بيانات وهمية للاتصالات (للديمو)